@@ -12,8 +12,10 @@ API_URL = f"{BASE_URL}/v1/battleship"
 WEBSOCKET_URL = f"{BASE_URL}/ws"
 
 
-async def fetch_player_games(user_id, session):
-    params = {"player_id": user_id}
+async def fetch_player_games(user_id, session, cursor=None):
+    params = {"player_id": user_id, "status": "in_progress", "limit": 20}
+    if cursor is not None:
+        params["cursor"] = cursor
     async with session.get(f"{API_URL}/player/games", params=params) as response:
         games = await response.json()
     return games
@@ -46,6 +48,7 @@ class BattleshipTerminal:
     async def load_game(self):
         data = await fetch_game_details(self.player_id, self.game_id, self.session)
         print(f"Game details {data=}")
+        self.board = Board(data["game"]["board_width"], data["game"]["board_height"])
         player_ships: list[dict] = data["player_ships"]
         player_guesses: list[dict] = data["player_guesses"]
         enemy_guesses: list[dict] = data["enemy_guesses"]
@@ -73,6 +76,13 @@ class BattleshipTerminal:
         }
         await self.send_msg(payload)
 
+    async def place_fleet(self, ships: list[dict]):
+        payload = {
+            "action": "place_fleet",
+            "ships": ships,
+        }
+        await self.send_msg(payload)
+
     async def take_turn(self, guess_position_x: int, guess_position_y: int):
         payload = {
             "action": "take_turn",
@@ -81,6 +91,13 @@ class BattleshipTerminal:
         }
         await self.send_msg(payload)
 
+    async def take_salvo(self, shots: list[tuple[int, int]]):
+        payload = {
+            "action": "take_salvo",
+            "shots": [{"position_x": x, "position_y": y} for x, y in shots],
+        }
+        await self.send_msg(payload)
+
     async def handle_guess_result(self, payload) -> None:
         guesses = [
             {
@@ -117,6 +134,23 @@ class BattleshipTerminal:
         ]
         self.board.add_ships(ships)
 
+    async def handle_place_fleet_result(self, payload) -> None:
+        if payload["result"] == "failure":
+            print("Placing the fleet failed")
+            print(f"{payload['msg']=}")
+            return
+
+        ships = [
+            {
+                "size": ship["ship_size"],
+                "orientation": ship["orientation"],
+                "start_position_x": ship["start_position_x"],
+                "start_position_y": ship["start_position_y"],
+            }
+            for ship in payload["ships"]
+        ]
+        self.board.add_ships(ships)
+
 
 async def main():
     user_id = input("Please type your user id.")
@@ -124,8 +158,15 @@ async def main():
     print("Thank you! These are the games you have available.")
     session = ClientSession()
     games = await fetch_player_games(user_id, session)
-    print(json.dumps(games, indent=4))
-    game_id = input("Which game would you like to play?")
+    while True:
+        print(json.dumps(games["games"], indent=4))
+        prompt = "Which game would you like to play?"
+        if games["next_cursor"] is not None:
+            prompt += " Press enter to see older games."
+        game_id = input(prompt)
+        if game_id or games["next_cursor"] is None:
+            break
+        games = await fetch_player_games(user_id, session, games["next_cursor"])
     game_id = int(game_id)
 
     async with session.ws_connect(WEBSOCKET_URL) as ws:
@@ -145,8 +186,14 @@ async def main():
                 await battleship_game.handle_incoming_enemy_guess_result(payload)
             elif payload["type"] == "guess_result":
                 await battleship_game.handle_guess_result(payload)
+            elif payload["type"] == "enemy_salvo":
+                battleship_game.board.add_enemys_guess_history(payload["shots"])
+            elif payload["type"] == "salvo_result":
+                battleship_game.board.add_players_guess_history(payload["shots"])
             elif payload["type"] == "new_ship":
                 await battleship_game.handle_create_new_ship_result(payload)
+            elif payload["type"] == "new_fleet":
+                await battleship_game.handle_place_fleet_result(payload)
             else:
                 print(f"Received unexpected {payload=}")
 
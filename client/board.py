@@ -1,16 +1,20 @@
-MAP_TEMPLATE = """\
-   1  2  3  4  5  6  7  8  9  10
-A  .  .  .  .  .  .  .  .  .  .
-B  .  .  .  .  .  .  .  .  .  .
-C  .  .  .  .  .  .  .  .  .  .
-D  .  .  .  .  .  .  .  .  .  .
-E  .  .  .  .  .  .  .  .  .  .
-F  .  .  .  .  .  .  .  .  .  .
-G  .  .  .  .  .  .  .  .  .  .
-H  .  .  .  .  .  .  .  .  .  .
-I  .  .  .  .  .  .  .  .  .  .
-J  .  .  .  .  .  .  .  .  .  .\
-"""
+import string
+
+DEFAULT_BOARD_WIDTH = 10
+DEFAULT_BOARD_HEIGHT = 10
+
+
+def build_map_rows(num_cols: int, num_rows: int) -> list[list[str]]:
+    """
+    Build the rows of an empty map: a header of column numbers followed by one
+    row per board row, labelled with letters when there are few enough rows.
+    """
+    header = [str(col) for col in range(1, num_cols + 1)]
+    if num_rows <= len(string.ascii_uppercase):
+        labels = string.ascii_uppercase[:num_rows]
+    else:
+        labels = [str(row) for row in range(1, num_rows + 1)]
+    return [header] + [[label] + ["."] * num_cols for label in labels]
 
 
 class Map:
@@ -19,13 +23,13 @@ class Map:
     system operates with the origin at the bottom-left.
     """
 
-    def __init__(self):
-        self.map_rows: list[str] = []
-        for row in MAP_TEMPLATE.split("\n"):
-            self.map_rows.append(row.split())
+    def __init__(
+        self, num_cols: int = DEFAULT_BOARD_WIDTH, num_rows: int = DEFAULT_BOARD_HEIGHT
+    ):
+        self.map_rows: list[list[str]] = build_map_rows(num_cols, num_rows)
 
-        self.num_rows = 10
-        self.num_cols = 10
+        self.num_rows = num_rows
+        self.num_cols = num_cols
         self.row_whitespace = 2  # 2 whitespaces between each row element
         self.col_whitespace = 0
 
@@ -34,7 +38,7 @@ class Map:
         Determine if the coordinates are within the board
         in a 0-index fashion.
         """
-        return 0 <= x <= (self.num_rows - 1) and 0 <= y <= (self.num_cols - 1)
+        return 0 <= x <= (self.num_cols - 1) and 0 <= y <= (self.num_rows - 1)
 
     def transform(self, x: int, y: int):
         """
@@ -103,9 +107,11 @@ class Map:
 
 
 class Board:
-    def __init__(self):
-        self.player_map = Map()
-        self.enemy_map = Map()
+    def __init__(
+        self, width: int = DEFAULT_BOARD_WIDTH, height: int = DEFAULT_BOARD_HEIGHT
+    ):
+        self.player_map = Map(width, height)
+        self.enemy_map = Map(width, height)
 
     def add_ships(
         self,
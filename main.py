@@ -5,14 +5,54 @@ from aiohttp_middlewares.cors import cors_middleware
 from aiohttp import web
 from aiohttp_apispec import validation_middleware, setup_aiohttp_apispec
 from battleship.api.urls import urls
+from battleship.bot import BotRegistry
+from battleship.models.archive import Archiver
+from battleship.models.asyncpg_database import AsyncpgDatabase
 from battleship.models.database import BattleshipDatabase, DATABASE_URL
+from battleship.models.event_store import EventSourcedDatabase
+from battleship.models.game_cache import GameStateCache
+from battleship.models.metadata_cache import MetadataCache, TTLCache
+from battleship.models.migrations import migrate
 from battleship.schema import server_response_for_validation_error
 
 LOGGING_LEVEL = os.getenv("LOGGING_LEVEL", "INFO")
+GAME_CACHE_SIZE = int(os.getenv("GAME_CACHE_SIZE", 1024))
+# "tables" keeps the state of games in rows, "events" as an event log
+STORAGE = os.getenv("STORAGE", "tables")
+# "sqlalchemy" plays turns through SQLAlchemy, "asyncpg" through asyncpg
+DATABASE_BACKEND = os.getenv("DATABASE_BACKEND", "sqlalchemy")
+DATABASE_BACKENDS = {"sqlalchemy": BattleshipDatabase, "asyncpg": AsyncpgDatabase}
+# Completed games are moved to the archive tables in batches of ARCHIVE_BATCH_SIZE,
+# checked for every ARCHIVE_INTERVAL seconds
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 100))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", 60))
+# Players and games are cached for PLAYER_CACHE_TTL and GAME_CACHE_TTL seconds,
+# pages of a player's games for PLAYER_GAMES_CACHE_TTL, up to METADATA_CACHE_SIZE entries
+METADATA_CACHE_SIZE = int(os.getenv("METADATA_CACHE_SIZE", 10000))
+METADATA_CACHE_TTLS = {
+    "player": float(os.getenv("PLAYER_CACHE_TTL", 300)),
+    "game": float(os.getenv("GAME_CACHE_TTL", 10)),
+    "player_games": float(os.getenv("PLAYER_GAMES_CACHE_TTL", 5)),
+}
 logging.basicConfig(level=getattr(logging, LOGGING_LEVEL))
 LOGGER = logging.getLogger(__name__)
 
 
+async def migrate_battleship_db(app):
+    await migrate(app["battleship_db"].engine)
+
+
+async def start_archiver(app):
+    if "archiver" in app:
+        app["archiver"].start()
+
+
+async def close_battleship_db(app):
+    if "archiver" in app:
+        await app["archiver"].close()
+    await app["battleship_db"].close()
+
+
 if __name__ == "__main__":
     LOGGER.info("Starting battleship server...")
     app = web.Application(
@@ -22,8 +62,29 @@ if __name__ == "__main__":
             ]
     )
     app.add_routes(urls)
-    app["battleship_db"] = BattleshipDatabase(DATABASE_URL)
+    if STORAGE == "events":
+        # Keeps the states of recent games in memory itself
+        app["battleship_db"] = EventSourcedDatabase(
+            DATABASE_URL, max_games=GAME_CACHE_SIZE
+        )
+    else:
+        app["battleship_db"] = GameStateCache(
+            DATABASE_BACKENDS[DATABASE_BACKEND](DATABASE_URL),
+            max_games=GAME_CACHE_SIZE,
+        )
+        app["archiver"] = Archiver(
+            app["battleship_db"], ARCHIVE_BATCH_SIZE, ARCHIVE_INTERVAL
+        )
+    app["battleship_db"] = MetadataCache(
+        app["battleship_db"],
+        TTLCache(METADATA_CACHE_SIZE),
+        ttls=METADATA_CACHE_TTLS,
+    )
+    app.on_startup.append(migrate_battleship_db)
+    app.on_startup.append(start_archiver)
+    app.on_cleanup.append(close_battleship_db)
     app["websockets"] = defaultdict(set)
+    app["bots"] = BotRegistry()
 
     setup_aiohttp_apispec(
         app,
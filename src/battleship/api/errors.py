@@ -0,0 +1,38 @@
+"""
+HTTP errors for the errors of battleship.errors.
+"""
+
+import contextlib
+import functools
+from aiohttp import web
+from battleship.errors import GameRuleError, NotFoundError, WriteConflictError
+
+
+@contextlib.contextmanager
+def http_errors():
+    """
+    Raises the HTTP error matching any error of the game raised within: a bad
+    request for a move the rules do not allow, not found for a missing game
+    or ship and a conflict for a write lost to concurrent writes.
+    """
+    try:
+        yield
+    except GameRuleError as e:
+        raise web.HTTPBadRequest(text=str(e)) from e
+    except NotFoundError as e:
+        raise web.HTTPNotFound(text=str(e)) from e
+    except WriteConflictError as e:
+        raise web.HTTPConflict(text=str(e)) from e
+
+
+def with_http_errors(view):
+    """
+    Decorates a view to answer errors of the game with their HTTP errors.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request):
+        with http_errors():
+            return await view(request)
+
+    return wrapper
@@ -1,43 +1,123 @@
 import aiohttp_apispec
 from aiohttp import web
+from battleship.api.errors import with_http_errors
 from battleship.schema import (
+    CreateGamesRequest,
     CreateNewGameRequest,
     TakeTurnRequest,
+    TakeSalvoRequest,
     GetPlayerBoard,
     PlayerBoard,
-    PlayerId,
+    PlayerGamesRequest,
 )
-from battleship.models.game import Game
+from battleship.bot import MAX_BOT_BOARD_CELLS, random_fleet
+from battleship.models.game import Game, GameMode, GameStatus, DEFAULT_FLEET
 from battleship.models.guess import GuessResult
 from battleship.utils import (
+    add_player_fleet,
     run_game_turn,
+    run_salvo_turn,
     get_player_games,
     build_player_game_details,
+    salvo_result,
+    stream_inserted_ids,
 )
 
 
+def checked_fleet(payload: dict) -> list[int]:
+    """
+    The fleet of the new game, which must fit on its board.
+    """
+    board_width = payload["board_width"]
+    board_height = payload["board_height"]
+    fleet = payload["fleet"] if payload["fleet"] is not None else DEFAULT_FLEET
+    if max(fleet) > max(board_width, board_height):
+        raise web.HTTPBadRequest(
+            text=f"{fleet=} does not fit on a {board_width}x{board_height} board"
+        )
+    return fleet
+
+
 @aiohttp_apispec.request_schema(CreateNewGameRequest)
+@with_http_errors
 async def create_new_game(request):
     db = request.app["battleship_db"]
+    bots = request.app["bots"]
     payload = request["data"]
 
     player_1_id = payload["player_1_id"]
     player_2_id = payload["player_2_id"]
     initial_player = payload["initial_player"]
+    against_bot = payload["against_bot"]
+    mode = payload["mode"]
+    board_width = payload["board_width"]
+    board_height = payload["board_height"]
+    fleet = checked_fleet(payload)
+
+    if against_bot:
+        # The human player places their fleet before the bot can fire
+        if initial_player != player_1_id:
+            raise web.HTTPBadRequest(text="the bot always plays second")
+        if board_width * board_height > MAX_BOT_BOARD_CELLS:
+            raise web.HTTPBadRequest(
+                text=f"bots play on boards of up to {MAX_BOT_BOARD_CELLS} cells"
+            )
+        try:
+            bot_ships = random_fleet(board_width, board_height, fleet)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+        player_2_id = (await bots.create_bot_player(db)).id
+    elif player_2_id is None:
+        raise web.HTTPBadRequest(text="player_2_id is required without against_bot")
 
     game = Game(
         player_1_id=player_1_id,
         player_2_id=player_2_id,
         current_player_id=initial_player,
         status="in_progress",
+        mode=mode,
+        board_width=board_width,
+        board_height=board_height,
+        fleet=fleet,
     )
     game = await db.add_game(game)
 
+    if against_bot:
+        await add_player_fleet(game.id, player_2_id, bot_ships, db)
+        return web.json_response({"game_id": game.id, "player_2_id": player_2_id})
     return web.json_response({"game_id": game.id})
 
 
+@aiohttp_apispec.request_schema(CreateGamesRequest)
+async def create_games(request):
+    """
+    Creates many games between players at once, e.g. for a tournament, and
+    streams back their ids in the order they were given as lines of JSON.
+    Every game is checked before any is created.
+    """
+    db = request.app["battleship_db"]
+    games = []
+    for ind, payload in enumerate(request["data"]["games"]):
+        if payload["against_bot"] or payload["player_2_id"] is None:
+            raise web.HTTPBadRequest(text=f"game {ind} needs a player_2_id")
+        games.append(
+            {
+                "player_1_id": payload["player_1_id"],
+                "player_2_id": payload["player_2_id"],
+                "current_player_id": payload["initial_player"],
+                "status": GameStatus.in_progress,
+                "mode": GameMode(payload["mode"]),
+                "board_width": payload["board_width"],
+                "board_height": payload["board_height"],
+                "fleet": checked_fleet(payload),
+            }
+        )
+    return await stream_inserted_ids(request, games, db.add_games, "game_id")
+
+
 @aiohttp_apispec.querystring_schema(GetPlayerBoard)
 @aiohttp_apispec.response_schema(PlayerBoard)
+@with_http_errors
 async def get_game_details_for_player(request):
     params = request["querystring"]
     game_id = params["game_id"]
@@ -49,19 +129,25 @@ async def get_game_details_for_player(request):
     return web.json_response(game_details)
 
 
-@aiohttp_apispec.querystring_schema(PlayerId)
+@aiohttp_apispec.querystring_schema(PlayerGamesRequest)
 # @aiohttp_apispec.response_schema(PlayerBoard)
 async def fetch_player_games(request):
     params = request["querystring"]
     player_id = params["player_id"]
+    limit = params["limit"]
     db = request.app["battleship_db"]
 
-    games: list = await get_player_games(player_id, db)
+    games: list = await get_player_games(
+        player_id, db, params["status"], params["cursor"], limit
+    )
 
-    return web.json_response({"games": games})
+    # A full page may be followed by more games
+    next_cursor = games[-1]["game_id"] if len(games) == limit else None
+    return web.json_response({"games": games, "next_cursor": next_cursor})
 
 
 @aiohttp_apispec.request_schema(TakeTurnRequest)
+@with_http_errors
 async def take_turn(request):
     db = request.app["battleship_db"]
     payload = request["data"]
@@ -82,4 +168,59 @@ async def take_turn(request):
     )
 
     response = {"current_player_id": defense_player_id, "result": result.value}
+    if result == GuessResult.victory:
+        request.app["bots"].finish(game_id)
+    else:
+        bot_moves = await request.app["bots"].play(game_id, db)
+        if bot_moves:
+            response.update(bot_turn_response(offense_player_id, bot_moves))
+    return web.json_response(response)
+
+
+@aiohttp_apispec.request_schema(TakeSalvoRequest)
+@with_http_errors
+async def take_salvo(request):
+    db = request.app["battleship_db"]
+    payload = request["data"]
+
+    game_id = payload["game_id"]
+    shots = [(shot["position_x"], shot["position_y"]) for shot in payload["shots"]]
+    offense_player_id = payload["offense_player_id"]
+    defense_player_id = payload["defense_player_id"]
+
+    results: list[GuessResult] = await run_salvo_turn(
+        game_id,
+        shots,
+        offense_player_id,
+        defense_player_id,
+        db,
+    )
+
+    response = {
+        "current_player_id": defense_player_id,
+        "result": salvo_result(results).value,
+        "shots": [
+            {"position_x": shot[0], "position_y": shot[1], "result": result.value}
+            for shot, result in zip(shots, results)
+        ],
+    }
+    if GuessResult.victory in results:
+        request.app["bots"].finish(game_id)
+    else:
+        bot_moves = await request.app["bots"].play(game_id, db)
+        if bot_moves:
+            response.update(bot_turn_response(offense_player_id, bot_moves))
     return web.json_response(response)
+
+
+def bot_turn_response(player_id: int, bot_moves: list) -> dict:
+    """
+    Describes the shots a bot fired in reply to the player's turn.
+    """
+    return {
+        "current_player_id": player_id,
+        "enemy_guesses": [
+            {"position_x": shot[0], "position_y": shot[1], "result": result.value}
+            for shot, result in bot_moves
+        ],
+    }
@@ -1,8 +1,9 @@
 import logging
 import aiohttp_apispec
 from aiohttp import web
-from battleship.schema import CreateNewPlayerRequest
+from battleship.schema import CreateNewPlayerRequest, CreatePlayersRequest
 from battleship.models.player import Player
+from battleship.utils import stream_inserted_ids
 
 LOGGER = logging.getLogger(__name__)
 
@@ -25,3 +26,17 @@ async def create_new_player(request):
 
     LOGGER.info(f"Created {player.id=}")
     return web.json_response({"player_id": player.id})
+
+
+@aiohttp_apispec.request_schema(CreatePlayersRequest)
+async def create_players(request):
+    """
+    Creates many players at once, e.g. for a tournament, and streams back
+    their ids in the order they were given as lines of JSON.
+    """
+    db = request.app["battleship_db"]
+    players = request["data"]["players"]
+
+    response = await stream_inserted_ids(request, players, db.add_players, "player_id")
+    LOGGER.info(f"Created {len(players)} players")
+    return response
@@ -1,10 +1,12 @@
 import aiohttp_apispec
 from aiohttp import web
-from battleship.schema import AddNewShipRequest
-from battleship.utils import add_player_ship
+from battleship.api.errors import with_http_errors
+from battleship.schema import AddNewShipRequest, PlaceFleetRequest
+from battleship.utils import add_player_ship, add_player_fleet
 
 
 @aiohttp_apispec.request_schema(AddNewShipRequest)
+@with_http_errors
 async def create_new_ship(request):
     db = request.app["battleship_db"]
     payload = request["data"]
@@ -15,3 +17,17 @@ async def create_new_ship(request):
 
     await add_player_ship(game_id, player_id, ship, db)
     return web.HTTPOk()
+
+
+@aiohttp_apispec.request_schema(PlaceFleetRequest)
+@with_http_errors
+async def place_fleet(request):
+    db = request.app["battleship_db"]
+    payload = request["data"]
+
+    player_id = payload["player_id"]
+    game_id = payload["game_id"]
+    ships = payload["ships"]
+
+    new_ships = await add_player_fleet(game_id, player_id, ships, db)
+    return web.json_response({"ship_ids": [ship.id for ship in new_ships]})
@@ -0,0 +1,161 @@
+"""
+Query plans of the player lookups before and after their indexes.
+
+Builds the schema up to the migration before the indexes, fills it with
+games, then prints the plan and mean latency of the queries behind
+get_player_ships, get_game_details and get_player_games. It then applies
+the remaining migrations and prints them again. Every table is dropped
+first, so point it at a scratch database.
+
+    python -m battleship.benchmarks.query_plans --url postgresql+asyncpg://...
+"""
+
+import argparse
+import asyncio
+import random
+import time
+from sqlalchemy import insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, create_async_engine
+from battleship.models.base import Base
+from battleship.models.database import DATABASE_URL, player_game_ids_stmt
+from battleship.models.game import DEFAULT_FLEET, Game
+from battleship.models.guess import Guess
+from battleship.models.migrations import migrate
+from battleship.models.player import Player
+from battleship.models.ship import Ship
+
+# Migration adding the indexes
+INDEX_MIGRATION = 3
+GUESSES_PER_PLAYER = 50
+CHUNK_SIZE = 5000
+PAGE_SIZE = 50
+
+
+async def seed(conn: AsyncConnection, num_games: int, rng: random.Random) -> None:
+    """
+    Fills the database with num_games games between distinct players, each
+    with a full fleet per player and some guesses.
+    """
+    await conn.execute(
+        insert(Player),
+        [
+            {"id": player_id, "first_name": "", "last_name": "", "email": ""}
+            for player_id in range(1, 2 * num_games + 1)
+        ],
+    )
+    games = [
+        {
+            "id": game_id,
+            "player_1_id": 2 * game_id - 1,
+            "player_2_id": 2 * game_id,
+            "current_player_id": 2 * game_id - 1,
+            "status": "in_progress",
+        }
+        for game_id in range(1, num_games + 1)
+    ]
+    await conn.execute(insert(Game), games)
+
+    ships = []
+    guesses = []
+    for game in games:
+        for player_id in (game["player_1_id"], game["player_2_id"]):
+            for size in DEFAULT_FLEET:
+                ships.append(
+                    {
+                        "game_id": game["id"],
+                        "player_id": player_id,
+                        "orientation": "horizontal",
+                        "start_position_x": 0,
+                        "start_position_y": len(ships) % 10,
+                        "size": size,
+                        "hits": 0,
+                    }
+                )
+            for _ in range(GUESSES_PER_PLAYER):
+                guesses.append(
+                    {
+                        "game_id": game["id"],
+                        "offense_player_id": player_id,
+                        "position_x": rng.randrange(10),
+                        "position_y": rng.randrange(10),
+                        "result": "miss",
+                    }
+                )
+    for rows, model in ((ships, Ship), (guesses, Guess)):
+        for start in range(0, len(rows), CHUNK_SIZE):
+            await conn.execute(insert(model), rows[start : start + CHUNK_SIZE])
+
+
+def lookups(num_games: int) -> dict:
+    """
+    The statements run by the lookups, for a game in the middle of the table.
+    """
+    game_id = num_games // 2
+    player_id = 2 * game_id
+    return {
+        "get_player_ships": select(Ship).where(
+            Ship.game_id == game_id, Ship.player_id == player_id
+        ),
+        "get_game_details (guesses)": select(Guess).where(
+            Guess.game_id == game_id, Guess.offense_player_id == player_id
+        ),
+        "get_player_games": select(Game)
+        .where(Game.id.in_(player_game_ids_stmt(player_id, limit=PAGE_SIZE)))
+        .order_by(Game.id.desc())
+        .limit(PAGE_SIZE),
+    }
+
+
+async def explain(conn: AsyncConnection, statements: dict, repeat: int) -> None:
+    postgres = conn.dialect.name == "postgresql"
+    await conn.execute(text("ANALYZE"))
+    for name, statement in statements.items():
+        sql = str(
+            statement.compile(
+                dialect=conn.dialect, compile_kwargs={"literal_binds": True}
+            )
+        )
+        explain_sql = (
+            f"EXPLAIN ANALYZE {sql}" if postgres else f"EXPLAIN QUERY PLAN {sql}"
+        )
+        plan = (await conn.execute(text(explain_sql))).all()
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            (await conn.execute(statement)).all()
+        latency = (time.perf_counter() - start) / repeat
+
+        print(f"{name}: {1000 * latency:.3f} ms")
+        for row in plan:
+            print(f"    {row[-1]}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default=DATABASE_URL)
+    parser.add_argument("--games", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await migrate(engine, target=INDEX_MIGRATION - 1)
+    async with engine.begin() as conn:
+        await seed(conn, args.games, random.Random(args.seed))
+
+    statements = lookups(args.games)
+    print(f"Before indexes ({args.games} games)")
+    async with engine.connect() as conn:
+        await explain(conn, statements, args.repeat)
+
+    await migrate(engine)
+    print(f"\nAfter indexes ({args.games} games)")
+    async with engine.connect() as conn:
+        await explain(conn, statements, args.repeat)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,112 @@
+"""
+Per-call and per-row cost of the ORM and Core read paths.
+
+Times get_game, get_player_ships and get_player_games of BattleshipDatabase
+with and without dto, on a player with --rows games and a game with --rows
+ships for that player. Every table is dropped first, so point it at a
+scratch database.
+
+    python -m battleship.benchmarks.read_paths --url sqlite+aiosqlite:///bench.db
+"""
+
+import argparse
+import asyncio
+import time
+from sqlalchemy import insert
+from battleship.models.base import Base
+from battleship.models.database import DATABASE_URL, BattleshipDatabase
+from battleship.models.game import Game
+from battleship.models.player import Player
+from battleship.models.ship import Ship
+
+
+async def seed(db: BattleshipDatabase, num_rows: int) -> None:
+    async with db.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(Player),
+            [
+                {"id": player_id, "first_name": "", "last_name": "", "email": ""}
+                for player_id in (1, 2)
+            ],
+        )
+        await conn.execute(
+            insert(Game),
+            [
+                {
+                    "player_1_id": 1,
+                    "player_2_id": 2,
+                    "current_player_id": 1,
+                    "status": "in_progress",
+                }
+                for _ in range(num_rows)
+            ],
+        )
+        await conn.execute(
+            insert(Ship),
+            [
+                {
+                    "game_id": 1,
+                    "player_id": 1,
+                    "orientation": "horizontal",
+                    "start_position_x": 0,
+                    "start_position_y": 0,
+                    "size": 2,
+                    "hits": 0,
+                }
+                for _ in range(num_rows)
+            ],
+        )
+
+
+async def time_read(read, repeat: int) -> float:
+    """
+    Returns the mean duration of the read in seconds.
+    """
+    await read()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await read()
+    return (time.perf_counter() - start) / repeat
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default=DATABASE_URL)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    db = BattleshipDatabase(args.url)
+    db.engine.echo = False
+    await seed(db, args.rows)
+
+    reads = {
+        "get_game": (1, lambda dto: db.get_game(1, dto=dto)),
+        "get_player_ships": (
+            args.rows,
+            lambda dto: db.get_player_ships(game_id=1, player_id=1, dto=dto),
+        ),
+        "get_player_games": (
+            args.rows,
+            lambda dto: db.get_player_games(player_id=1, dto=dto),
+        ),
+    }
+    print(
+        f"{'read':<18}{'rows':>6}{'orm us/call':>14}{'dto us/call':>14}"
+        f"{'orm us/row':>12}{'dto us/row':>12}{'speedup':>9}"
+    )
+    for name, (num_rows, read) in reads.items():
+        orm = await time_read(lambda: read(False), args.repeat)
+        dto = await time_read(lambda: read(True), args.repeat)
+        print(
+            f"{name:<18}{num_rows:>6}{1e6 * orm:>14.1f}{1e6 * dto:>14.1f}"
+            f"{1e6 * orm / num_rows:>12.2f}{1e6 * dto / num_rows:>12.2f}"
+            f"{orm / dto:>8.1f}x"
+        )
+    await db.engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
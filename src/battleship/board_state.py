@@ -0,0 +1,152 @@
+"""
+Board state kept on the rows of ships and games.
+
+A ship's hit_mask has bit i set once the i-th cell of the ship from its start
+has been hit, so whether it is sunk, and where, is read from its own row.
+Ships longer than MAX_SHIP_SIZE can no longer be placed, but any placed before
+keep a mask of 0 and are sunk once their hits reach their size. A
+game keeps, for the player on each seat, the number of their ships still
+afloat, and the cells each player has fired at are kept in shot_block rows
+of SHOT_BLOCK_CELLS cells each, so a turn is checked and its outcome decided
+from the game row, the blocks of its shots and the ships hit alone, however
+large the board. BattleshipDatabase keeps all of them up to date in the
+transaction writing the shots.
+"""
+
+from typing import Iterable, Optional
+from battleship.shots import ShotBitset
+
+# Hit masks are stored as 64 bit signed integers
+MAX_SHIP_SIZE = 63
+# Shot blocks are too, each holding the bits of 7 bytes of a ShotBitset
+SHOT_BLOCK_CELLS = 56
+
+
+def seat(game, player_id: int) -> str:
+    """
+    The prefix of the game's columns for the player's seat.
+    """
+    return "player_1" if player_id == game.player_1_id else "player_2"
+
+
+def ship_cell_bit(ship, cell: tuple[int, int]) -> int:
+    """
+    The bit of the ship's hit mask for one of its cells.
+    """
+    x, y = cell
+    return 1 << (x - ship.start_position_x + y - ship.start_position_y)
+
+
+def is_sunk(size: int, hit_mask: int) -> bool:
+    return hit_mask == (1 << size) - 1
+
+
+def has_hit_mask(ship) -> bool:
+    return ship.size <= MAX_SHIP_SIZE
+
+
+def ship_is_sunk(ship, new_bits: int = 0, new_hits: int = 0) -> bool:
+    """
+    Whether the ship is sunk once the new bits of its mask or, for a ship too
+    long for a mask, the new hits are added.
+    """
+    if has_hit_mask(ship):
+        return is_sunk(ship.size, ship.hit_mask | new_bits)
+    return ship.hits + new_hits >= ship.size
+
+
+def get_ships_afloat(game, player_id: int) -> int:
+    return getattr(game, f"{seat(game, player_id)}_ships_afloat")
+
+
+def shot_block(game, cell: tuple[int, int]) -> tuple[int, int]:
+    """
+    The block of a player's shots holding a cell of the game's board, and the
+    cell's bit in the block.
+    """
+    x, y = cell
+    block, index = divmod(y * game.board_width + x, SHOT_BLOCK_CELLS)
+    return block, 1 << index
+
+
+def shot_blocks(game, cells: Iterable[tuple[int, int]]) -> set[int]:
+    """
+    The blocks holding the cells which are on the game's board.
+    """
+    return {
+        shot_block(game, (x, y))[0]
+        for x, y in cells
+        if 0 <= x < game.board_width and 0 <= y < game.board_height
+    }
+
+
+class ShotBlocks:
+    """
+    Some of the blocks of a player's shots, by block, read and updated
+    without the rest of the board. Blocks without a row are empty.
+    """
+
+    def __init__(self, game, blocks: dict[int, int]):
+        self.game = game
+        self.blocks = dict(blocks)
+        # The blocks which have a row, and the ones changed since read
+        self.stored = set(blocks)
+        self.changed: set[int] = set()
+
+    def __contains__(self, cell: tuple[int, int]) -> bool:
+        block, bit = shot_block(self.game, cell)
+        return self.blocks.get(block, 0) & bit != 0
+
+    def add(self, cell: tuple[int, int]) -> None:
+        block, bit = shot_block(self.game, cell)
+        self.blocks[block] = self.blocks.get(block, 0) | bit
+        self.changed.add(block)
+
+
+def shots_bitset(game, blocks: dict[int, int]) -> ShotBitset:
+    """
+    Every cell the player has fired at in the game, from all the blocks of
+    their shots.
+    """
+    shots = ShotBitset(game.board_width, game.board_height)
+    size = SHOT_BLOCK_CELLS // 8
+    for block, bits in blocks.items():
+        start = block * size
+        shots.bits[start : start + size] = bits.to_bytes(size, "little")[
+            : len(shots.bits) - start
+        ]
+    return shots
+
+
+def apply_shots(
+    game,
+    fired: ShotBlocks,
+    defense_player_id: int,
+    shots: list[tuple[int, int]],
+    hit_ships: list[Optional[object]],
+) -> dict[int, int]:
+    """
+    Records the shots in the blocks of the offense player's shots and the
+    ships they sunk on the game, and returns the bits of each hit ship's mask
+    they set. The ships themselves are left as they are.
+    """
+    new_bits: dict[int, int] = {}
+    new_hits: dict[int, int] = {}
+    ships = {}
+    for shot, ship in zip(shots, hit_ships):
+        fired.add(shot)
+        if ship is not None:
+            bit = ship_cell_bit(ship, shot) if has_hit_mask(ship) else 0
+            new_bits[ship.id] = new_bits.get(ship.id, 0) | bit
+            new_hits[ship.id] = new_hits.get(ship.id, 0) + 1
+            ships[ship.id] = ship
+    sunk = sum(
+        1
+        for ship in ships.values()
+        if not ship_is_sunk(ship)
+        and ship_is_sunk(ship, new_bits[ship.id], new_hits[ship.id])
+    )
+
+    afloat = f"{seat(game, defense_player_id)}_ships_afloat"
+    setattr(game, afloat, getattr(game, afloat) - sunk)
+    return new_bits
@@ -0,0 +1,344 @@
+"""
+Server-side bot which can fill a seat in a game.
+
+The bot picks its shots with a probability heatmap: every cell is scored by
+the number of ways the enemy's ships could be placed over it given the shots
+fired so far. Placements over a miss are impossible and placements over hits
+are weighted up, so the bot hunts where ships are likely and then follows up
+on its hits. The bot only knows what a human player knows: the board size,
+the fleet and the result of its own shots.
+
+Rather than enumerating every placement after each shot, the heatmap only
+updates the placements covering the cell which was just fired at. Recording
+a shot costs a few hundred operations whatever the number of shots so far,
+and choosing the next one a single pass over the board.
+"""
+
+import heapq
+import logging
+import random
+from collections import Counter, OrderedDict
+from typing import Optional
+from battleship.fleet import ship_cells
+from battleship.placements import ORIENTATIONS, placements_over
+from battleship.models.game import Game, GameMode, GameStatus
+from battleship.models.guess import GuessResult
+from battleship.models.player import Player
+from battleship.utils import run_game_turn, run_salvo_turn
+
+LOGGER = logging.getLogger(__name__)
+
+# Extra weight of a placement for every hit it covers
+HIT_WEIGHT = 3
+# Random positions tried for each ship before giving up on placing the fleet
+MAX_PLACEMENT_ATTEMPTS = 1000
+# Largest board a bot plays on. The heatmap is built, and rebuilt from the
+# bot's guesses, on the event loop, which takes about 0.1s at this size and
+# grows with the number of cells.
+MAX_BOT_BOARD_CELLS = 2500
+# Players remembered to be bots or not, the least recently looked up dropped
+# first
+MAX_KNOWN_PLAYERS = 10000
+
+
+class Heatmap:
+    """
+    Placement counts of the enemy's fleet over every cell of their board.
+    A placement covering no miss weighs 1 + HIT_WEIGHT * (hits it covers),
+    times the number of ships of its size in the fleet.
+    """
+
+    def __init__(
+        self,
+        board_width: int,
+        board_height: int,
+        fleet: list[int],
+        rng: Optional[random.Random] = None,
+    ):
+        self.board_width = board_width
+        self.board_height = board_height
+        self.ship_counts = Counter(fleet)
+        self.rng = rng if rng is not None else random.Random()
+        self.hits: set[tuple[int, int]] = set()
+        self.misses: set[tuple[int, int]] = set()
+        self.scores = [0] * (board_width * board_height)
+
+        for size, count in self.ship_counts.items():
+            for orientation in ORIENTATIONS:
+                if orientation == "horizontal":
+                    max_x, max_y = board_width - size, board_height - 1
+                else:
+                    max_x, max_y = board_width - 1, board_height - size
+                for y in range(max_y + 1):
+                    for x in range(max_x + 1):
+                        self._add(ship_cells(size, orientation, x, y), count)
+
+    def _add(self, cells: list[tuple[int, int]], weight: int) -> None:
+        for x, y in cells:
+            self.scores[y * self.board_width + x] += weight
+
+    def _placements_over(self, cell: tuple[int, int]):
+        """
+        Yields the cells of every placement on the board covering the cell,
+        with the number of ships which could take that placement.
+        """
+        for size, count in self.ship_counts.items():
+            for cells in placements_over(
+                size, cell, self.board_width, self.board_height
+            ):
+                yield cells, count
+
+    def record(self, cell: tuple[int, int], hit: bool) -> None:
+        """
+        Updates the heatmap with the result of a shot.
+        """
+        if cell in self.hits or cell in self.misses:
+            return
+
+        for cells, count in self._placements_over(cell):
+            if not self.misses.isdisjoint(cells):
+                continue
+            if hit:
+                # Every placement over the cell now covers one more hit
+                self._add(cells, count * HIT_WEIGHT)
+            else:
+                # Placements over a miss are no longer possible
+                covered_hits = len(self.hits.intersection(cells))
+                self._add(cells, -count * (1 + HIT_WEIGHT * covered_hits))
+
+        if hit:
+            self.hits.add(cell)
+        else:
+            self.misses.add(cell)
+
+    def choose_shots(self, num_shots: int = 1) -> list[tuple[int, int]]:
+        """
+        Returns the highest scoring cells which have not been fired at, ties
+        being broken at random.
+        """
+        shot = self.hits | self.misses
+        candidates = (
+            (x, y)
+            for y in range(self.board_height)
+            for x in range(self.board_width)
+            if (x, y) not in shot
+        )
+        scores = self.scores
+        random_tie_break = self.rng.random
+        return heapq.nlargest(
+            num_shots,
+            candidates,
+            key=lambda cell: scores[cell[1] * self.board_width + cell[0]]
+            + random_tie_break(),
+        )
+
+
+class RandomTargets:
+    """
+    Fires at random cells which have not been fired at, as a baseline to
+    measure the heatmap against.
+    """
+
+    def __init__(
+        self,
+        board_width: int,
+        board_height: int,
+        fleet: list[int],
+        rng: Optional[random.Random] = None,
+    ):
+        rng = rng if rng is not None else random.Random()
+        self.fired: set[tuple[int, int]] = set()
+        self.targets = [(x, y) for y in range(board_height) for x in range(board_width)]
+        rng.shuffle(self.targets)
+
+    def record(self, cell: tuple[int, int], hit: bool) -> None:
+        self.fired.add(cell)
+
+    def choose_shots(self, num_shots: int = 1) -> list[tuple[int, int]]:
+        shots = []
+        while len(shots) < num_shots and self.targets:
+            cell = self.targets.pop()
+            if cell not in self.fired:
+                shots.append(cell)
+        # Shots are only fired once the whole turn is chosen
+        self.targets.extend(reversed(shots))
+        return shots
+
+
+# Ways of choosing a bot's shots, by name
+STRATEGIES = {
+    "heatmap": Heatmap,
+    "random": RandomTargets,
+}
+
+
+def random_fleet(
+    board_width: int,
+    board_height: int,
+    fleet: list[int],
+    rng: Optional[random.Random] = None,
+) -> list[dict]:
+    """
+    Returns a placement of the fleet chosen at random, largest ships first,
+    with every ship on the board and no two ships overlapping. Raises a
+    ValueError if the fleet does not seem to fit on the board.
+    """
+    rng = rng if rng is not None else random.Random()
+    occupied: set[tuple[int, int]] = set()
+    ships = []
+    for size in sorted(fleet, reverse=True):
+        orientations = [
+            orientation
+            for orientation, length in zip(ORIENTATIONS, (board_width, board_height))
+            if size <= length
+        ]
+        for _ in range(MAX_PLACEMENT_ATTEMPTS):
+            orientation = rng.choice(orientations)
+            if orientation == "horizontal":
+                x = rng.randrange(board_width - size + 1)
+                y = rng.randrange(board_height)
+            else:
+                x = rng.randrange(board_width)
+                y = rng.randrange(board_height - size + 1)
+            cells = ship_cells(size, orientation, x, y)
+            if occupied.isdisjoint(cells):
+                break
+        else:
+            raise ValueError(
+                f"Could not place {fleet=} on a {board_width}x{board_height} board"
+            )
+        occupied.update(cells)
+        ships.append(
+            {
+                "size": size,
+                "orientation": orientation,
+                "start_position_x": x,
+                "start_position_y": y,
+            }
+        )
+    return ships
+
+
+class BotPlayer:
+    """
+    A bot's seat in one game. Its targeting state is kept between turns and
+    rebuilt from the bot's previous guesses when the bot is loaded.
+    """
+
+    def __init__(
+        self,
+        game: Game,
+        player_id: int,
+        guesses: list = (),
+        strategy: str = "heatmap",
+        rng: Optional[random.Random] = None,
+    ):
+        self.game_id = game.id
+        self.player_id = player_id
+        self.opponent_id = (
+            game.player_2_id if player_id == game.player_1_id else game.player_1_id
+        )
+        self.mode = game.mode
+        self.targets = STRATEGIES[strategy](
+            game.board_width, game.board_height, game.fleet, rng
+        )
+        for guess in guesses:
+            self.targets.record(
+                (guess.position_x, guess.position_y), guess.result != GuessResult.miss
+            )
+
+    async def play_turn(self, db) -> list[tuple[tuple[int, int], GuessResult]]:
+        """
+        Plays the bot's turn through the same turn logic as human players and
+        returns every shot fired with its result.
+        """
+        if self.mode == GameMode.salvo:
+            ships = await db.get_player_ships(
+                game_id=self.game_id, player_id=self.player_id, dto=True
+            )
+            ships_afloat = sum(1 for ship in ships if ship.hits < ship.size)
+            shots = self.targets.choose_shots(ships_afloat)
+            results = await run_salvo_turn(
+                self.game_id, shots, self.player_id, self.opponent_id, db
+            )
+        else:
+            shots = self.targets.choose_shots()
+            results = [
+                await run_game_turn(
+                    self.game_id,
+                    shots[0][0],
+                    shots[0][1],
+                    self.player_id,
+                    self.opponent_id,
+                    db,
+                )
+            ]
+
+        for shot, result in zip(shots, results):
+            self.targets.record(shot, result != GuessResult.miss)
+        LOGGER.info(f"Bot {self.player_id=} in {self.game_id=} fired {shots=}")
+        return list(zip(shots, results))
+
+
+class BotRegistry:
+    """
+    Bots of the games being played on this server, created on their first
+    turn and dropped once their game is over, whoever won it.
+    """
+
+    def __init__(self, max_known_players: int = MAX_KNOWN_PLAYERS):
+        self.bots: dict[int, BotPlayer] = {}
+        self.max_known_players = max_known_players
+        self.bot_player_ids: OrderedDict[int, bool] = OrderedDict()
+
+    def _remember(self, player_id: int, is_bot: bool) -> None:
+        self.bot_player_ids[player_id] = is_bot
+        self.bot_player_ids.move_to_end(player_id)
+        while len(self.bot_player_ids) > self.max_known_players:
+            self.bot_player_ids.popitem(last=False)
+
+    async def create_bot_player(self, db) -> Player:
+        player = Player(first_name="Bot", last_name="", email="", is_bot=True)
+        player = await db.add_player(player)
+        self._remember(player.id, True)
+        return player
+
+    async def is_bot(self, player_id: int, db) -> bool:
+        if player_id in self.bot_player_ids:
+            self.bot_player_ids.move_to_end(player_id)
+            return self.bot_player_ids[player_id]
+        player = await db.get_player_by_id(player_id)
+        is_bot = player is not None and player.is_bot
+        self._remember(player_id, is_bot)
+        return is_bot
+
+    def finish(self, game_id: int) -> None:
+        """
+        Drops the bot of a game which is over.
+        """
+        self.bots.pop(game_id, None)
+
+    async def play(self, game_id: int, db) -> list[tuple[tuple[int, int], GuessResult]]:
+        """
+        Plays the bot's turn if it is a bot's turn in the game, and returns
+        the shots it fired with their results.
+        """
+        game = await db.get_game(game_id, dto=True)
+        if game.status == GameStatus.completed:
+            self.finish(game_id)
+            return []
+        if not await self.is_bot(game.current_player_id, db):
+            return []
+
+        bot = self.bots.get(game_id)
+        if bot is None:
+            game_details = await db.get_game_details(game_id, game.current_player_id)
+            bot = BotPlayer(
+                game, game.current_player_id, game_details["player_guesses"]
+            )
+            self.bots[game_id] = bot
+
+        moves = await bot.play_turn(db)
+        if any(result == GuessResult.victory for _, result in moves):
+            self.finish(game_id)
+        return moves
@@ -0,0 +1,23 @@
+"""
+Errors raised where games are played and stored, which know nothing of how
+they reach the player. battleship.api.errors turns them into HTTP errors for
+the views and the websocket handlers.
+"""
+
+
+class GameRuleError(Exception):
+    """
+    A move the rules of the game do not allow, e.g. firing out of turn.
+    """
+
+
+class NotFoundError(Exception):
+    """
+    A game or ship which does not exist.
+    """
+
+
+class WriteConflictError(Exception):
+    """
+    A write to a game which kept losing to other writes to it.
+    """
@@ -0,0 +1,104 @@
+"""
+Spatial index of a player's ships.
+
+Boards can be much larger than the standard 10x10, so the ships of a player
+are indexed by the cells they cover rather than by a bitboard of the whole
+board. Memory grows with the number of ships and finding the ship at a cell
+is a single dictionary lookup whatever the size of the board.
+"""
+
+from typing import Iterable, Optional
+from battleship.models.ship import Ship
+from battleship.placements import Cells, placement_cells
+
+
+def ship_cells(
+    size: int, orientation: str, start_position_x: int, start_position_y: int
+) -> Cells:
+    """
+    Returns the cells covered by a ship, from the placement table. The tuple
+    is shared and must not be modified.
+    """
+    return placement_cells(size, orientation, start_position_x, start_position_y)
+
+
+def fits_on_board(
+    size: int,
+    orientation: str,
+    start_position_x: int,
+    start_position_y: int,
+    board_width: int,
+    board_height: int,
+) -> bool:
+    """
+    Determine if every cell of the ship is on the board.
+    """
+    if size < 1 or start_position_x < 0 or start_position_y < 0:
+        return False
+    if orientation == "horizontal":
+        return (
+            start_position_x + size <= board_width and start_position_y < board_height
+        )
+    return start_position_x < board_width and start_position_y + size <= board_height
+
+
+class Fleet(list):
+    """
+    A list of a player's ships which also maps every covered cell to its ship.
+    Ships must be added, replaced and removed through the methods below so the
+    index stays in sync with the list.
+    """
+
+    def __init__(self, ships: Iterable[Ship] = ()):
+        super().__init__()
+        self.cells: dict[tuple[int, int], Ship] = {}
+        for ship in ships:
+            self.add(ship)
+
+    def add(self, ship: Ship) -> None:
+        self.append(ship)
+        for cell in self._cells_of(ship):
+            self.cells[cell] = ship
+
+    def remove_ship(self, ship_id: int) -> Optional[Ship]:
+        for ind, ship in enumerate(self):
+            if ship.id == ship_id:
+                del self[ind]
+                for cell in self._cells_of(ship):
+                    del self.cells[cell]
+                return ship
+        return None
+
+    def replace(self, updated_ship: Ship) -> None:
+        self.remove_ship(updated_ship.id)
+        self.add(updated_ship)
+
+    def ship_at(self, cell: tuple[int, int]) -> Optional[Ship]:
+        return self.cells.get(cell)
+
+    def overlapping_ship(
+        self, cells: Iterable[tuple[int, int]], ignore_ship_id: int = None
+    ) -> Optional[Ship]:
+        """
+        Returns a ship covering any of the cells, other than the ignored one.
+        """
+        for cell in cells:
+            ship = self.cells.get(cell)
+            if ship is not None and ship.id != ignore_ship_id:
+                return ship
+        return None
+
+    @staticmethod
+    def _cells_of(ship: Ship) -> Cells:
+        return ship_cells(
+            ship.size, ship.orientation, ship.start_position_x, ship.start_position_y
+        )
+
+
+def as_fleet(ships: Iterable[Ship]) -> Fleet:
+    """
+    Returns the ships as an indexed fleet, reusing the index if there is one.
+    """
+    if isinstance(ships, Fleet):
+        return ships
+    return Fleet(ships)
@@ -0,0 +1,109 @@
+"""
+Shapes a player's view of a game into the game details response.
+
+BattleshipDatabase reads the whole view in one UNION ALL query whose rows
+all have the columns below, and they are shaped straight into the
+response. In-memory stores shape their objects into the same response.
+
+    kind   id     player_id          int_1       int_2        int_3             int_4         text_1       text_2  text_3
+    game   id     current_player_id  player_1_id player_2_id  board_width       board_height  status       mode    fleet
+    ship   id     player_id          size        start_x      start_y                         orientation
+    guess  id     offense_player_id  position_x  position_y                                   result
+"""
+
+import json
+from typing import Iterable
+
+
+def game_response(game) -> dict:
+    return {
+        "player_1_id": game.player_1_id,
+        "player_2_id": game.player_2_id,
+        "current_player_id": game.current_player_id,
+        "status": game.status,
+        "mode": game.mode,
+        "board_width": game.board_width,
+        "board_height": game.board_height,
+        "fleet": game.fleet,
+    }
+
+
+def ship_response(ship) -> dict:
+    return {
+        "id": ship.id,
+        "size": ship.size,
+        "orientation": ship.orientation,
+        "start_position_x": ship.start_position_x,
+        "start_position_y": ship.start_position_y,
+    }
+
+
+def guess_response(guess) -> dict:
+    return {
+        "position_x": guess.position_x,
+        "position_y": guess.position_y,
+        "result": guess.result,
+    }
+
+
+def game_details_response(
+    game, player_ships: Iterable, player_guesses: Iterable, enemy_guesses: Iterable
+) -> dict:
+    """
+    Shapes a game and a player's ships and guesses, as ORM objects.
+    """
+    return {
+        "game": game_response(game),
+        "player_ships": [ship_response(ship) for ship in player_ships],
+        "player_guesses": [guess_response(guess) for guess in player_guesses],
+        "enemy_guesses": [guess_response(guess) for guess in enemy_guesses],
+    }
+
+
+def game_details_from_rows(rows: Iterable[tuple], player_id: int) -> dict:
+    """
+    Shapes the rows of the game details query. Returns None if there is no
+    game row, i.e. the game does not exist.
+    """
+    game = None
+    player_ships = []
+    player_guesses = []
+    enemy_guesses = []
+    for row in rows:
+        kind, row_id, row_player_id, int_1, int_2, int_3, int_4 = row[:7]
+        text_1, text_2, text_3 = row[7:]
+        if kind == "guess":
+            guess = {"position_x": int_1, "position_y": int_2, "result": text_1}
+            if row_player_id == player_id:
+                player_guesses.append(guess)
+            else:
+                enemy_guesses.append(guess)
+        elif kind == "ship":
+            player_ships.append(
+                {
+                    "id": row_id,
+                    "size": int_1,
+                    "orientation": text_1,
+                    "start_position_x": int_2,
+                    "start_position_y": int_3,
+                }
+            )
+        else:
+            game = {
+                "player_1_id": int_1,
+                "player_2_id": int_2,
+                "current_player_id": row_player_id,
+                "status": text_1,
+                "mode": text_2,
+                "board_width": int_3,
+                "board_height": int_4,
+                "fleet": json.loads(text_3),
+            }
+    if game is None:
+        return None
+    return {
+        "game": game,
+        "player_ships": player_ships,
+        "player_guesses": player_guesses,
+        "enemy_guesses": enemy_guesses,
+    }
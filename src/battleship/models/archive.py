@@ -0,0 +1,113 @@
+"""
+Archive tier of completed games.
+
+Ships and guesses are only written while a game is in progress, but stay in
+the same tables as the games being played once it is over, and the live
+tables and their indexes grow with every game ever played. Once a game is
+completed, BattleshipDatabase.archive_completed_games moves its ships and
+guesses, ids included, to archived_ship and archived_guess in a single
+transaction, so the rows of a game are always all in one tier. Completed
+games are found by the status of their game row, which itself stays where it
+is. Reads of a completed game's ships and guesses which
+find nothing in the live tables fall through to the archive. Behind a
+GameStateCache, games with writes still on their way to the database are left
+for a later batch.
+
+An Archiver moves completed games in the background, a batch at a time.
+"""
+
+import asyncio
+import contextlib
+import logging
+from sqlalchemy import Column, Index, Integer, Table
+from battleship.models.base import Base
+from battleship.models.guess import Guess
+from battleship.models.ship import Ship
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_ARCHIVE_BATCH_SIZE = 100
+DEFAULT_ARCHIVE_INTERVAL = 60.0
+
+
+def archive_columns(model) -> list[Column]:
+    """
+    Copies of the columns of the model's table, without their foreign keys
+    since the rows they point to may be archived or not. A foreign key column
+    takes its type from the column it points to, which may not be defined yet,
+    so it is copied as the Integer every id is.
+    """
+    return [
+        Column(
+            column.name,
+            Integer() if column.foreign_keys else column.type,
+            primary_key=column.primary_key,
+            autoincrement=False,
+            nullable=column.nullable,
+        )
+        for column in model.__table__.c
+    ]
+
+
+class ArchivedShip(Base):
+    __table__ = Table(
+        "archived_ship",
+        Base.metadata,
+        *archive_columns(Ship),
+        Index("ix_archived_ship_game_id_player_id", "game_id", "player_id"),
+    )
+
+
+class ArchivedGuess(Base):
+    __table__ = Table(
+        "archived_guess",
+        Base.metadata,
+        *archive_columns(Guess),
+        Index(
+            "ix_archived_guess_game_id_offense_player_id",
+            "game_id",
+            "offense_player_id",
+        ),
+    )
+
+
+class Archiver:
+    """
+    Archives completed games with db.archive_completed_games, batch_size
+    games at a time, and waits interval seconds whenever no full batch was
+    left.
+    """
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = DEFAULT_ARCHIVE_BATCH_SIZE,
+        interval: float = DEFAULT_ARCHIVE_INTERVAL,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.interval = interval
+        self._task: asyncio.Task = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                game_ids = await self.db.archive_completed_games(self.batch_size)
+            except Exception:
+                LOGGER.exception("Failed to archive completed games")
+                game_ids = []
+            if game_ids:
+                LOGGER.info(f"Archived {len(game_ids)} completed games")
+            if len(game_ids) < self.batch_size:
+                await asyncio.sleep(self.interval)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
@@ -0,0 +1,314 @@
+"""
+BattleshipDatabase which plays turns straight through asyncpg.
+
+Turns run the same few statements many times a second, and compiling them
+through SQLAlchemy and mapping their rows to ORM objects is a measurable
+share of the CPU spent on a turn. AsyncpgDatabase keeps their SQL written
+out below and runs it on its own asyncpg pool, whose connections prepare
+each statement the first time they run it and keep it in their statement
+cache. Rows come back as the DTOs of battleship.models.dto. Everything else
+goes through SQLAlchemy as in BattleshipDatabase, which keeps its own pool.
+PostgreSQL only.
+
+The server uses it with DATABASE_BACKEND=asyncpg.
+"""
+
+import asyncio
+import json
+import logging
+from collections import namedtuple
+from types import SimpleNamespace
+from typing import Optional
+import asyncpg
+from sqlalchemy.orm.exc import StaleDataError
+from battleship.board_state import (
+    ShotBlocks,
+    apply_shots,
+    get_ships_afloat,
+    shot_blocks,
+)
+from battleship.errors import NotFoundError
+from battleship.rules import (
+    check_salvo,
+    check_shots,
+    check_turn,
+    resolve_salvo,
+    salvo_results,
+)
+from battleship.models.database import BattleshipDatabase, writes
+from battleship.models.dto import GameRow, ShipRow
+from battleship.models.game import GameMode, GameStatus
+from battleship.models.guess import GuessResult
+from battleship.models.replicas import DEFAULT_REPLICA_LAG, game_key
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 10
+
+# The game, its board state, described in battleship.board_state, and its
+# version
+TURN_GAME_COLUMNS = (
+    *GameRow._fields,
+    "player_1_ships_afloat",
+    "player_2_ships_afloat",
+    "version",
+)
+TurnShipRow = namedtuple("TurnShipRow", (*ShipRow._fields, "hit_mask"))
+
+# The statements of the turn hot path, by name
+STATEMENTS = {
+    "battleship_read_game": (
+        f"SELECT {', '.join(TURN_GAME_COLUMNS)} FROM game WHERE id = $1"
+    ),
+    "battleship_read_shots": (
+        "SELECT block, bits FROM shot_block "
+        "WHERE game_id = $1 AND player_id = $2 AND block = ANY($3::integer[])"
+    ),
+    "battleship_write_shots": (
+        "INSERT INTO shot_block (game_id, player_id, block, bits) "
+        "SELECT $1, $2, * FROM unnest($3::integer[], $4::bigint[]) "
+        "ON CONFLICT (game_id, player_id, block) DO UPDATE SET bits = excluded.bits"
+    ),
+    "battleship_player_ships": (
+        f"SELECT {', '.join(TurnShipRow._fields)} FROM ship "
+        "WHERE game_id = $1 AND player_id = $2"
+    ),
+    "battleship_add_ship_hits": (
+        "UPDATE ship SET hits = ship.hits + hit.hits, "
+        "hit_mask = ship.hit_mask | hit.mask "
+        "FROM unnest($1::integer[], $2::integer[], $3::bigint[]) "
+        "AS hit(id, hits, mask) "
+        "WHERE ship.id = hit.id RETURNING ship.hits, ship.game_id"
+    ),
+    "battleship_update_game": (
+        "UPDATE game SET current_player_id = $2, status = $3::gamestatus, "
+        "player_1_ships_afloat = $4, player_2_ships_afloat = $5, "
+        "version = version + 1 WHERE id = $1 AND version = $6 RETURNING version"
+    ),
+    "battleship_add_guesses": (
+        "INSERT INTO guess "
+        "(game_id, offense_player_id, ship_id, position_x, position_y, result) "
+        "SELECT * FROM unnest($1::integer[], $2::integer[], $3::integer[], "
+        "$4::integer[], $5::integer[], $6::guessresult[])"
+    ),
+}
+
+
+async def init_connection(conn: asyncpg.Connection) -> None:
+    await conn.set_type_codec(
+        "json", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+    )
+
+
+def guess_columns(guesses: list[dict]) -> list[list]:
+    """
+    The guesses as one array per column of battleship_add_guesses.
+    """
+    return [
+        [guess["game_id"] for guess in guesses],
+        [guess["offense_player_id"] for guess in guesses],
+        [guess["ship_id"] for guess in guesses],
+        [guess["position_x"] for guess in guesses],
+        [guess["position_y"] for guess in guesses],
+        [GuessResult(guess["result"]).value for guess in guesses],
+    ]
+
+
+class AsyncpgDatabase(BattleshipDatabase):
+    def __init__(
+        self,
+        URL=None,
+        replica_URLs: list = None,
+        replica_lag: float = DEFAULT_REPLICA_LAG,
+        pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        super().__init__(URL, replica_URLs, replica_lag)
+        if self.engine.dialect.name != "postgresql":
+            raise ValueError("AsyncpgDatabase needs a PostgreSQL database")
+        self.pool_size = pool_size
+        self._pool: Optional[asyncio.Future] = None
+
+    async def pool(self) -> asyncpg.Pool:
+        """
+        The asyncpg pool, created on first use.
+        """
+        if self._pool is None:
+            dsn = self.engine.url.set(drivername="postgresql")
+            self._pool = asyncio.ensure_future(
+                asyncpg.create_pool(
+                    dsn.render_as_string(hide_password=False),
+                    min_size=1,
+                    max_size=self.pool_size,
+                    init=init_connection,
+                )
+            )
+        return await self._pool
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            await (await self._pool).close()
+            self._pool = None
+        await super().close()
+
+    async def _play(
+        self,
+        conn: asyncpg.Connection,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+        mode: GameMode,
+    ) -> list[GuessResult]:
+        row = await conn.fetchrow(STATEMENTS["battleship_read_game"], game_id)
+        if row is None:
+            raise NotFoundError(f"{game_id=} not found")
+        game = SimpleNamespace(**dict(zip(TURN_GAME_COLUMNS, row)))
+        check_turn(game, offense_player_id, mode)
+        if mode == GameMode.salvo:
+            check_salvo(shots, get_ships_afloat(game, offense_player_id))
+        fired = ShotBlocks(
+            game,
+            dict(
+                await conn.fetch(
+                    STATEMENTS["battleship_read_shots"],
+                    game_id,
+                    offense_player_id,
+                    list(shot_blocks(game, shots)),
+                )
+            ),
+        )
+        check_shots(game, shots, fired)
+
+        defense_ships = [
+            TurnShipRow(*row)
+            for row in await conn.fetch(
+                STATEMENTS["battleship_player_ships"], game_id, defense_player_id
+            )
+        ]
+        hit_ships, hit_counts = resolve_salvo(defense_ships, shots)
+        new_bits = apply_shots(game, fired, defense_player_id, shots, hit_ships)
+        victory = bool(hit_counts) and get_ships_afloat(game, defense_player_id) == 0
+        results = salvo_results(hit_ships, victory)
+        LOGGER.info(
+            f"{offense_player_id=} fired {shots=} at {defense_player_id=} with {results=}"
+        )
+
+        version = await conn.fetchval(
+            STATEMENTS["battleship_update_game"],
+            game_id,
+            game.current_player_id if victory else defense_player_id,
+            GameStatus.completed.value if victory else GameStatus(game.status).value,
+            game.player_1_ships_afloat,
+            game.player_2_ships_afloat,
+            game.version,
+        )
+        if version is None:
+            raise StaleDataError(f"{game_id=} is no longer at version {game.version}")
+        changed = sorted(fired.changed)
+        await conn.fetch(
+            STATEMENTS["battleship_write_shots"],
+            game_id,
+            offense_player_id,
+            changed,
+            [fired.blocks[block] for block in changed],
+        )
+        if hit_counts:
+            await conn.fetch(
+                STATEMENTS["battleship_add_ship_hits"],
+                list(hit_counts),
+                list(hit_counts.values()),
+                [new_bits[ship_id] for ship_id in hit_counts],
+            )
+        await conn.fetch(
+            STATEMENTS["battleship_add_guesses"],
+            *guess_columns(
+                [
+                    {
+                        "game_id": game_id,
+                        "offense_player_id": offense_player_id,
+                        "ship_id": None if ship is None else ship.id,
+                        "position_x": shot[0],
+                        "position_y": shot[1],
+                        "result": result,
+                    }
+                    for shot, ship, result in zip(shots, hit_ships, results)
+                ]
+            ),
+        )
+        return results
+
+    async def _play_in_transaction(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+        mode: GameMode,
+    ) -> list[GuessResult]:
+        async with (await self.pool()).acquire() as conn, conn.transaction():
+            return await self._play(
+                conn, game_id, shots, offense_player_id, defense_player_id, mode
+            )
+
+    @writes
+    async def play_turn(
+        self,
+        game_id: int,
+        guess_position_x: int,
+        guess_position_y: int,
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> GuessResult:
+        """
+        Plays a turn in a single transaction, updating the game only if its
+        version is still the one read like BattleshipDatabase.play_turn.
+        """
+        (result,) = await self._retry_turn(
+            self._play_in_transaction,
+            game_id,
+            [(guess_position_x, guess_position_y)],
+            offense_player_id,
+            defense_player_id,
+            GameMode.classic,
+        )
+        self._wrote_turn(game_id, offense_player_id, defense_player_id)
+        return result
+
+    @writes
+    async def play_salvo(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> list[GuessResult]:
+        results = await self._retry_turn(
+            self._play_in_transaction,
+            game_id,
+            shots,
+            offense_player_id,
+            defense_player_id,
+            GameMode.salvo,
+        )
+        self._wrote_turn(game_id, offense_player_id, defense_player_id)
+        return results
+
+    @writes
+    async def increment_ship_hits(self, ship_id: int) -> int:
+        async with (await self.pool()).acquire() as conn:
+            new_hits_value, game_id = await conn.fetchrow(
+                STATEMENTS["battleship_add_ship_hits"], [ship_id], [1], [0]
+            )
+        self.router.wrote(game_key(game_id))
+        return new_hits_value
+
+    @writes
+    async def increment_ships_hits(self, hits: dict[int, int]) -> None:
+        async with (await self.pool()).acquire() as conn:
+            rows = await conn.fetch(
+                STATEMENTS["battleship_add_ship_hits"],
+                list(hits),
+                list(hits.values()),
+                [0] * len(hits),
+            )
+        self.router.wrote(*{game_key(game_id) for _, game_id in rows})
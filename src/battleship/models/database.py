@@ -1,132 +1,1011 @@
+import functools
 import logging
+import os
+from collections import Counter, defaultdict
+from typing import Collection, Optional
 from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy import select, update, or_
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy import (
+    BigInteger,
+    Integer,
+    String,
+    and_,
+    bindparam,
+    case,
+    cast,
+    delete,
+    event,
+    exists,
+    insert,
+    literal,
+    literal_column,
+    null,
+    or_,
+    select,
+    union,
+    union_all,
+    update,
+)
+from sqlalchemy.orm.exc import StaleDataError
+from battleship.board_state import (
+    ShotBlocks,
+    apply_shots,
+    get_ships_afloat,
+    seat,
+    shot_blocks,
+    shots_bitset,
+)
+from battleship.errors import NotFoundError, WriteConflictError
+from battleship.game_details import game_details_from_rows
+from battleship.models.dto import (
+    SELECT_GAME_ROWS,
+    SELECT_SHIP_ROWS,
+    GameRow,
+    ShipRow,
+    select_rows,
+)
+from battleship.models.archive import ArchivedGuess, ArchivedShip
 from battleship.models.player import Player
-from battleship.models.game import Game
-from battleship.models.ship import Ship
-from battleship.models.guess import Guess
+from battleship.models.game import Game, GameStatus
+from battleship.models.ship import Ship, ShipOrientation
+from battleship.models.shot_block import ShotBlock
+from battleship.models.guess import Guess, GuessResult
+from battleship.models.game import GameMode
+from battleship.models.replicas import (
+    DEFAULT_REPLICA_LAG,
+    ReplicaRouter,
+    game_key,
+    player_key,
+)
+from battleship.models.sqlite import SingleWriter, is_sqlite, set_sqlite_pragmas
+from battleship.shots import ShotBitset
+from battleship.rules import (
+    check_fleet,
+    check_salvo,
+    check_shots,
+    check_turn,
+    resolve_salvo,
+    salvo_results,
+)
 
 DB_USERNAME = "testuser"
 DB_PASSWD = "testpassword"
 DB_HOST = "localhost"
 DB_PORT = "5432"
 DB_NAME = "foo"
-DATABASE_URL = (
-    f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# e.g. sqlite+aiosqlite:///battleship.db to run without a database server
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
 )
+# Comma separated URLs of read replicas of DATABASE_URL
+DATABASE_REPLICA_URLS = [
+    url for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url
+]
 
 LOGGER = logging.getLogger(__name__)
 
+# Times a turn is played against a fresher game before giving up
+MAX_TURN_ATTEMPTS = 5
+
+
+def increment_ships_hits_stmt(
+    hits: dict[int, int], hit_masks: Optional[dict[int, int]] = None
+):
+    """
+    Builds a single UPDATE adding the given number of hits to each ship, and
+    optionally setting bits of their hit masks.
+    """
+    values = {"hits": Ship.hits + case(dict(hits), value=Ship.id, else_=0)}
+    if hit_masks:
+        bits = {
+            ship_id: literal(mask, BigInteger) for ship_id, mask in hit_masks.items()
+        }
+        values["hit_mask"] = Ship.hit_mask.bitwise_or(
+            case(bits, value=Ship.id, else_=0)
+        )
+    return (
+        update(Ship)
+        .where(Ship.id.in_(hits))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+GUESS_COLUMNS = (
+    "game_id",
+    "offense_player_id",
+    "ship_id",
+    "position_x",
+    "position_y",
+    "result",
+)
+
+
+def guess_values(guess: Guess) -> dict:
+    return {column: getattr(guess, column) for column in GUESS_COLUMNS}
+
+
+def ship_covers_clause(cell: tuple[int, int]):
+    """
+    Matches the ships covering the cell, like battleship.rules.ship_covers.
+    """
+    x, y = cell
+    return or_(
+        and_(
+            Ship.orientation == ShipOrientation.horizontal,
+            Ship.start_position_y == y,
+            Ship.start_position_x <= x,
+            Ship.start_position_x + Ship.size > x,
+        ),
+        and_(
+            Ship.orientation == ShipOrientation.vertical,
+            Ship.start_position_x == x,
+            Ship.start_position_y <= y,
+            Ship.start_position_y + Ship.size > y,
+        ),
+    )
+
+
+def add_ships_afloat_stmt(game_id: int, player_id: int, count: int):
+    """
+    Builds an UPDATE counting newly placed ships of the player as afloat.
+    """
+    values = {
+        f"{player}_ships_afloat": getattr(Game, f"{player}_ships_afloat")
+        + case((getattr(Game, f"{player}_id") == player_id, count), else_=0)
+        for player in ("player_1", "player_2")
+    }
+    return (
+        update(Game)
+        .where(Game.id == game_id)
+        .values(**values, version=Game.version + 1)
+    )
+
+
+def player_game_ids_stmt(
+    player_id: int,
+    status: GameStatus = None,
+    cursor: int = None,
+    limit: int = None,
+):
+    """
+    Selects the ids of the games the player has a seat in, newest first,
+    below the cursor if given. Each seat is read from its (player_N_id, id)
+    index, or its (player_N_id, status, id) index given a status, newest first
+    and stops after limit games, so a page costs the same however many games
+    the player has.
+    """
+    seats = []
+    for seat_column in (Game.player_1_id, Game.player_2_id):
+        stmt = select(Game.id).where(seat_column == player_id)
+        if status is not None:
+            stmt = stmt.where(Game.status == status)
+        if cursor is not None:
+            stmt = stmt.where(Game.id < cursor)
+        stmt = stmt.order_by(Game.id.desc()).limit(limit).subquery()
+        seats.append(select(stmt.c.id))
+    return union(*seats)
+
+
+def game_details_stmt(ship=Ship, guess=Guess):
+    """
+    A game, a player's ships and every guess of the game as rows of the same
+    columns, described in battleship.game_details, from the given tables of
+    ships and guesses.
+    """
+    game_id = bindparam("game_id", type_=Integer)
+    player_id = bindparam("player_id", type_=Integer)
+    no_int = cast(null(), Integer)
+    no_text = cast(null(), String)
+    game = select(
+        literal_column("'game'", String).label("kind"),
+        Game.id.label("id"),
+        Game.current_player_id.label("player_id"),
+        Game.player_1_id.label("int_1"),
+        Game.player_2_id.label("int_2"),
+        Game.board_width.label("int_3"),
+        Game.board_height.label("int_4"),
+        cast(Game.status, String).label("text_1"),
+        cast(Game.mode, String).label("text_2"),
+        cast(Game.fleet, String).label("text_3"),
+    ).where(Game.id == game_id)
+    ships = select(
+        literal_column("'ship'", String),
+        ship.id,
+        ship.player_id,
+        ship.size,
+        ship.start_position_x,
+        ship.start_position_y,
+        no_int,
+        cast(ship.orientation, String),
+        no_text,
+        no_text,
+    ).where(ship.game_id == game_id, ship.player_id == player_id)
+    guesses = select(
+        literal_column("'guess'", String),
+        guess.id,
+        guess.offense_player_id,
+        guess.position_x,
+        guess.position_y,
+        no_int,
+        no_int,
+        cast(guess.result, String),
+        no_text,
+        no_text,
+    ).where(guess.game_id == game_id)
+    details = union_all(game, ships, guesses)
+    return details.order_by(details.selected_columns.id)
+
+
+GAME_DETAILS_STMT = game_details_stmt()
+
+# The live tables of ships and guesses, then the archive reads fall through to
+TIERS = ((Ship, Guess), (ArchivedShip, ArchivedGuess))
+SHIP_ROWS = {Ship: SELECT_SHIP_ROWS, ArchivedShip: select_rows(ShipRow, ArchivedShip)}
+ARCHIVED_GAME_DETAILS_STMT = game_details_stmt(ArchivedShip, ArchivedGuess)
+
+
+def create_engine(URL) -> AsyncEngine:
+    """
+    Creates an engine for the URL. An engine is returned as is.
+    """
+    if isinstance(URL, AsyncEngine):
+        return URL
+    engine = create_async_engine(URL, echo=True)
+    if is_sqlite(engine):
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragmas)
+    return engine
+
+
+def writes(method):
+    """
+    Marks a method which writes to the database. On SQLite it is run by the
+    single writer instead of straight away.
+    """
+
+    @functools.wraps(method)
+    async def write(self, *args, **kwargs):
+        if self.writer is None:
+            return await method(self, *args, **kwargs)
+        return await self.writer.submit(method, self, *args, **kwargs)
 
-class BattleshipDatabase:
-    def __init__(self, URL=None):
+    return write
+
+
+def can_play_whole_turns(db) -> bool:
+    """
+    Whether db plays each turn whole, checked and written in one call to
+    play_turn or play_salvo, which it says by setting plays_whole_turns.
+    Turns on any other database are played by battleship.utils through its
+    reads and writes one by one.
+    """
+    # Only an explicit True counts, not whatever a stand-in answers
+    return getattr(db, "plays_whole_turns", False) is True
+
+
+class BaseDatabase:
+    """
+    Writes go to the primary database at URL. Reads are spread over the
+    replicas, if any, except reads of a game or player written to within
+    replica_lag seconds, which go to the primary so a player always reads
+    their own moves.
+
+    Players and games are created and read here. How a game is played, its
+    ships and guesses, is stored by the subclasses.
+    """
+
+    def __init__(
+        self,
+        URL=None,
+        replica_URLs: list = None,
+        replica_lag: float = DEFAULT_REPLICA_LAG,
+    ):
         if URL is None:
             URL = DATABASE_URL
-        self.engine = create_async_engine(URL, echo=True)
+        if replica_URLs is None:
+            replica_URLs = DATABASE_REPLICA_URLS
+        self.engine = create_engine(URL)
+        self.replicas = [create_engine(replica_URL) for replica_URL in replica_URLs]
+        self.router = ReplicaRouter(self.engine, self.replicas, replica_lag)
         self.async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        self.writer = SingleWriter() if is_sqlite(self.engine) else None
+        # RETURNING is used where the database supports it, e.g. not on
+        # SQLite before 3.35
+        self.update_returning = self.engine.dialect.update_returning
+        self.insert_many_returning = self.engine.dialect.insert_executemany_returning
 
+    async def close(self) -> None:
+        if self.writer is not None:
+            await self.writer.close()
+        await self.engine.dispose()
+        for replica in self.replicas:
+            await replica.dispose()
+
+    def _read_session(self, *keys):
+        """
+        A session on the engine to read the keys from.
+        """
+        return self.async_session(bind=self.router.reader(*keys))
+
+    async def _insert_ids(self, session, model, rows: list[dict]) -> list[int]:
+        """
+        Inserts the rows and returns their ids in the order of the rows.
+        Without RETURNING for multi-row INSERTs, the rows are inserted one by
+        one by the ORM instead.
+        """
+        if self.insert_many_returning:
+            stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+            result = await session.scalars(stmt, rows)
+            return result.all()
+        objects = [model(**row) for row in rows]
+        session.add_all(objects)
+        await session.flush()
+        return [obj.id for obj in objects]
+
+    @writes
     async def add_game(self, game: Game):
         async with self.async_session() as session:
             session.add(game)
             await session.commit()
             await session.refresh(game)
+        self.router.wrote(
+            game_key(game.id),
+            player_key(game.player_1_id),
+            player_key(game.player_2_id),
+        )
         return game
 
-    async def get_game(self, game_id: int):
+    @writes
+    async def add_games(self, games: list[dict]) -> list[int]:
+        """
+        Inserts several games with a single multi-row INSERT and returns
+        their ids, in the order of the games.
+        """
         async with self.async_session() as session:
+            game_ids = await self._insert_ids(session, Game, games)
+            await session.commit()
+        self.router.wrote(
+            *[game_key(game_id) for game_id in game_ids],
+            *{
+                player_key(game[column])
+                for game in games
+                for column in ("player_1_id", "player_2_id")
+            },
+        )
+        return game_ids
+
+    @writes
+    async def add_player(self, player: Player):
+        async with self.async_session() as session:
+            session.add(player)
+            await session.commit()
+            await session.refresh(player)
+        self.router.wrote(player_key(player.id))
+        return player
+
+    @writes
+    async def add_players(self, players: list[dict]) -> list[int]:
+        """
+        Inserts several players with a single multi-row INSERT and returns
+        their ids, in the order of the players.
+        """
+        async with self.async_session() as session:
+            player_ids = await self._insert_ids(session, Player, players)
+            await session.commit()
+        self.router.wrote(*[player_key(player_id) for player_id in player_ids])
+        return player_ids
+
+    async def get_player_by_id(self, player_id: int):
+        async with self._read_session(player_key(player_id)) as session:
+            result = await session.get(Player, player_id)
+        return result
+
+    async def get_player_games(
+        self,
+        player_id: int,
+        dto: bool = False,
+        status: GameStatus = None,
+        cursor: int = None,
+        limit: int = None,
+    ):
+        """
+        Returns the games the player has a seat in, newest first, as GameRows
+        read through Core if dto is set. Only games with the status are
+        returned if given, and only the first limit games with an id below
+        the cursor.
+        """
+        ids = player_game_ids_stmt(player_id, status, cursor, limit)
+        if dto:
+            games = Game.__table__.c
+            async with self.router.reader(player_key(player_id)).connect() as conn:
+                result = await conn.execute(
+                    SELECT_GAME_ROWS.where(games.id.in_(ids))
+                    .order_by(games.id.desc())
+                    .limit(limit)
+                )
+                return [GameRow._make(row) for row in result]
+
+        async with self._read_session(player_key(player_id)) as session:
+            stmt = (
+                select(Game)
+                .where(Game.id.in_(ids))
+                .order_by(Game.id.desc())
+                .limit(limit)
+            )
+            result = await session.execute(stmt)
+            games = result.scalars().all()
+        return games
+
+
+class BattleshipDatabase(BaseDatabase):
+    """
+    Stores games as rows of the game, ship and guess tables, updated as the
+    game is played. Reads which are used to make a move, and reads by ship
+    id alone, always go to the primary.
+    """
+
+    plays_whole_turns = True
+
+    async def _update_returning(self, session, stmt, *columns) -> list:
+        """
+        Executes an UPDATE and returns the columns of the rows it updated,
+        through RETURNING where the database supports it.
+        """
+        if self.update_returning:
+            result = await session.execute(stmt.returning(*columns))
+            return result.all()
+        await session.execute(stmt)
+        result = await session.execute(select(*columns).where(stmt.whereclause))
+        return result.all()
+
+    async def _fall_through(
+        self,
+        conn,
+        build,
+        scalars: bool = True,
+        completed: Optional[bool] = None,
+        game_id: Optional[int] = None,
+    ) -> list:
+        """
+        Runs the statement built for the live tables of ships and guesses,
+        then for the archive if it found nothing. Only completed games are
+        archived, so the archive is not read if completed is False, and only
+        for the game with game_id if that game is completed.
+        """
+        live, archive = TIERS
+        result = await conn.execute(build(*live))
+        rows = result.scalars().all() if scalars else result.all()
+        if rows or completed is False:
+            return rows
+
+        stmt = build(*archive)
+        if game_id is not None:
+            stmt = stmt.where(
+                exists().where(Game.id == game_id, Game.status == GameStatus.completed)
+            )
+        result = await conn.execute(stmt)
+        return result.scalars().all() if scalars else result.all()
+
+    async def get_game(self, game_id: int, dto: bool = False):
+        """
+        Returns the game, as a GameRow read through Core if dto is set.
+        """
+        if dto:
+            async with self.router.reader(game_key(game_id)).connect() as conn:
+                result = await conn.execute(
+                    SELECT_GAME_ROWS.where(Game.__table__.c.id == game_id)
+                )
+                row = result.first()
+            return None if row is None else GameRow._make(row)
+
+        async with self._read_session(game_key(game_id)) as session:
             result = await session.get(Game, game_id)
         return result
 
+    @writes
     async def update_game(self, game_id: int, updates: dict):
         async with self.async_session() as session:
             # Update the player with the provided updates
-            await session.execute(
-                update(Game).where(Game.id == game_id).values(**updates)
+            stmt = (
+                update(Game)
+                .where(Game.id == game_id)
+                .values(**updates, version=Game.version + 1)
+            )
+            # The players' lists of games change along with the game
+            rows = await self._update_returning(
+                session, stmt, Game.player_1_id, Game.player_2_id
             )
             await session.commit()
+        self.router.wrote(
+            game_key(game_id),
+            *[player_key(player_id) for row in rows for player_id in row],
+        )
 
-    async def add_player(self, player: Player):
-        async with self.async_session() as session:
-            session.add(player)
-            await session.commit()
-            await session.refresh(player)
-        return player
+    async def _check_fleets(self, session, placing: dict) -> None:
+        """
+        Locks the games the ships are placed in, in id order, and checks each
+        player's fleet again against the ships placed so far, so concurrent
+        placements cannot exceed the fleet or overlap.
+        """
+        stmt = (
+            select(Game)
+            .where(Game.id.in_([game_id for game_id, _ in placing]))
+            .order_by(Game.id)
+            .with_for_update()
+        )
+        games = {game.id: game for game in await session.scalars(stmt)}
+        for (game_id, player_id), player_ships in placing.items():
+            if game_id not in games:
+                raise NotFoundError(f"{game_id=} not found")
+            stmt = select(Ship).where(
+                Ship.game_id == game_id, Ship.player_id == player_id
+            )
+            check_fleet(
+                games[game_id], (await session.scalars(stmt)).all(), player_ships
+            )
 
+    @writes
     async def add_ship(self, ship: Ship):
+        """
+        Inserts a ship, checked like the ships of add_ships.
+        """
+        placement = {
+            "size": ship.size,
+            "orientation": ship.orientation,
+            "start_position_x": ship.start_position_x,
+            "start_position_y": ship.start_position_y,
+        }
         async with self.async_session() as session:
+            await self._check_fleets(
+                session, {(ship.game_id, ship.player_id): [placement]}
+            )
             session.add(ship)
+            await session.execute(
+                add_ships_afloat_stmt(ship.game_id, ship.player_id, 1)
+            )
             await session.commit()
             await session.refresh(ship)
+        self.router.wrote(game_key(ship.game_id))
         return ship
 
+    @writes
+    async def add_ships(self, ships: list[dict]) -> list[Ship]:
+        """
+        Inserts several ships with a single multi-row INSERT, once their
+        fleets are checked under the locks of their games.
+        """
+        placing = defaultdict(list)
+        for ship in ships:
+            placing[ship["game_id"], ship["player_id"]].append(ship)
+        async with self.async_session() as session:
+            await self._check_fleets(session, placing)
+            if self.insert_many_returning:
+                result = await session.scalars(insert(Ship).returning(Ship), ships)
+                new_ships = result.all()
+            else:
+                new_ships = [Ship(**ship) for ship in ships]
+                session.add_all(new_ships)
+            placed = Counter((ship["game_id"], ship["player_id"]) for ship in ships)
+            for (game_id, player_id), count in placed.items():
+                await session.execute(add_ships_afloat_stmt(game_id, player_id, count))
+            await session.commit()
+        self.router.wrote(*{game_key(ship["game_id"]) for ship in ships})
+        return new_ships
+
     async def get_ship(self, ship_id: int):
         async with self.async_session() as session:
             result = await session.get(Ship, ship_id)
+            if result is None:
+                result = await session.get(ArchivedShip, ship_id)
         return result
 
+    @writes
     async def update_ship(self, ship_id: int, updates: dict) -> Ship:
         async with self.async_session() as session:
             # Update the player with the provided updates
-            result = await session.execute(
-                update(Ship).where(Ship.id == ship_id).values(**updates).returning(Ship)
-            )
+            stmt = update(Ship).where(Ship.id == ship_id).values(**updates)
+            rows = await self._update_returning(session, stmt, Ship)
             await session.commit()
-            updated_ship = result.fetchone()[0]
+            updated_ship = rows[0][0]
 
+        self.router.wrote(game_key(updated_ship.game_id))
         return updated_ship
 
+    @writes
     async def add_guess(self, guess: Guess):
         async with self.async_session() as session:
             session.add(guess)
+            await self._apply_guesses(session, [guess_values(guess)])
             await session.commit()
-            await session.refresh(guess)
+        self.router.wrote(game_key(guess.game_id))
         return guess
 
-    async def get_player_ships(self, game_id: int, player_id: int) -> list[Ship]:
-        async with self.async_session() as session:
-            stmt = select(Ship).where(
-                Ship.game_id == game_id, Ship.player_id == player_id
+    async def get_player_ships(
+        self, game_id: int, player_id: int, dto: bool = False
+    ) -> list[Ship]:
+        """
+        Returns the player's ships in the game, as ShipRows read through Core
+        if dto is set.
+        """
+        if dto:
+            async with self.router.reader(game_key(game_id)).connect() as conn:
+                rows = await self._fall_through(
+                    conn,
+                    lambda ship, guess: SHIP_ROWS[ship].where(
+                        ship.game_id == game_id, ship.player_id == player_id
+                    ),
+                    scalars=False,
+                    game_id=game_id,
+                )
+                return [ShipRow._make(row) for row in rows]
+
+        async with self._read_session(game_key(game_id)) as session:
+            ships = await self._fall_through(
+                session,
+                lambda ship, guess: select(ship).where(
+                    ship.game_id == game_id, ship.player_id == player_id
+                ),
+                game_id=game_id,
             )
-            result = await session.execute(stmt)
-            ships = result.scalars().all()
             return ships
 
-    async def get_player_by_id(self, player_id: int):
+    @writes
+    async def increment_ship_hits(self, ship_id: int) -> int:
+        # Construct an update statement that increments the `hits` column atomically
         async with self.async_session() as session:
-            result = await session.get(Player, player_id)
-        return result
+            stmt = update(Ship).where(Ship.id == ship_id).values(hits=Ship.hits + 1)
 
-    async def get_player_games(self, player_id: int):
+            # Execute the statement and fetch the new value of `hits` for the
+            # ship, in the same transaction so no other increment comes between
+            rows = await self._update_returning(session, stmt, Ship.hits, Ship.game_id)
+            await session.commit()
+
+            new_hits_value, game_id = rows[0]
+            self.router.wrote(game_key(game_id))
+            return new_hits_value
+
+    @writes
+    async def increment_ships_hits(self, hits: dict[int, int]) -> None:
+        """
+        Adds hits to several ships with a single UPDATE. The hits are keyed
+        by ship id.
+        """
         async with self.async_session() as session:
-            stmt = select(Game).where(
-                or_(
-                    Game.player_1_id == player_id,
-                    Game.player_2_id == player_id,
-                )
+            rows = await self._update_returning(
+                session, increment_ships_hits_stmt(hits), Ship.game_id
             )
-            result = await session.execute(stmt)
-            games = result.scalars().all()
-        return games
+            await session.commit()
+        self.router.wrote(*{game_key(game_id) for game_id, in rows})
 
-    async def increment_ship_hits(self, ship_id: int) -> int:
-        # Construct an update statement that increments the `hits` column atomically
+    @writes
+    async def add_guesses(self, guesses: list[dict]) -> None:
+        """
+        Inserts several guesses with a single multi-row INSERT.
+        """
         async with self.async_session() as session:
+            await session.execute(insert(Guess).values(guesses))
+            await self._apply_guesses(session, guesses)
+            await session.commit()
+        self.router.wrote(*{game_key(guess["game_id"]) for guess in guesses})
+
+    @writes
+    async def archive_completed_games(
+        self, limit: int, skip_game_ids: Collection[int] = ()
+    ) -> list[int]:
+        """
+        Moves the ships and guesses of up to limit completed games, other than
+        the skipped ones, to the archive, and returns the ids of the games.
+        Games are found from the live ships, so the search only covers the
+        games which have not been archived yet.
+        """
+        async with self.async_session() as session, session.begin():
             stmt = (
-                update(Ship)
-                .where(Ship.id == ship_id)
-                .values(hits=Ship.hits + 1)
-                .returning(Ship.hits)
+                select(Ship.game_id)
+                .join(Game, Game.id == Ship.game_id)
+                .where(Game.status == GameStatus.completed)
+                .group_by(Ship.game_id)
+                .order_by(Ship.game_id)
+                .limit(limit)
             )
+            if skip_game_ids:
+                stmt = stmt.where(Ship.game_id.not_in(skip_game_ids))
+            game_ids = list(await session.scalars(stmt))
+            if not game_ids:
+                return []
+            for live, archived in ((Ship, ArchivedShip), (Guess, ArchivedGuess)):
+                columns = [column.name for column in live.__table__.c]
+                await session.execute(
+                    insert(archived).from_select(
+                        columns,
+                        select(live.__table__).where(live.game_id.in_(game_ids)),
+                    )
+                )
+            # Guesses point to ships, so they are deleted first
+            await session.execute(delete(Guess).where(Guess.game_id.in_(game_ids)))
+            await session.execute(delete(Ship).where(Ship.game_id.in_(game_ids)))
+        self.router.wrote(*[game_key(game_id) for game_id in game_ids])
+        return game_ids
 
-            # Execute the statement and fetch the result
-            result = await session.execute(stmt)
-            await session.commit()
+    @writes
+    async def play_turn(
+        self,
+        game_id: int,
+        guess_position_x: int,
+        guess_position_y: int,
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> GuessResult:
+        """
+        Plays a turn in a single transaction, without locking the game row.
+        The turn is checked against the game as read, and the game is updated
+        only if its version is still the one read. If another write to the
+        game committed in between, the turn is played again against the game
+        as it is now, where a turn which is no longer the player's is rejected
+        like any other, up to MAX_TURN_ATTEMPTS times before giving up with a
+        conflict.
+        """
+        guess_result = await self._retry_turn(
+            self._play_turn,
+            game_id,
+            (guess_position_x, guess_position_y),
+            offense_player_id,
+            defense_player_id,
+        )
+        self._wrote_turn(game_id, offense_player_id, defense_player_id)
+        return guess_result
 
-            # Optionally, return the new value of `hits` for the ship
-            new_hits_value = result.fetchone()[0]
-            return new_hits_value
+    async def _retry_turn(self, play, game_id: int, *args):
+        """
+        Plays the turn, again each time another write to the game committed
+        before it.
+        """
+        for _ in range(MAX_TURN_ATTEMPTS):
+            try:
+                return await play(game_id, *args)
+            except StaleDataError:
+                LOGGER.info(f"{game_id=} was written to during the turn")
+        raise WriteConflictError(f"too many concurrent writes to {game_id=}")
+
+    async def _play_turn(
+        self,
+        game_id: int,
+        guess_coords: tuple[int, int],
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> GuessResult:
+        async with self.async_session() as session, session.begin():
+            game = await session.get(Game, game_id)
+            check_turn(game, offense_player_id)
+            fired = await self._read_shots(
+                session, game, offense_player_id, [guess_coords]
+            )
+            check_shots(game, [guess_coords], fired)
+
+            # Only the ship hit, if any, is read
+            stmt = select(Ship).where(
+                Ship.game_id == game_id,
+                Ship.player_id == defense_player_id,
+                ship_covers_clause(guess_coords),
+            )
+            ship = (await session.scalars(stmt)).first()
+            new_bits = apply_shots(
+                game, fired, defense_player_id, [guess_coords], [ship]
+            )
+            if ship is None:
+                LOGGER.info(
+                    f"{offense_player_id=} missed {defense_player_id=} with {guess_coords=}"
+                )
+                guess_result = GuessResult.miss
+            else:
+                ship.hits += 1
+                ship.hit_mask |= new_bits[ship.id]
+                if get_ships_afloat(game, defense_player_id) == 0:
+                    LOGGER.info(
+                        f"{offense_player_id=} hit {defense_player_id=} and won with {guess_coords=}"
+                    )
+                    guess_result = GuessResult.victory
+                else:
+                    LOGGER.info(
+                        f"{offense_player_id=} hit {defense_player_id=} with {guess_coords=}"
+                    )
+                    guess_result = GuessResult.hit
+
+            if guess_result == GuessResult.victory:
+                game.status = GameStatus.completed
+            else:
+                game.current_player_id = defense_player_id
+            # The game is flushed, and its version compared, before the shots
+            # are written
+            await session.flush()
+            await self._write_shots(session, game_id, offense_player_id, fired)
+
+            session.add(
+                Guess(
+                    game_id=game_id,
+                    offense_player_id=offense_player_id,
+                    ship_id=None if ship is None else ship.id,
+                    position_x=guess_coords[0],
+                    position_y=guess_coords[1],
+                    result=guess_result,
+                )
+            )
+        return guess_result
+
+    @writes
+    async def play_salvo(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> list[GuessResult]:
+        """
+        Plays a salvo turn in a single transaction, like play_turn. All hits
+        are applied with one UPDATE and all guesses inserted with one INSERT.
+        """
+        results = await self._retry_turn(
+            self._play_salvo, game_id, shots, offense_player_id, defense_player_id
+        )
+        self._wrote_turn(game_id, offense_player_id, defense_player_id)
+        return results
+
+    async def _play_salvo(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> list[GuessResult]:
+        async with self.async_session() as session, session.begin():
+            game = await session.get(Game, game_id)
+            check_turn(game, offense_player_id, GameMode.salvo)
+            check_salvo(shots, get_ships_afloat(game, offense_player_id))
+            fired = await self._read_shots(session, game, offense_player_id, shots)
+            check_shots(game, shots, fired)
+
+            stmt = select(Ship).where(
+                Ship.game_id == game_id, Ship.player_id == defense_player_id
+            )
+            defense_ships = (await session.scalars(stmt)).all()
+            hit_ships, hit_counts = resolve_salvo(defense_ships, shots)
+            new_bits = apply_shots(game, fired, defense_player_id, shots, hit_ships)
+            victory = (
+                bool(hit_counts) and get_ships_afloat(game, defense_player_id) == 0
+            )
+            results = salvo_results(hit_ships, victory)
+            LOGGER.info(
+                f"{offense_player_id=} fired {shots=} at {defense_player_id=} with {results=}"
+            )
+
+            if victory:
+                game.status = GameStatus.completed
+            else:
+                game.current_player_id = defense_player_id
+            # The game is flushed, and its version compared, before the shots
+            # and ships are written
+            await session.flush()
+            await self._write_shots(session, game_id, offense_player_id, fired)
+            if hit_counts:
+                await session.execute(increment_ships_hits_stmt(hit_counts, new_bits))
+
+            await session.execute(
+                insert(Guess).values(
+                    [
+                        {
+                            "game_id": game_id,
+                            "offense_player_id": offense_player_id,
+                            "ship_id": None if ship is None else ship.id,
+                            "position_x": shot[0],
+                            "position_y": shot[1],
+                            "result": result,
+                        }
+                        for shot, ship, result in zip(shots, hit_ships, results)
+                    ]
+                )
+            )
+        return results
+
+    def _wrote_turn(self, game_id: int, *player_ids: int) -> None:
+        # The game may be over, which changes the players' lists of games
+        self.router.wrote(
+            game_key(game_id), *[player_key(player_id) for player_id in player_ids]
+        )
+
+    async def _apply_guesses(self, session, guesses: list[dict]) -> None:
+        """
+        Applies guesses written apart from their turn to the board state of
+        their games and the hit masks of their ships. The games are locked in
+        id order, like every other write locking several games, so two
+        batches sharing games cannot deadlock.
+        """
+        stmt = (
+            select(Game)
+            .where(Game.id.in_({guess["game_id"] for guess in guesses}))
+            .order_by(Game.id)
+            .with_for_update()
+        )
+        games = {game.id: game for game in await session.scalars(stmt)}
+        ship_ids = {guess["ship_id"] for guess in guesses} - {None}
+        ships = {}
+        if ship_ids:
+            stmt = select(Ship).where(Ship.id.in_(ship_ids))
+            ships = {ship.id: ship for ship in await session.scalars(stmt)}
+
+        turns = defaultdict(list)
+        for guess in guesses:
+            turns[guess["game_id"], guess["offense_player_id"]].append(guess)
+        for (game_id, offense_player_id), turn in turns.items():
+            game = games[game_id]
+            defense_player_id = (
+                game.player_2_id
+                if seat(game, offense_player_id) == "player_1"
+                else game.player_1_id
+            )
+            hit_ships = [ships.get(guess["ship_id"]) for guess in turn]
+            cells = [(guess["position_x"], guess["position_y"]) for guess in turn]
+            fired = await self._read_shots(session, game, offense_player_id, cells)
+            new_bits = apply_shots(game, fired, defense_player_id, cells, hit_ships)
+            await self._write_shots(session, game_id, offense_player_id, fired)
+            for ship_id, bits in new_bits.items():
+                ships[ship_id].hit_mask |= bits
+
+    async def _read_shots(
+        self, session, game, player_id: int, cells: list[tuple[int, int]]
+    ) -> ShotBlocks:
+        """
+        Reads the blocks of the player's shots holding the cells, and only
+        those.
+        """
+        stmt = select(ShotBlock.block, ShotBlock.bits).where(
+            ShotBlock.game_id == game.id,
+            ShotBlock.player_id == player_id,
+            ShotBlock.block.in_(shot_blocks(game, cells)),
+        )
+        return ShotBlocks(game, dict((await session.execute(stmt)).all()))
+
+    async def _write_shots(
+        self, session, game_id: int, player_id: int, shots: ShotBlocks
+    ) -> None:
+        """
+        Writes the blocks of the player's shots changed since they were read.
+        """
+        new_blocks = []
+        for block in sorted(shots.changed):
+            if block in shots.stored:
+                await session.execute(
+                    update(ShotBlock)
+                    .where(
+                        ShotBlock.game_id == game_id,
+                        ShotBlock.player_id == player_id,
+                        ShotBlock.block == block,
+                    )
+                    .values(bits=shots.blocks[block])
+                )
+            else:
+                new_blocks.append(
+                    {
+                        "game_id": game_id,
+                        "player_id": player_id,
+                        "block": block,
+                        "bits": shots.blocks[block],
+                    }
+                )
+        if new_blocks:
+            await session.execute(insert(ShotBlock).values(new_blocks))
+
+    async def get_player_shots(self, game_id: int, player_id: int) -> ShotBitset:
+        """
+        Returns the cells the player has fired at so far in a game.
+        """
+        async with self._read_session(game_key(game_id)) as session:
+            game = await session.get(Game, game_id)
+            stmt = select(ShotBlock.block, ShotBlock.bits).where(
+                ShotBlock.game_id == game_id, ShotBlock.player_id == player_id
+            )
+            blocks = dict((await session.execute(stmt)).all())
+        return shots_bitset(game, blocks)
 
     async def get_ship_hits(self, ship_ids: list[int]) -> list[Guess]:
         """
@@ -134,28 +1013,31 @@ class BattleshipDatabase:
         in the given list of ship_ids.
         """
         async with self.async_session() as session:
-            stmt = select(Guess).where(Guess.ship_id.in_(ship_ids))
-            result = await session.execute(stmt)
-            hits = result.scalars().all()
+            hits = await self._fall_through(
+                session,
+                lambda ship, guess: select(guess).where(guess.ship_id.in_(ship_ids)),
+            )
             return hits
 
     async def get_player_guesses(self, game_id: int, player_id) -> list[Guess]:
         """
         Retrieves a list of guesses a player has made so far in a game.
         """
-        async with self.async_session() as session:
-            stmt = select(Guess).where(
-                Guess.game_id == game_id, Guess.player_id == player_id
+        async with self._read_session(game_key(game_id)) as session:
+            guesses = await self._fall_through(
+                session,
+                lambda ship, guess: select(guess).where(
+                    guess.game_id == game_id, guess.offense_player_id == player_id
+                ),
+                game_id=game_id,
             )
-            result = await session.execute(stmt)
-            ships = result.scalars().all()
-            return ships
+            return guesses
 
     async def get_game_details(self, game_id: int, player_id) -> list[Guess]:
         """
         Queries the database to construct game details for a player
         """
-        async with self.async_session() as session:
+        async with self._read_session(game_key(game_id)) as session:
             # Fetch the game
             game = await session.get(Game, game_id)
             if game is None:
@@ -164,27 +1046,35 @@ class BattleshipDatabase:
             enemy_player_id: int = (
                 game.player_1_id if game.player_1_id != player_id else game.player_2_id
             )
+            completed = game.status == GameStatus.completed
 
             # Fetch player's ships
-            stmt = select(Ship).where(
-                Ship.game_id == game_id, Ship.player_id == player_id
+            player_ships = await self._fall_through(
+                session,
+                lambda ship, guess: select(ship).where(
+                    ship.game_id == game_id, ship.player_id == player_id
+                ),
+                completed=completed,
             )
-            result = await session.execute(stmt)
-            player_ships = result.scalars().all()
 
             # Fetch player's guess history
-            stmt = select(Guess).where(
-                Guess.game_id == game_id, Guess.offense_player_id == player_id
+            player_guesses = await self._fall_through(
+                session,
+                lambda ship, guess: select(guess).where(
+                    guess.game_id == game_id, guess.offense_player_id == player_id
+                ),
+                completed=completed,
             )
-            result = await session.execute(stmt)
-            player_guesses = result.scalars().all()
 
             # Fetch enemy's guess history
-            stmt = select(Guess).where(
-                Guess.game_id == game_id, Guess.offense_player_id == enemy_player_id
+            enemy_guesses = await self._fall_through(
+                session,
+                lambda ship, guess: select(guess).where(
+                    guess.game_id == game_id,
+                    guess.offense_player_id == enemy_player_id,
+                ),
+                completed=completed,
             )
-            result = await session.execute(stmt)
-            enemy_guesses = result.scalars().all()
 
         return {
             "game": game,
@@ -192,3 +1082,52 @@ class BattleshipDatabase:
             "player_guesses": player_guesses,
             "enemy_guesses": enemy_guesses,
         }
+
+    async def get_player_game_details(self, game_id: int, player_id: int) -> dict:
+        """
+        Returns a player's view of a game, shaped as the game details
+        response, from a single query. Returns None if the game does not
+        exist.
+        """
+        params = {"game_id": game_id, "player_id": player_id}
+        async with self.router.reader(game_key(game_id)).connect() as conn:
+            rows = (await conn.execute(GAME_DETAILS_STMT, params)).all()
+            completed = GameStatus.completed.value
+            if len(rows) == 1 and rows[0].text_1 == completed:
+                # Only the game, which is completed so its ships and guesses
+                # may be archived
+                rows = (await conn.execute(ARCHIVED_GAME_DETAILS_STMT, params)).all()
+            return game_details_from_rows(rows, player_id)
+
+    async def get_game_state(self, game_id: int) -> dict:
+        """
+        Queries the database for everything needed to play a game: the game,
+        every player's ships and the full guess history.
+        """
+        async with self.async_session() as session:
+            game = await session.get(Game, game_id)
+            if game is None:
+                LOGGER.error(f"Failed to locate {game_id=} in database")
+                return None
+
+            completed = game.status == GameStatus.completed
+            ships = await self._fall_through(
+                session,
+                lambda ship, guess: select(ship)
+                .where(ship.game_id == game_id)
+                .order_by(ship.id),
+                completed=completed,
+            )
+            guesses = await self._fall_through(
+                session,
+                lambda ship, guess: select(guess)
+                .where(guess.game_id == game_id)
+                .order_by(guess.id),
+                completed=completed,
+            )
+
+        return {
+            "game": game,
+            "ships": ships,
+            "guesses": guesses,
+        }
@@ -0,0 +1,48 @@
+"""
+Read-only rows returned by the Core read path of BattleshipDatabase.
+
+They have the same attributes as the ORM models they stand for, so read-only
+code works with either, but are plain named tuples built straight from the
+result rows: no identity map, no instrumented attributes and no
+relationships.
+"""
+
+from typing import NamedTuple
+from sqlalchemy import Select, select
+from battleship.models.game import Game, GameMode, GameStatus
+from battleship.models.ship import Ship, ShipOrientation
+
+
+class GameRow(NamedTuple):
+    id: int
+    player_1_id: int
+    player_2_id: int
+    current_player_id: int
+    status: GameStatus
+    mode: GameMode
+    board_width: int
+    board_height: int
+    fleet: list[int]
+
+
+class ShipRow(NamedTuple):
+    id: int
+    game_id: int
+    player_id: int
+    orientation: ShipOrientation
+    start_position_x: int
+    start_position_y: int
+    size: int
+    hits: int
+
+
+def select_rows(row_type: type, model) -> Select:
+    """
+    Selects the columns of a model's table in the order of the row's fields.
+    """
+    columns = model.__table__.c
+    return select(*[columns[field] for field in row_type._fields])
+
+
+SELECT_GAME_ROWS = select_rows(GameRow, Game)
+SELECT_SHIP_ROWS = select_rows(ShipRow, Ship)
@@ -0,0 +1,488 @@
+"""
+Event-sourced game storage.
+
+EventSourcedDatabase keeps players and games in their tables, as created,
+but everything that happens in a game afterwards is appended to game_event
+and never updated: ships placed, ships moved and turns played. The state of
+a game is the game as created with its events applied in order. It is
+rebuilt from the latest snapshot, taken by the writer appending every
+snapshot_interval events, and the events after it, and the state at any
+earlier event is rebuilt the same way. A ship's id is the id of the event
+which placed it. The one thing written to a game's row afterwards is its
+status, along with the turn which ends it, so a player's games are listed by
+status from the index of their rows.
+
+The states of recently used games are kept in memory and brought up to date
+with the events appended since, so most reads and writes only read the tail
+of a game's events. Events are appended with the next event number of the
+state they were checked against. If another writer appended that number
+first, the state is brought up to date and checked again.
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Callable, Optional
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from battleship.errors import NotFoundError, WriteConflictError
+from battleship.game_details import game_details_response
+from battleship.rules import (
+    check_fleet,
+    check_salvo,
+    check_shots,
+    check_turn,
+    count_ships_afloat,
+    is_fleet_sunk,
+    resolve_salvo,
+    salvo_results,
+)
+from battleship.shots import ShotBitset
+from battleship.models.database import BaseDatabase, writes
+from battleship.models.dto import GameRow
+from battleship.models.game import Game, GameMode, GameStatus
+from battleship.models.game_cache import DEFAULT_MAX_GAMES, GameState
+from battleship.models.game_event import GameEvent, GameEventKind, GameSnapshot
+from battleship.models.guess import Guess, GuessResult
+from battleship.models.replicas import DEFAULT_REPLICA_LAG, game_key, player_key
+from battleship.models.ship import Ship
+
+LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_INTERVAL = 32
+# Times a write is checked against a fresher state before giving up
+MAX_APPEND_ATTEMPTS = 5
+
+PLACEMENT_COLUMNS = (
+    "player_id",
+    "orientation",
+    "start_position_x",
+    "start_position_y",
+    "size",
+)
+SHIP_COLUMNS = ("id", *PLACEMENT_COLUMNS, "hits")
+SHOT_COLUMNS = ("ship_id", "position_x", "position_y", "result")
+
+
+def columns(model, names: tuple[str, ...]) -> dict:
+    return {name: getattr(model, name) for name in names}
+
+
+def snapshot_state(state: GameState) -> dict:
+    return {
+        "current_player_id": state.game.current_player_id,
+        "status": state.game.status,
+        "ships": [columns(ship, SHIP_COLUMNS) for ship in state.ships_by_id.values()],
+        "guesses": [
+            {
+                "offense_player_id": guess.offense_player_id,
+                **columns(guess, SHOT_COLUMNS),
+            }
+            for guess in state.guesses
+        ],
+    }
+
+
+def ends_game(event: GameEvent) -> bool:
+    return event.kind == GameEventKind.turn and any(
+        shot["result"] == GuessResult.victory for shot in event.data["shots"]
+    )
+
+
+def restore_state(game: Game, snapshot: dict) -> GameState:
+    game.current_player_id = snapshot["current_player_id"]
+    game.status = GameStatus(snapshot["status"])
+    ships = [Ship(game_id=game.id, **ship) for ship in snapshot["ships"]]
+    guesses = [Guess(game_id=game.id, **guess) for guess in snapshot["guesses"]]
+    return GameState(game, ships, guesses)
+
+
+class GameHistory:
+    """
+    The state of a game after its events up to seq.
+    """
+
+    def __init__(self, state: GameState, seq: int = 0):
+        self.state = state
+        self.seq = seq
+        self.snapshot_seq = seq
+
+    def apply(self, event: GameEvent) -> None:
+        """
+        Applies the event, unless it already has been.
+        """
+        if event.seq <= self.seq:
+            return
+        if event.seq != self.seq + 1:
+            raise ValueError(f"{event=} does not follow event {self.seq}")
+
+        state = self.state
+        game = state.game
+        if event.kind == GameEventKind.ship_placed:
+            state.add_ship(Ship(id=event.id, game_id=game.id, hits=0, **event.data))
+        elif event.kind == GameEventKind.ship_moved:
+            ship = state.ships_by_id[event.data["ship_id"]]
+            moved_ship = Ship(game_id=game.id, **columns(ship, SHIP_COLUMNS))
+            for column, value in event.data.items():
+                if column != "ship_id":
+                    setattr(moved_ship, column, value)
+            state.replace_ship(moved_ship)
+        else:
+            offense_player_id = event.data["offense_player_id"]
+            for shot in event.data["shots"]:
+                if shot["ship_id"] is not None:
+                    state.ships_by_id[shot["ship_id"]].hits += 1
+                state.add_guess(
+                    Guess(game_id=game.id, offense_player_id=offense_player_id, **shot)
+                )
+            if ends_game(event):
+                game.status = GameStatus.completed
+            else:
+                game.current_player_id = event.data["defense_player_id"]
+        self.seq = event.seq
+
+
+class EventSourcedDatabase(BaseDatabase):
+    """
+    Database storing games as events. Turns are only played through
+    play_turn and play_salvo, each appending a single event, so there are no
+    methods which update the state of a game piecemeal.
+    """
+
+    plays_whole_turns = True
+
+    def __init__(
+        self,
+        URL=None,
+        replica_URLs: list = None,
+        replica_lag: float = DEFAULT_REPLICA_LAG,
+        max_games: int = DEFAULT_MAX_GAMES,
+        snapshot_interval: int = SNAPSHOT_INTERVAL,
+    ):
+        super().__init__(URL, replica_URLs, replica_lag)
+        self.max_games = max_games
+        self.snapshot_interval = snapshot_interval
+        self._games: OrderedDict[int, GameHistory] = OrderedDict()
+
+    async def _load(self, game_id: int, seq: int = None) -> Optional[GameHistory]:
+        """
+        Returns the game with every event applied, or only those up to seq.
+        Returns None if the game does not exist.
+        """
+        history = self._games.get(game_id) if seq is None else None
+        async with self.async_session() as session:
+            if history is None:
+                history = await self._replay_snapshot(session, game_id, seq)
+                if history is None:
+                    return None
+            stmt = (
+                select(GameEvent)
+                .where(GameEvent.game_id == game_id, GameEvent.seq > history.seq)
+                .order_by(GameEvent.seq)
+            )
+            if seq is not None:
+                stmt = stmt.where(GameEvent.seq <= seq)
+            for event in await session.scalars(stmt):
+                history.apply(event)
+
+        if seq is None:
+            self._games[game_id] = history
+            self._games.move_to_end(game_id)
+            while len(self._games) > self.max_games:
+                self._games.popitem(last=False)
+        return history
+
+    async def _replay_snapshot(
+        self, session, game_id: int, seq: int = None
+    ) -> Optional[GameHistory]:
+        """
+        Returns the game as of its latest snapshot, up to seq, or as created
+        if there is none.
+        """
+        game = await session.get(Game, game_id)
+        if game is None:
+            return None
+        # Events are applied to the game, which must not be flushed to its row
+        session.expunge(game)
+        stmt = (
+            select(GameSnapshot)
+            .where(GameSnapshot.game_id == game_id)
+            .order_by(GameSnapshot.seq.desc())
+            .limit(1)
+        )
+        if seq is not None:
+            stmt = stmt.where(GameSnapshot.seq <= seq)
+        snapshot = await session.scalar(stmt)
+        if snapshot is None:
+            # The row is marked completed once the game ends, but every game
+            # is created in progress
+            game.status = GameStatus.in_progress
+            return GameHistory(GameState(game, [], []))
+        return GameHistory(restore_state(game, snapshot.state), snapshot.seq)
+
+    async def _snapshot(self, game_id: int, history: GameHistory) -> None:
+        async with self.async_session() as session:
+            session.add(
+                GameSnapshot(
+                    game_id=game_id,
+                    seq=history.seq,
+                    state=snapshot_state(history.state),
+                )
+            )
+            try:
+                await session.commit()
+            except IntegrityError:
+                # Another writer took the same snapshot
+                pass
+        history.snapshot_seq = history.seq
+
+    async def _append(
+        self, game_id: int, build: Callable[[GameState], list[tuple]]
+    ) -> tuple[GameState, list[GameEvent]]:
+        """
+        Appends the events built, as (kind, data), from the current state of
+        the game, which build checks the action against.
+        """
+        for _ in range(MAX_APPEND_ATTEMPTS):
+            history = await self._load(game_id)
+            if history is None:
+                raise NotFoundError(f"{game_id=} not found")
+            events = [
+                GameEvent(game_id=game_id, seq=history.seq + ind, kind=kind, data=data)
+                for ind, (kind, data) in enumerate(build(history.state), start=1)
+            ]
+            async with self.async_session() as session:
+                session.add_all(events)
+                try:
+                    if any(ends_game(event) for event in events):
+                        await session.execute(
+                            update(Game)
+                            .where(Game.id == game_id)
+                            .values(status=GameStatus.completed)
+                        )
+                    await session.commit()
+                except IntegrityError:
+                    LOGGER.info(f"Event {history.seq + 1} of {game_id=} was taken")
+                    continue
+            for event in events:
+                history.apply(event)
+            self.router.wrote(game_key(game_id))
+            if history.seq - history.snapshot_seq >= self.snapshot_interval:
+                await self._snapshot(game_id, history)
+            return history.state, events
+        raise WriteConflictError(f"too many concurrent writes to {game_id=}")
+
+    async def _ship_game_id(self, ship_id: int) -> Optional[int]:
+        async with self.async_session() as session:
+            return await session.scalar(
+                select(GameEvent.game_id).where(
+                    GameEvent.id == ship_id,
+                    GameEvent.kind == GameEventKind.ship_placed,
+                )
+            )
+
+    async def get_game(self, game_id: int, dto: bool = False):
+        history = await self._load(game_id)
+        if history is None:
+            return None
+        game = history.state.game
+        if dto:
+            return GameRow(*[getattr(game, field) for field in GameRow._fields])
+        return game
+
+    async def get_player_games(
+        self,
+        player_id: int,
+        dto: bool = False,
+        status: GameStatus = None,
+        cursor: int = None,
+        limit: int = None,
+    ):
+        """
+        The page is selected from the game rows, which hold the status, and
+        its games read from their events.
+        """
+        page = await super().get_player_games(
+            player_id, dto=True, status=status, cursor=cursor, limit=limit
+        )
+        return [await self.get_game(row.id, dto) for row in page]
+
+    async def get_player_ships(
+        self, game_id: int, player_id: int, dto: bool = False
+    ) -> list[Ship]:
+        history = await self._load(game_id)
+        if history is None:
+            return []
+        return history.state.ships[player_id]
+
+    async def get_ship(self, ship_id: int):
+        game_id = await self._ship_game_id(ship_id)
+        if game_id is None:
+            return None
+        history = await self._load(game_id)
+        return history.state.ships_by_id.get(ship_id)
+
+    async def _place_ships(self, ships: list[dict]) -> list[Ship]:
+        # Ships are always placed in a single game. A placement appended
+        # meanwhile makes the fleet be checked again.
+        def place(state: GameState) -> list[tuple]:
+            for player_id in {ship["player_id"] for ship in ships}:
+                check_fleet(
+                    state.game,
+                    state.ships[player_id],
+                    [ship for ship in ships if ship["player_id"] == player_id],
+                )
+            return [
+                (
+                    GameEventKind.ship_placed,
+                    {column: ship[column] for column in PLACEMENT_COLUMNS},
+                )
+                for ship in ships
+            ]
+
+        state, events = await self._append(ships[0]["game_id"], place)
+        return [state.ships_by_id[event.id] for event in events]
+
+    @writes
+    async def add_ship(self, ship: Ship):
+        (new_ship,) = await self._place_ships(
+            [columns(ship, ("game_id", *PLACEMENT_COLUMNS))]
+        )
+        return new_ship
+
+    @writes
+    async def add_ships(self, ships: list[dict]) -> list[Ship]:
+        return await self._place_ships(ships)
+
+    @writes
+    async def update_ship(self, ship_id: int, updates: dict) -> Ship:
+        game_id = await self._ship_game_id(ship_id)
+        if game_id is None:
+            raise NotFoundError(f"{ship_id=} not found")
+        state, _ = await self._append(
+            game_id,
+            lambda state: [(GameEventKind.ship_moved, {"ship_id": ship_id, **updates})],
+        )
+        return state.ships_by_id[ship_id]
+
+    async def _play(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+        mode: GameMode,
+    ) -> list[GuessResult]:
+        def turn(state: GameState) -> list[tuple]:
+            check_turn(state.game, offense_player_id, mode)
+            if mode == GameMode.salvo:
+                check_salvo(shots, count_ships_afloat(state.ships[offense_player_id]))
+            check_shots(state.game, shots, state.shots[offense_player_id])
+            defense_ships = state.ships[defense_player_id]
+            hit_ships, hit_counts = resolve_salvo(defense_ships, shots)
+            victory = bool(hit_counts) and is_fleet_sunk(defense_ships, hit_counts)
+            results = salvo_results(hit_ships, victory)
+            data = {
+                "offense_player_id": offense_player_id,
+                "defense_player_id": defense_player_id,
+                "shots": [
+                    {
+                        "ship_id": None if ship is None else ship.id,
+                        "position_x": shot[0],
+                        "position_y": shot[1],
+                        "result": result,
+                    }
+                    for shot, ship, result in zip(shots, hit_ships, results)
+                ],
+            }
+            return [(GameEventKind.turn, data)]
+
+        _, (event,) = await self._append(game_id, turn)
+        results = [GuessResult(shot["result"]) for shot in event.data["shots"]]
+        LOGGER.info(
+            f"{offense_player_id=} fired {shots=} at {defense_player_id=} with {results=}"
+        )
+        self.router.wrote(player_key(offense_player_id), player_key(defense_player_id))
+        return results
+
+    @writes
+    async def play_turn(
+        self,
+        game_id: int,
+        guess_position_x: int,
+        guess_position_y: int,
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> GuessResult:
+        (result,) = await self._play(
+            game_id,
+            [(guess_position_x, guess_position_y)],
+            offense_player_id,
+            defense_player_id,
+            GameMode.classic,
+        )
+        return result
+
+    @writes
+    async def play_salvo(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> list[GuessResult]:
+        return await self._play(
+            game_id, shots, offense_player_id, defense_player_id, GameMode.salvo
+        )
+
+    async def get_player_shots(self, game_id: int, player_id: int) -> ShotBitset:
+        history = await self._load(game_id)
+        if history is None:
+            raise NotFoundError(f"{game_id=} not found")
+        return history.state.shots[player_id]
+
+    async def get_ship_hits(self, ship_ids: list[int]) -> list[Guess]:
+        hits = []
+        for game_id in {await self._ship_game_id(ship_id) for ship_id in ship_ids}:
+            # Unknown ships have no hits
+            if game_id is None:
+                continue
+            history = await self._load(game_id)
+            hits += [
+                guess for guess in history.state.guesses if guess.ship_id in ship_ids
+            ]
+        return hits
+
+    async def get_player_guesses(self, game_id: int, player_id) -> list[Guess]:
+        history = await self._load(game_id)
+        if history is None:
+            return []
+        return history.state.player_guesses(player_id)
+
+    async def get_game_details(self, game_id: int, player_id) -> dict:
+        history = await self._load(game_id)
+        if history is None:
+            LOGGER.error(f"Failed to locate {game_id=} in database")
+            return None
+        return history.state.game_details(player_id)
+
+    async def get_player_game_details(self, game_id: int, player_id: int) -> dict:
+        game_details = await self.get_game_details(game_id, player_id)
+        if game_details is None:
+            return None
+        return game_details_response(**game_details)
+
+    async def get_game_state(self, game_id: int, seq: int = None) -> dict:
+        """
+        Returns everything needed to play the game, as of its event seq if
+        given, which counts from 1 for the first event.
+        """
+        history = await self._load(game_id, seq)
+        if history is None:
+            LOGGER.error(f"Failed to locate {game_id=} in database")
+            return None
+        return {
+            "game": history.state.game,
+            "ships": list(history.state.ships_by_id.values()),
+            "guesses": history.state.guesses,
+            "seq": history.seq,
+        }
@@ -1,7 +1,12 @@
 import enum
 from battleship.models.base import Base
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from sqlalchemy import ForeignKey, Enum
+from sqlalchemy import ForeignKey, Enum, Index, Integer, JSON
+
+DEFAULT_BOARD_WIDTH = 10
+DEFAULT_BOARD_HEIGHT = 10
+# Sizes of the ships each player places on their board
+DEFAULT_FLEET = [5, 4, 4, 3, 3, 3, 2, 2, 2, 2]
 
 
 class GameStatus(str, enum.Enum):
@@ -9,18 +14,41 @@ class GameStatus(str, enum.Enum):
     completed = "completed"
 
 
+class GameMode(str, enum.Enum):
+    classic = "classic"
+    salvo = "salvo"
+
+
 class Game(Base):
     __tablename__ = "game"
+    __table_args__ = (
+        Index("ix_game_player_1_id_id", "player_1_id", "id"),
+        Index("ix_game_player_2_id_id", "player_2_id", "id"),
+        Index("ix_game_player_1_id_status_id", "player_1_id", "status", "id"),
+        Index("ix_game_player_2_id_status_id", "player_2_id", "status", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     player_1_id: Mapped[int] = mapped_column(ForeignKey("player.id"))
     player_2_id: Mapped[int] = mapped_column(ForeignKey("player.id"))
     current_player_id: Mapped[int] = mapped_column(ForeignKey("player.id"))
     status: Mapped[GameStatus] = mapped_column(Enum(GameStatus))
+    mode: Mapped[GameMode] = mapped_column(Enum(GameMode), default=GameMode.classic)
+    board_width: Mapped[int] = mapped_column(Integer, default=DEFAULT_BOARD_WIDTH)
+    board_height: Mapped[int] = mapped_column(Integer, default=DEFAULT_BOARD_HEIGHT)
+    fleet: Mapped[list[int]] = mapped_column(JSON, default=lambda: list(DEFAULT_FLEET))
+    # Board state of each seat, described in battleship.board_state
+    player_1_ships_afloat: Mapped[int] = mapped_column(Integer, default=0)
+    player_2_ships_afloat: Mapped[int] = mapped_column(Integer, default=0)
+    # Incremented by every update of the game, which only applies if the
+    # version is still the one read
+    version: Mapped[int] = mapped_column(Integer, default=1)
 
     player_1 = relationship("Player", foreign_keys=[player_1_id])
     player_2 = relationship("Player", foreign_keys=[player_2_id])
     current_player = relationship("Player", foreign_keys=[current_player_id])
 
+    __mapper_args__ = {"version_id_col": version}
+
     def __repr__(self) -> str:
-        return f"Game(id={self.id!r}, player_1_id={self.player_1_id!r}, player_2_id={self.player_2_id!r}, current_player_id={self.current_player_id!r}, status={self.status!r})"
+        return f"Game(id={self.id!r}, player_1_id={self.player_1_id!r}, player_2_id={self.player_2_id!r}, current_player_id={self.current_player_id!r}, status={self.status!r}, mode={self.mode!r}, board_width={self.board_width!r}, board_height={self.board_height!r})"
@@ -0,0 +1,424 @@
+import asyncio
+import logging
+from collections import Counter, OrderedDict, defaultdict
+from typing import Awaitable, Callable
+from battleship.errors import GameRuleError
+from battleship.fleet import Fleet
+from battleship.game_details import game_details_response
+from battleship.rules import check_shots, check_turn, find_hit_ship
+from battleship.shots import ShotBitset
+from battleship.models.database import can_play_whole_turns
+from battleship.models.game import Game, GameMode, GameStatus
+from battleship.models.ship import Ship
+from battleship.models.guess import Guess, GuessResult
+
+LOGGER = logging.getLogger(__name__)
+
+DEFAULT_MAX_GAMES = 1024
+
+
+class GameState:
+    """
+    Everything needed to play a turn of a game without touching the database.
+    """
+
+    def __init__(self, game: Game, ships: list[Ship], guesses: list[Guess]):
+        self.game = game
+        self.ships: dict[int, Fleet] = defaultdict(Fleet)
+        self.ships_by_id: dict[int, Ship] = {}
+        for ship in ships:
+            self.add_ship(ship)
+        self.guesses: list[Guess] = []
+        self.shots: dict[int, ShotBitset] = defaultdict(
+            lambda: ShotBitset(game.board_width, game.board_height)
+        )
+        for guess in guesses:
+            self.add_guess(guess)
+
+    def add_ship(self, ship: Ship) -> None:
+        self.ships[ship.player_id].add(ship)
+        self.ships_by_id[ship.id] = ship
+
+    def replace_ship(self, updated_ship: Ship) -> None:
+        self.ships[updated_ship.player_id].replace(updated_ship)
+        self.ships_by_id[updated_ship.id] = updated_ship
+
+    def add_guess(self, guess: Guess) -> None:
+        self.guesses.append(guess)
+        self.shots[guess.offense_player_id].add((guess.position_x, guess.position_y))
+
+    def player_guesses(self, player_id: int) -> list[Guess]:
+        return [guess for guess in self.guesses if guess.offense_player_id == player_id]
+
+    def game_details(self, player_id: int) -> dict:
+        """
+        The game, the player's ships and the guesses of both players.
+        """
+        game = self.game
+        enemy_player_id: int = (
+            game.player_1_id if game.player_1_id != player_id else game.player_2_id
+        )
+        return {
+            "game": game,
+            "player_ships": self.ships[player_id],
+            "player_guesses": self.player_guesses(player_id),
+            "enemy_guesses": self.player_guesses(enemy_player_id),
+        }
+
+
+class GameStateCache:
+    """
+    Per-process cache of active games in front of a BattleshipDatabase.
+
+    Reads of a cached game are served from memory. A database which plays
+    turns whole, like BattleshipDatabase, plays every turn through the cache
+    in its own transaction, and the turn is then applied to the cached state.
+    In front of any other database, the writes made while playing a turn
+    (hits, current player, guesses) are applied to the cached state
+    immediately and written to the database in the background, in the order
+    they were made. Writes that need an id from the database, such as adding
+    a ship, go straight through. Any method not implemented here is
+    delegated to the wrapped database.
+    """
+
+    def __init__(self, db, max_games: int = DEFAULT_MAX_GAMES):
+        self.db = db
+        self.max_games = max_games
+        self._games: OrderedDict[int, GameState] = OrderedDict()
+        self._ship_game_ids: dict[int, int] = {}
+        self._loading: dict[int, asyncio.Task] = {}
+        self._pending_writes: Counter[int] = Counter()
+        self._write_queue: asyncio.Queue = None
+        self._writer: asyncio.Task = None
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    @property
+    def plays_whole_turns(self) -> bool:
+        return can_play_whole_turns(self.db)
+
+    async def get_state(self, game_id: int) -> GameState:
+        """
+        Returns the cached state of the game, loading it from the database on
+        a miss. Returns None if the game does not exist.
+        """
+        state = self._games.get(game_id)
+        if state is not None:
+            self._games.move_to_end(game_id)
+            return state
+
+        # Coalesce concurrent misses so there is only one copy of the state
+        if game_id not in self._loading:
+            self._loading[game_id] = asyncio.ensure_future(self._load(game_id))
+        try:
+            return await asyncio.shield(self._loading[game_id])
+        finally:
+            self._loading.pop(game_id, None)
+
+    async def _load(self, game_id: int) -> GameState:
+        if self._pending_writes[game_id]:
+            # The game was evicted with writes in flight, let them land first
+            await self.flush()
+        game_state: dict = await self.db.get_game_state(game_id)
+        if game_state is None:
+            return None
+
+        state = GameState(
+            game_state["game"], game_state["ships"], game_state["guesses"]
+        )
+        self._games[game_id] = state
+        for ship in game_state["ships"]:
+            self._ship_game_ids[ship.id] = game_id
+        while len(self._games) > self.max_games:
+            self.evict(next(iter(self._games)))
+        return state
+
+    def evict(self, game_id: int) -> None:
+        """
+        Drops a game from the cache. Pending writes are still flushed.
+        """
+        state = self._games.pop(game_id, None)
+        if state is None:
+            return
+        for ship_id in state.ships_by_id:
+            self._ship_game_ids.pop(ship_id, None)
+
+    # dto is accepted for compatibility with BattleshipDatabase: cached games
+    # are already in memory, so there is nothing to save by reading DTOs.
+    async def get_game(self, game_id: int, dto: bool = False):
+        state = await self.get_state(game_id)
+        return None if state is None else state.game
+
+    async def update_game(self, game_id: int, updates: dict):
+        state = await self.get_state(game_id)
+        if state is not None:
+            for column, value in updates.items():
+                setattr(state.game, column, value)
+        self._write_behind(game_id, self.db.update_game, game_id, updates)
+
+    async def get_player_ships(
+        self, game_id: int, player_id: int, dto: bool = False
+    ) -> list[Ship]:
+        state = await self.get_state(game_id)
+        if state is None:
+            return []
+        return state.ships[player_id]
+
+    async def get_ship(self, ship_id: int):
+        game_id = self._ship_game_ids.get(ship_id)
+        if game_id is None or game_id not in self._games:
+            return await self.db.get_ship(ship_id=ship_id)
+        return self._games[game_id].ships_by_id[ship_id]
+
+    async def add_ship(self, ship: Ship):
+        ship = await self.db.add_ship(ship)
+        state = self._games.get(ship.game_id)
+        if state is not None:
+            state.add_ship(ship)
+            self._ship_game_ids[ship.id] = ship.game_id
+        return ship
+
+    async def add_ships(self, ships: list[dict]) -> list[Ship]:
+        new_ships = await self.db.add_ships(ships)
+        for ship in new_ships:
+            state = self._games.get(ship.game_id)
+            if state is not None:
+                state.add_ship(ship)
+                self._ship_game_ids[ship.id] = ship.game_id
+        return new_ships
+
+    async def update_ship(self, ship_id: int, updates: dict) -> Ship:
+        updated_ship = await self.db.update_ship(ship_id=ship_id, updates=updates)
+        state = self._games.get(updated_ship.game_id)
+        if state is not None:
+            state.replace_ship(updated_ship)
+        return updated_ship
+
+    async def increment_ship_hits(self, ship_id: int) -> int:
+        game_id = self._ship_game_ids.get(ship_id)
+        state = self._games.get(game_id)
+        if state is None:
+            return await self.db.increment_ship_hits(ship_id=ship_id)
+
+        ship = state.ships_by_id[ship_id]
+        ship.hits += 1
+        self._write_behind(game_id, self.db.increment_ship_hits, ship_id)
+        return ship.hits
+
+    async def increment_ships_hits(self, hits: dict[int, int]) -> None:
+        # The ships hit by a salvo all belong to the same game
+        game_id = self._ship_game_ids.get(next(iter(hits)))
+        state = self._games.get(game_id)
+        if state is None:
+            return await self.db.increment_ships_hits(hits)
+
+        for ship_id, ship_hits in hits.items():
+            state.ships_by_id[ship_id].hits += ship_hits
+        self._write_behind(game_id, self.db.increment_ships_hits, hits)
+
+    async def add_guesses(self, guesses: list[dict]) -> None:
+        for guess in guesses:
+            state = self._games.get(guess["game_id"])
+            if state is not None:
+                state.add_guess(Guess(**guess))
+        self._write_behind(guesses[0]["game_id"], self.db.add_guesses, guesses)
+
+    async def add_guess(self, guess: Guess):
+        state = self._games.get(guess.game_id)
+        if state is not None:
+            state.add_guess(guess)
+        self._write_behind(guess.game_id, self.db.add_guess, guess)
+        return guess
+
+    async def play_turn(
+        self,
+        game_id: int,
+        guess_position_x: int,
+        guess_position_y: int,
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> GuessResult:
+        async def play() -> list[GuessResult]:
+            result = await self.db.play_turn(
+                game_id,
+                guess_position_x,
+                guess_position_y,
+                offense_player_id,
+                defense_player_id,
+            )
+            return [result]
+
+        (result,) = await self._play(
+            game_id,
+            [(guess_position_x, guess_position_y)],
+            offense_player_id,
+            defense_player_id,
+            GameMode.classic,
+            play,
+        )
+        return result
+
+    async def play_salvo(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+    ) -> list[GuessResult]:
+        return await self._play(
+            game_id,
+            shots,
+            offense_player_id,
+            defense_player_id,
+            GameMode.salvo,
+            lambda: self.db.play_salvo(
+                game_id, shots, offense_player_id, defense_player_id
+            ),
+        )
+
+    async def _play(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+        mode: GameMode,
+        play: Callable[[], Awaitable[list[GuessResult]]],
+    ) -> list[GuessResult]:
+        """
+        Plays the turn whole with play, then applies it to the cached state.
+        The database checks the turn against the game as it is there, which
+        another process may have moved past the cached state, so a cached
+        state which disagrees with the turn is dropped instead.
+        """
+        try:
+            results = await play()
+        except Exception:
+            self.evict(game_id)
+            raise
+        state = self._games.get(game_id)
+        if state is not None and not self._apply_turn(
+            state, shots, offense_player_id, defense_player_id, mode, results
+        ):
+            LOGGER.info(f"Cached state of {game_id=} is behind the database")
+            self.evict(game_id)
+        return results
+
+    def _apply_turn(
+        self,
+        state: GameState,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+        mode: GameMode,
+        results: list[GuessResult],
+    ) -> bool:
+        """
+        Applies a turn played by the database to the cached state, and
+        returns whether the state agreed with it.
+        """
+        game = state.game
+        try:
+            check_turn(game, offense_player_id, mode)
+            check_shots(game, shots, state.shots[offense_player_id])
+        except GameRuleError:
+            return False
+        hit_ships = [
+            find_hit_ship(state.ships[defense_player_id], shot) for shot in shots
+        ]
+        if [ship is None for ship in hit_ships] != [
+            result == GuessResult.miss for result in results
+        ]:
+            return False
+
+        for shot, ship, result in zip(shots, hit_ships, results):
+            if ship is not None:
+                ship.hits += 1
+            state.add_guess(
+                Guess(
+                    game_id=game.id,
+                    offense_player_id=offense_player_id,
+                    ship_id=None if ship is None else ship.id,
+                    position_x=shot[0],
+                    position_y=shot[1],
+                    result=result,
+                )
+            )
+        if GuessResult.victory in results:
+            game.status = GameStatus.completed
+        else:
+            game.current_player_id = defense_player_id
+        return True
+
+    async def get_player_shots(self, game_id: int, player_id: int) -> ShotBitset:
+        state = await self.get_state(game_id)
+        if state is None:
+            return await self.db.get_player_shots(game_id, player_id)
+        return state.shots[player_id]
+
+    async def get_game_details(self, game_id: int, player_id) -> dict:
+        state = await self.get_state(game_id)
+        if state is None:
+            LOGGER.error(f"Failed to locate {game_id=} in database")
+            return None
+        return state.game_details(player_id)
+
+    async def get_player_game_details(self, game_id: int, player_id: int) -> dict:
+        game_details = await self.get_game_details(game_id, player_id)
+        if game_details is None:
+            return None
+        return game_details_response(**game_details)
+
+    def _write_behind(self, game_id: int, write, *args) -> None:
+        if self._writer is None:
+            self._write_queue = asyncio.Queue()
+            self._writer = asyncio.ensure_future(self._run_writer())
+        self._pending_writes[game_id] += 1
+        self._write_queue.put_nowait((game_id, write, args))
+
+    async def _run_writer(self) -> None:
+        while True:
+            game_id, write, args = await self._write_queue.get()
+            try:
+                await write(*args)
+            except Exception:
+                # The cached state no longer matches the database, so drop it
+                # and let the next read reload the authoritative state.
+                LOGGER.exception(f"Failed to persist write for {game_id=}")
+                self.evict(game_id)
+            finally:
+                self._pending_writes[game_id] -= 1
+                if not self._pending_writes[game_id]:
+                    del self._pending_writes[game_id]
+                self._write_queue.task_done()
+
+    async def archive_completed_games(self, limit: int) -> list[int]:
+        """
+        Archives completed games once the writes made through the cache have
+        reached the database, skipping the games written to since, so none of
+        their rows reach the live tables after the game was archived.
+        """
+        await self.flush()
+        return await self.db.archive_completed_games(
+            limit, skip_game_ids=set(self._pending_writes)
+        )
+
+    async def flush(self) -> None:
+        """
+        Waits until every pending write has reached the database.
+        """
+        if self._write_queue is not None:
+            await self._write_queue.join()
+
+    async def close(self) -> None:
+        """
+        Flushes pending writes, stops the background writer and closes the
+        database.
+        """
+        await self.flush()
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+            self._write_queue = None
+        await self.db.close()
@@ -0,0 +1,49 @@
+from datetime import datetime
+from battleship.models.base import Base
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import JSON, DateTime, Enum, ForeignKey, Integer, UniqueConstraint
+import enum
+
+
+class GameEventKind(str, enum.Enum):
+    ship_placed = "ship_placed"
+    ship_moved = "ship_moved"
+    turn = "turn"
+
+
+class GameEvent(Base):
+    """
+    An action taken in a game. The events of a game are numbered from 1 by
+    seq, and the unique (game_id, seq) makes two writers appending the same
+    event number conflict instead of both succeeding.
+    """
+
+    __tablename__ = "game_event"
+    __table_args__ = (
+        UniqueConstraint("game_id", "seq", name="uq_game_event_game_id_seq"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    game_id: Mapped[int] = mapped_column(ForeignKey("game.id"))
+    seq: Mapped[int] = mapped_column(Integer)
+    kind: Mapped[GameEventKind] = mapped_column(Enum(GameEventKind))
+    data: Mapped[dict] = mapped_column(JSON)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+
+    def __repr__(self) -> str:
+        return f"GameEvent(id={self.id!r}, game_id={self.game_id!r}, seq={self.seq!r}, kind={self.kind!r}, data={self.data!r})"
+
+
+class GameSnapshot(Base):
+    """
+    The state of a game after its events up to seq.
+    """
+
+    __tablename__ = "game_snapshot"
+
+    game_id: Mapped[int] = mapped_column(ForeignKey("game.id"), primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    state: Mapped[dict] = mapped_column(JSON)
+
+    def __repr__(self) -> str:
+        return f"GameSnapshot(game_id={self.game_id!r}, seq={self.seq!r})"
@@ -1,6 +1,6 @@
 from battleship.models.base import Base
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from sqlalchemy import ForeignKey, Enum, Integer
+from sqlalchemy import ForeignKey, Enum, Index, Integer
 import enum
 
 
@@ -12,6 +12,9 @@ class GuessResult(str, enum.Enum):
 
 class Guess(Base):
     __tablename__ = "guess"
+    __table_args__ = (
+        Index("ix_guess_game_id_offense_player_id", "game_id", "offense_player_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     game_id: Mapped[int] = mapped_column(ForeignKey("game.id"))
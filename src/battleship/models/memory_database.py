@@ -0,0 +1,138 @@
+import itertools
+from collections import defaultdict
+from battleship.game_details import game_details_response
+from battleship.shots import ShotBitset
+from battleship.models.game import Game, GameStatus
+from battleship.models.game_cache import GameState
+from battleship.models.guess import Guess
+from battleship.models.player import Player
+from battleship.models.ship import Ship
+
+
+class InMemoryDatabase:
+    """
+    Stand-in for BattleshipDatabase which keeps every game in process memory,
+    so the turn logic of battleship.utils can be run without a database
+    server, e.g. to play bot tournaments. Nothing is persisted. Reads ignore
+    dto since the objects are already in memory.
+    """
+
+    def __init__(self):
+        self.players: dict[int, Player] = {}
+        self.games: dict[int, GameState] = {}
+        self.ships: dict[int, Ship] = {}
+        self._ids = defaultdict(lambda: itertools.count(1))
+
+    def _next_id(self, table: str) -> int:
+        return next(self._ids[table])
+
+    async def add_player(self, player: Player):
+        player.id = self._next_id("player")
+        self.players[player.id] = player
+        return player
+
+    async def add_players(self, players: list[dict]) -> list[int]:
+        return [(await self.add_player(Player(**player))).id for player in players]
+
+    async def get_player_by_id(self, player_id: int):
+        return self.players.get(player_id)
+
+    async def add_game(self, game: Game):
+        game.id = self._next_id("game")
+        self.games[game.id] = GameState(game, [], [])
+        return game
+
+    async def add_games(self, games: list[dict]) -> list[int]:
+        return [(await self.add_game(Game(**game))).id for game in games]
+
+    async def get_game(self, game_id: int, dto: bool = False):
+        state = self.games.get(game_id)
+        return None if state is None else state.game
+
+    async def update_game(self, game_id: int, updates: dict):
+        game = self.games[game_id].game
+        for column, value in updates.items():
+            setattr(game, column, value)
+
+    async def get_player_games(
+        self,
+        player_id: int,
+        dto: bool = False,
+        status: GameStatus = None,
+        cursor: int = None,
+        limit: int = None,
+    ):
+        games = [
+            state.game
+            for game_id, state in sorted(self.games.items(), reverse=True)
+            if player_id in (state.game.player_1_id, state.game.player_2_id)
+            and (status is None or state.game.status == status)
+            and (cursor is None or game_id < cursor)
+        ]
+        return games[:limit]
+
+    async def add_ship(self, ship: Ship):
+        ship.id = self._next_id("ship")
+        self.ships[ship.id] = ship
+        self.games[ship.game_id].add_ship(ship)
+        return ship
+
+    async def add_ships(self, ships: list[dict]) -> list[Ship]:
+        return [await self.add_ship(Ship(**ship)) for ship in ships]
+
+    async def get_ship(self, ship_id: int):
+        return self.ships.get(ship_id)
+
+    async def update_ship(self, ship_id: int, updates: dict) -> Ship:
+        ship = self.ships[ship_id]
+        # Reindex the ship under the cells it covers after the update
+        state = self.games[ship.game_id]
+        state.ships[ship.player_id].remove_ship(ship_id)
+        for column, value in updates.items():
+            setattr(ship, column, value)
+        state.add_ship(ship)
+        return ship
+
+    async def get_player_ships(
+        self, game_id: int, player_id: int, dto: bool = False
+    ) -> list[Ship]:
+        return self.games[game_id].ships[player_id]
+
+    async def increment_ship_hits(self, ship_id: int) -> int:
+        ship = self.ships[ship_id]
+        ship.hits += 1
+        return ship.hits
+
+    async def increment_ships_hits(self, hits: dict[int, int]) -> None:
+        for ship_id, ship_hits in hits.items():
+            self.ships[ship_id].hits += ship_hits
+
+    async def add_guess(self, guess: Guess):
+        guess.id = self._next_id("guess")
+        self.games[guess.game_id].add_guess(guess)
+        return guess
+
+    async def add_guesses(self, guesses: list[dict]) -> None:
+        for guess in guesses:
+            await self.add_guess(Guess(**guess))
+
+    async def get_player_shots(self, game_id: int, player_id: int) -> ShotBitset:
+        return self.games[game_id].shots[player_id]
+
+    async def get_player_guesses(self, game_id: int, player_id) -> list[Guess]:
+        return self.games[game_id].player_guesses(player_id)
+
+    async def get_game_details(self, game_id: int, player_id) -> dict:
+        state = self.games.get(game_id)
+        if state is None:
+            return None
+        return state.game_details(player_id)
+
+    async def get_player_game_details(self, game_id: int, player_id: int) -> dict:
+        game_details = await self.get_game_details(game_id, player_id)
+        if game_details is None:
+            return None
+        return game_details_response(**game_details)
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,233 @@
+"""
+Cache of player and game metadata in front of a database.
+
+Players barely change, and the players, board and fleet of a game never do,
+yet they are read on most requests. MetadataCache answers get_player_by_id,
+DTO reads of get_game and get_player_games from a cache store, each kind of
+entry kept for its own TTL, and a burst of identical misses reads the
+database once. Writes made through it drop the entries they make stale.
+Reads of a game as ORM objects, which turns are checked against, are never
+cached.
+
+The store is pluggable: anything with the async get, set and delete of
+TTLCache, which keeps entries in process memory and evicts the least
+recently used beyond a number of entries.
+"""
+
+import asyncio
+import itertools
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+from battleship.models.replicas import game_key, player_key
+
+DEFAULT_MAX_ENTRIES = 10000
+# Seconds entries of each kind are kept
+DEFAULT_TTLS = {"player": 300.0, "game": 10.0, "player_games": 5.0}
+
+
+class TTLCache:
+    """
+    Entries which expire ttl seconds after they are set, at most max_entries
+    of them, the least recently used evicted first.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    async def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: Hashable, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class MetadataCache:
+    """
+    Wraps a database, or a GameStateCache, caching its metadata reads and
+    passing everything else through. Writes to games must go through it, or
+    their readers may see the game as it was for up to its TTL.
+    """
+
+    def __init__(self, db, store=None, ttls: dict[str, float] = None):
+        self.db = db
+        self.store = TTLCache() if store is None else store
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.hits: Counter[str] = Counter()
+        self.misses: Counter[str] = Counter()
+        self._loading: dict[Hashable, asyncio.Task] = {}
+        # Part of the keys of a player's pages of games, so they are all
+        # dropped at once by moving to a new generation. Generations are kept
+        # in the store as long as pages, so they expire with the pages.
+        self._generations = itertools.count(1)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """
+        The hits and misses of each kind of entry.
+        """
+        return {
+            kind: {"hits": self.hits[kind], "misses": self.misses[kind]}
+            for kind in self.ttls
+        }
+
+    async def _cached(
+        self, kind: str, key: Hashable, load: Callable[[], Awaitable]
+    ) -> Any:
+        """
+        Returns the cached value of the key, or loads it on a miss. Concurrent
+        misses of the same key share a single load. None is never cached.
+        """
+        value = await self.store.get(key)
+        if value is not None:
+            self.hits[kind] += 1
+            return value
+
+        self.misses[kind] += 1
+        task = self._loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(kind, key, load))
+            self._loading[key] = task
+        try:
+            return await asyncio.shield(task)
+        finally:
+            # A write while loading may have started another load of the key
+            if self._loading.get(key) is task:
+                del self._loading[key]
+
+    async def _load(
+        self, kind: str, key: Hashable, load: Callable[[], Awaitable]
+    ) -> Any:
+        value = await load()
+        # A write while loading may have made the value stale
+        if value is not None and self._loading.get(key) is asyncio.current_task():
+            await self.store.set(key, value, self.ttls[kind])
+        return value
+
+    async def invalidate(self, *keys: Hashable) -> None:
+        for key in keys:
+            self._loading.pop(key, None)
+        await self.store.delete(*keys)
+
+    async def _drop_player_games(self, *player_ids: int) -> None:
+        for player_id in player_ids:
+            await self.store.set(
+                ("player_games_generation", player_id),
+                next(self._generations),
+                self.ttls["player_games"],
+            )
+
+    async def _wrote_game(self, game_id: int, *player_ids: int) -> None:
+        await self.invalidate(game_key(game_id))
+        await self._drop_player_games(*player_ids)
+
+    async def get_player_by_id(self, player_id: int):
+        return await self._cached(
+            "player",
+            player_key(player_id),
+            lambda: self.db.get_player_by_id(player_id),
+        )
+
+    async def get_game(self, game_id: int, dto: bool = False):
+        if not dto:
+            return await self.db.get_game(game_id)
+        return await self._cached(
+            "game", game_key(game_id), lambda: self.db.get_game(game_id, dto=True)
+        )
+
+    async def get_player_games(
+        self,
+        player_id: int,
+        dto: bool = False,
+        status=None,
+        cursor: int = None,
+        limit: int = None,
+    ):
+        generation = await self.store.get(("player_games_generation", player_id))
+        key = ("player_games", player_id, generation, dto, status, cursor, limit)
+        return await self._cached(
+            "player_games",
+            key,
+            lambda: self.db.get_player_games(
+                player_id, dto=dto, status=status, cursor=cursor, limit=limit
+            ),
+        )
+
+    async def add_game(self, game):
+        game = await self.db.add_game(game)
+        await self._drop_player_games(game.player_1_id, game.player_2_id)
+        return game
+
+    async def add_games(self, games: list[dict]) -> list[int]:
+        game_ids = await self.db.add_games(games)
+        await self._drop_player_games(
+            *{
+                game[column]
+                for game in games
+                for column in ("player_1_id", "player_2_id")
+            }
+        )
+        return game_ids
+
+    async def update_game(self, game_id: int, updates: dict):
+        # The players of a game never change, so they may come from the cache
+        game = await self.get_game(game_id, dto=True)
+        try:
+            return await self.db.update_game(game_id, updates)
+        finally:
+            player_ids = () if game is None else (game.player_1_id, game.player_2_id)
+            await self._wrote_game(game_id, *player_ids)
+
+    async def play_turn(
+        self,
+        game_id: int,
+        guess_position_x: int,
+        guess_position_y: int,
+        offense_player_id: int,
+        defense_player_id: int,
+    ):
+        try:
+            return await self.db.play_turn(
+                game_id,
+                guess_position_x,
+                guess_position_y,
+                offense_player_id,
+                defense_player_id,
+            )
+        finally:
+            await self._wrote_game(game_id, offense_player_id, defense_player_id)
+
+    async def play_salvo(
+        self,
+        game_id: int,
+        shots: list[tuple[int, int]],
+        offense_player_id: int,
+        defense_player_id: int,
+    ):
+        try:
+            return await self.db.play_salvo(
+                game_id, shots, offense_player_id, defense_player_id
+            )
+        finally:
+            await self._wrote_game(game_id, offense_player_id, defense_player_id)
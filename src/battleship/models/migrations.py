@@ -0,0 +1,597 @@
+"""
+Schema migrations.
+
+Migrations are applied in order, each in its own transaction, and the
+versions applied are recorded in the schema_version table so every
+migration runs once per database. A migration is a function of a
+synchronous connection, run through AsyncConnection.run_sync, and must be
+safe to run against a schema which already has its changes, since databases
+created from the models before migrations existed, or by the tests, may
+already have them.
+
+    python -m battleship.models.migrations [--target VERSION]
+"""
+
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Optional
+from sqlalchemy import (
+    JSON,
+    BigInteger,
+    Boolean,
+    Column,
+    Connection,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    MetaData,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+    cast,
+    delete,
+    func,
+    inspect,
+    insert,
+    literal,
+    select,
+    text,
+    union_all,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from battleship.models.base import Base
+from battleship.models.database import DATABASE_URL
+from battleship.shots import ShotBitset
+
+LOGGER = logging.getLogger(__name__)
+
+schema_version = Table(
+    "schema_version",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+# The schema as it was before migrations existed. Migrations describe the
+# tables they change themselves rather than importing the models, so they
+# keep doing the same thing as the models evolve.
+baseline = MetaData()
+player = Table(
+    "player",
+    baseline,
+    Column("id", Integer, primary_key=True),
+    Column("first_name", String, nullable=False),
+    Column("last_name", String, nullable=False),
+    Column("email", String, nullable=False),
+)
+game = Table(
+    "game",
+    baseline,
+    Column("id", Integer, primary_key=True),
+    Column("player_1_id", ForeignKey("player.id"), nullable=False),
+    Column("player_2_id", ForeignKey("player.id"), nullable=False),
+    Column("current_player_id", ForeignKey("player.id"), nullable=False),
+    Column(
+        "status", Enum("in_progress", "completed", name="gamestatus"), nullable=False
+    ),
+)
+ship = Table(
+    "ship",
+    baseline,
+    Column("id", Integer, primary_key=True),
+    Column("game_id", ForeignKey("game.id"), nullable=False),
+    Column("player_id", ForeignKey("player.id"), nullable=False),
+    Column(
+        "orientation",
+        Enum("horizontal", "vertical", name="shiporientation"),
+        nullable=False,
+    ),
+    Column("start_position_x", Integer, nullable=False),
+    Column("start_position_y", Integer, nullable=False),
+    Column("size", Integer, nullable=False),
+    Column("hits", Integer, nullable=False),
+)
+guess = Table(
+    "guess",
+    baseline,
+    Column("id", Integer, primary_key=True),
+    Column("game_id", ForeignKey("game.id"), nullable=False),
+    Column("offense_player_id", ForeignKey("player.id"), nullable=False),
+    Column("ship_id", ForeignKey("ship.id"), nullable=True),
+    Column("position_x", Integer, nullable=False),
+    Column("position_y", Integer, nullable=False),
+    Column(
+        "result", Enum("hit", "miss", "victory", name="guessresult"), nullable=False
+    ),
+)
+
+
+def create_baseline_tables(conn: Connection) -> None:
+    """
+    Creates the original tables, unless the database already has them.
+    """
+    baseline.create_all(conn, checkfirst=True)
+
+
+def add_column(
+    conn: Connection, table: str, column: Column, default: Optional[str]
+) -> None:
+    """
+    Adds a column to a table unless it is already there. Existing rows take
+    the default, given as SQL, or are NULL if the default is None.
+    """
+    if column.name in {c["name"] for c in inspect(conn).get_columns(table)}:
+        return
+    if isinstance(column.type, Enum):
+        # Enum columns need their type to exist first on PostgreSQL
+        column.type.create(conn, checkfirst=True)
+    column_type = column.type.compile(dialect=conn.dialect)
+    constraint = "" if default is None else f" NOT NULL DEFAULT {default}"
+    conn.execute(
+        text(f"ALTER TABLE {table} ADD COLUMN {column.name} {column_type}{constraint}")
+    )
+
+
+def add_game_settings_and_bots(conn: Connection) -> None:
+    """
+    Adds the columns for per-game board size, fleet and mode, and for bots.
+    """
+    mode = Enum("classic", "salvo", name="gamemode", metadata=MetaData())
+    add_column(conn, "game", Column("mode", mode), "'classic'")
+    add_column(conn, "game", Column("board_width", Integer), "10")
+    add_column(conn, "game", Column("board_height", Integer), "10")
+    add_column(conn, "game", Column("fleet", JSON), "'[5, 4, 4, 3, 3, 3, 2, 2, 2, 2]'")
+    add_column(conn, "player", Column("is_bot", Boolean), "false")
+
+
+def index_player_lookups(conn: Connection) -> None:
+    """
+    Indexes a player's ships and guesses in a game, for get_player_ships and
+    get_game_details, and a player's games on either seat, for
+    get_player_games.
+    """
+    indexes = [
+        Index("ix_ship_game_id_player_id", ship.c.game_id, ship.c.player_id),
+        Index(
+            "ix_guess_game_id_offense_player_id",
+            guess.c.game_id,
+            guess.c.offense_player_id,
+        ),
+        Index("ix_game_player_1_id", game.c.player_1_id),
+        Index("ix_game_player_2_id", game.c.player_2_id),
+    ]
+    existing = {
+        index["name"]
+        for table in ("ship", "guess", "game")
+        for index in inspect(conn).get_indexes(table)
+    }
+    for index in indexes:
+        if index.name not in existing:
+            index.create(conn)
+
+
+def create_game_events(conn: Connection) -> None:
+    """
+    Creates the tables of event-sourced games, unless the database already
+    has them.
+    """
+    events = MetaData()
+    Table("game", events, Column("id", Integer, primary_key=True))
+    Table(
+        "game_event",
+        events,
+        Column("id", Integer, primary_key=True),
+        Column("game_id", ForeignKey("game.id"), nullable=False),
+        Column("seq", Integer, nullable=False),
+        Column(
+            "kind",
+            Enum("ship_placed", "ship_moved", "turn", name="gameeventkind"),
+            nullable=False,
+        ),
+        Column("data", JSON, nullable=False),
+        Column("created_at", DateTime, nullable=False),
+        UniqueConstraint("game_id", "seq", name="uq_game_event_game_id_seq"),
+    )
+    Table(
+        "game_snapshot",
+        events,
+        Column("game_id", ForeignKey("game.id"), primary_key=True),
+        Column("seq", Integer, primary_key=True),
+        Column("state", JSON, nullable=False),
+    )
+    events.create_all(
+        conn,
+        tables=[events.tables["game_event"], events.tables["game_snapshot"]],
+        checkfirst=True,
+    )
+
+
+def index_player_games(conn: Connection) -> None:
+    """
+    Replaces the indexes of a player's games on either seat by ones ordered
+    by game id, so get_player_games reads a page of the newest games straight
+    from the index.
+    """
+    existing = {index["name"] for index in inspect(conn).get_indexes("game")}
+    for seat in ("player_1_id", "player_2_id"):
+        index = Index(f"ix_game_{seat}_id", game.c[seat], game.c.id)
+        if index.name not in existing:
+            index.create(conn)
+        if f"ix_game_{seat}" in existing:
+            Index(f"ix_game_{seat}", game.c[seat]).drop(conn)
+
+
+def create_archive(conn: Connection) -> None:
+    """
+    Creates the archive tables of the ships and guesses of completed games,
+    and indexes the victories the archiver looked games up by, until it
+    went by game status and drop_guess_victory_index dropped the index.
+    """
+    archive = MetaData()
+    Table(
+        "archived_ship",
+        archive,
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("game_id", Integer, nullable=False),
+        Column("player_id", Integer, nullable=False),
+        Column(
+            "orientation",
+            Enum("horizontal", "vertical", name="shiporientation"),
+            nullable=False,
+        ),
+        Column("start_position_x", Integer, nullable=False),
+        Column("start_position_y", Integer, nullable=False),
+        Column("size", Integer, nullable=False),
+        Column("hits", Integer, nullable=False),
+        Index("ix_archived_ship_game_id_player_id", "game_id", "player_id"),
+    )
+    Table(
+        "archived_guess",
+        archive,
+        Column("id", Integer, primary_key=True, autoincrement=False),
+        Column("game_id", Integer, nullable=False),
+        Column("offense_player_id", Integer, nullable=False),
+        Column("ship_id", Integer, nullable=True),
+        Column("position_x", Integer, nullable=False),
+        Column("position_y", Integer, nullable=False),
+        Column(
+            "result",
+            Enum("hit", "miss", "victory", name="guessresult"),
+            nullable=False,
+        ),
+        Index(
+            "ix_archived_guess_game_id_offense_player_id",
+            "game_id",
+            "offense_player_id",
+        ),
+    )
+    archive.create_all(conn, checkfirst=True)
+
+    existing = {index["name"] for index in inspect(conn).get_indexes("guess")}
+    if "ix_guess_victory_game_id" not in existing:
+        victory = text("result = 'victory'")
+        Index(
+            "ix_guess_victory_game_id",
+            guess.c.game_id,
+            postgresql_where=victory,
+            sqlite_where=victory,
+        ).create(conn)
+
+
+def add_board_state(conn: Connection) -> None:
+    """
+    Adds the hit masks of ships and the board state of each seat of a game,
+    described in battleship.board_state, and computes them from the ships and
+    guesses of both tiers.
+    """
+    for table in ("ship", "archived_ship"):
+        add_column(conn, table, Column("hit_mask", BigInteger), "0")
+    for player in ("player_1", "player_2"):
+        add_column(conn, "game", Column(f"{player}_ships_afloat", Integer), "0")
+        add_column(conn, "game", Column(f"{player}_shots", LargeBinary), None)
+
+    board = MetaData()
+    game_board = Table(
+        "game",
+        board,
+        Column("id", Integer, primary_key=True),
+        Column("player_1_id", Integer),
+        Column("player_2_id", Integer),
+        Column("board_width", Integer),
+        Column("board_height", Integer),
+        Column("player_1_ships_afloat", Integer),
+        Column("player_2_ships_afloat", Integer),
+        Column("player_1_shots", LargeBinary),
+        Column("player_2_shots", LargeBinary),
+    )
+    tiers = []
+    for ship_table, guess_table in (
+        ("ship", "guess"),
+        ("archived_ship", "archived_guess"),
+    ):
+        tiers.append(
+            (
+                Table(
+                    ship_table,
+                    board,
+                    Column("id", Integer, primary_key=True),
+                    Column("game_id", Integer),
+                    Column("player_id", Integer),
+                    Column("start_position_x", Integer),
+                    Column("start_position_y", Integer),
+                    Column("size", Integer),
+                    Column("hits", Integer),
+                    Column("hit_mask", BigInteger),
+                ),
+                Table(
+                    guess_table,
+                    board,
+                    Column("id", Integer, primary_key=True),
+                    Column("game_id", Integer),
+                    Column("offense_player_id", Integer),
+                    Column("ship_id", Integer),
+                    Column("position_x", Integer),
+                    Column("position_y", Integer),
+                ),
+            )
+        )
+
+    for ships, guesses in tiers:
+        # Each cell hit sets its bit once, however many times it was fired at
+        # before repeat shots were rejected. Ships longer than the 63 bits of
+        # a mask keep a mask of 0 and are sunk by their hits.
+        cell_bit = literal(1, BigInteger).op("<<")(
+            guesses.c.position_x
+            - ships.c.start_position_x
+            + guesses.c.position_y
+            - ships.c.start_position_y
+        )
+        hit_mask = (
+            select(func.coalesce(func.sum(cell_bit.distinct()), 0))
+            .where(guesses.c.ship_id == ships.c.id, ships.c.size <= 63)
+            .scalar_subquery()
+        )
+        conn.execute(update(ships).values(hit_mask=hit_mask))
+
+    for player in ("player_1", "player_2"):
+        afloat = [
+            select(func.count())
+            .where(
+                ships.c.game_id == game_board.c.id,
+                ships.c.player_id == game_board.c[f"{player}_id"],
+                ships.c.hits < ships.c.size,
+            )
+            .scalar_subquery()
+            for ships, _ in tiers
+        ]
+        conn.execute(
+            update(game_board).values({f"{player}_ships_afloat": afloat[0] + afloat[1]})
+        )
+
+    shots = defaultdict(list)
+    stmt = union_all(
+        *[
+            select(
+                guesses.c.game_id,
+                guesses.c.offense_player_id,
+                guesses.c.position_x,
+                guesses.c.position_y,
+            )
+            for _, guesses in tiers
+        ]
+    )
+    for game_id, player_id, x, y in conn.execute(stmt):
+        shots[game_id, player_id].append((x, y))
+    games = conn.execute(
+        select(game_board).where(game_board.c.id.in_({key[0] for key in shots}))
+    )
+    for game in games:
+        values = {}
+        for player in ("player_1", "player_2"):
+            cells = shots.get((game.id, game._mapping[f"{player}_id"]), [])
+            bitset = ShotBitset(game.board_width, game.board_height, cells)
+            values[f"{player}_shots"] = bytes(bitset.bits) if cells else None
+        conn.execute(
+            update(game_board).where(game_board.c.id == game.id).values(values)
+        )
+
+
+def add_game_version(conn: Connection) -> None:
+    """
+    Adds the version games are updated with compare-and-set by.
+    """
+    add_column(conn, "game", Column("version", Integer), "1")
+
+
+def index_player_games_by_status(conn: Connection) -> None:
+    """
+    Indexes a player's games on either seat by status and game id, so a page
+    of a player's games with a status is read straight from the index too.
+    """
+    existing = {index["name"] for index in inspect(conn).get_indexes("game")}
+    for seat in ("player_1_id", "player_2_id"):
+        index = Index(
+            f"ix_game_{seat}_status_id", game.c[seat], game.c.status, game.c.id
+        )
+        if index.name not in existing:
+            index.create(conn)
+
+
+def complete_event_sourced_games(conn: Connection) -> None:
+    """
+    Marks the event-sourced games with a winning turn completed, as the turn
+    ending a game now writes the status to the game's row, so games are
+    listed by status from their rows whichever way they are stored.
+    """
+    events = MetaData()
+    game_event = Table(
+        "game_event",
+        events,
+        Column("game_id", Integer),
+        Column("data", JSON),
+    )
+    won_game_ids = select(game_event.c.game_id).where(
+        text("game_event.kind = 'turn'"),
+        cast(game_event.c.data, Text).like('%"victory"%'),
+    )
+    conn.execute(
+        update(game)
+        .where(game.c.id.in_(won_game_ids), game.c.status == "in_progress")
+        .values(status="completed")
+    )
+
+
+def drop_guess_victory_index(conn: Connection) -> None:
+    """
+    Drops the index of the victories in guess, as the archiver finds the
+    completed games by their status instead.
+    """
+    existing = {index["name"] for index in inspect(conn).get_indexes("guess")}
+    if "ix_guess_victory_game_id" in existing:
+        Index("ix_guess_victory_game_id", guess.c.game_id).drop(conn)
+
+
+def store_shots_in_blocks(conn: Connection) -> None:
+    """
+    Moves the cells each player has fired at from a bitset of the whole board
+    on the game row to shot_block rows of 56 cells each, so a turn reads and
+    writes only the blocks of its shots.
+    """
+    blocks = MetaData()
+    Table("game", blocks, Column("id", Integer, primary_key=True))
+    Table("player", blocks, Column("id", Integer, primary_key=True))
+    shot_block = Table(
+        "shot_block",
+        blocks,
+        Column("game_id", ForeignKey("game.id"), primary_key=True),
+        Column("player_id", ForeignKey("player.id"), primary_key=True),
+        Column("block", Integer, primary_key=True),
+        Column("bits", BigInteger),
+    )
+    blocks.create_all(conn, tables=[shot_block], checkfirst=True)
+
+    columns = {column["name"] for column in inspect(conn).get_columns("game")}
+    seats = [
+        player for player in ("player_1", "player_2") if f"{player}_shots" in columns
+    ]
+    if not seats:
+        return
+    game_shots = Table(
+        "game",
+        MetaData(),
+        Column("id", Integer, primary_key=True),
+        *[Column(f"{player}_id", Integer) for player in seats],
+        *[Column(f"{player}_shots", LargeBinary) for player in seats],
+    )
+    for game_row in conn.execute(select(game_shots)).all():
+        rows = {}
+        for player in seats:
+            player_id = game_row._mapping[f"{player}_id"]
+            bits = game_row._mapping[f"{player}_shots"] or b""
+            # 7 bytes of the bitset are the 56 bits of a block
+            for block, start in enumerate(range(0, len(bits), 7)):
+                block_bits = int.from_bytes(bits[start : start + 7], "little")
+                if block_bits:
+                    rows[player_id, block] = (
+                        rows.get((player_id, block), 0) | block_bits
+                    )
+        if rows:
+            # The bitsets hold every shot of the game's guesses, including any
+            # already in blocks
+            conn.execute(delete(shot_block).where(shot_block.c.game_id == game_row.id))
+            conn.execute(
+                insert(shot_block).values(
+                    [
+                        {
+                            "game_id": game_row.id,
+                            "player_id": player_id,
+                            "block": block,
+                            "bits": block_bits,
+                        }
+                        for (player_id, block), block_bits in rows.items()
+                    ]
+                )
+            )
+    for player in seats:
+        conn.execute(text(f"ALTER TABLE game DROP COLUMN {player}_shots"))
+
+
+# Every migration in the order it is applied. Versions are never reused.
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create baseline tables", create_baseline_tables),
+    (2, "add game settings and bots", add_game_settings_and_bots),
+    (3, "index player lookups", index_player_lookups),
+    (4, "create game events", create_game_events),
+    (5, "index player games", index_player_games),
+    (6, "create archive", create_archive),
+    (7, "add board state", add_board_state),
+    (8, "add game version", add_game_version),
+    (9, "index player games by status", index_player_games_by_status),
+    (10, "complete event-sourced games", complete_event_sourced_games),
+    (11, "drop guess victory index", drop_guess_victory_index),
+    (12, "store shots in blocks", store_shots_in_blocks),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+async def get_version(engine: AsyncEngine) -> int:
+    """
+    Returns the latest version applied to the database, 0 if none.
+    """
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            lambda sync_conn: schema_version.create(sync_conn, checkfirst=True)
+        )
+        versions = await conn.scalars(select(schema_version.c.version))
+        return max(versions, default=0)
+
+
+async def migrate(engine: AsyncEngine, target: Optional[int] = None) -> int:
+    """
+    Applies every migration up to the target version, or all of them, and
+    returns the version the database is at.
+    """
+    target = LATEST_VERSION if target is None else target
+    version = await get_version(engine)
+    for migration_version, name, migration in MIGRATIONS:
+        if migration_version <= version or migration_version > target:
+            continue
+        LOGGER.info(f"Applying migration {migration_version} {name}")
+        async with engine.begin() as conn:
+            await conn.run_sync(migration)
+            await conn.execute(
+                insert(schema_version).values(
+                    version=migration_version, name=name, applied_at=datetime.now()
+                )
+            )
+        version = migration_version
+    return version
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("--url", default=None, help="defaults to DATABASE_URL")
+    parser.add_argument("--target", type=int, default=None)
+    return parser.parse_args()
+
+
+async def main():
+    logging.basicConfig(level=logging.INFO)
+    args = parse_args()
+    engine = create_async_engine(args.url or DATABASE_URL)
+    version = await migrate(engine, args.target)
+    await engine.dispose()
+    print(f"Database is at version {version}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -9,6 +9,7 @@ class Player(Base):
     first_name: Mapped[str]
     last_name: Mapped[str]
     email: Mapped[str]
+    is_bot: Mapped[bool] = mapped_column(default=False)
 
     def __repr__(self) -> str:
-        return f"Player(id={self.id!r}, first_name={self.first_name!r}, last_name={self.last_name!r}, email={self.email!r})"
+        return f"Player(id={self.id!r}, first_name={self.first_name!r}, last_name={self.last_name!r}, email={self.email!r}, is_bot={self.is_bot!r})"
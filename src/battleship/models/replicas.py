@@ -0,0 +1,85 @@
+"""
+Routing of BattleshipDatabase reads to read replicas.
+
+Replicas trail the primary by up to the replication lag, so a player who has
+just made a move could read the game from before it. Writes record the games
+and players they touch, and reads of a game or player written to within the
+lag go to the primary instead. Everything else is spread over the replicas
+in turn.
+"""
+
+import itertools
+import time
+from collections import OrderedDict
+from typing import Hashable
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# Seconds a replica may trail the primary
+DEFAULT_REPLICA_LAG = 5.0
+
+
+def game_key(game_id: int) -> tuple:
+    return ("game", game_id)
+
+
+def player_key(player_id: int) -> tuple:
+    return ("player", player_id)
+
+
+class RecentWrites:
+    """
+    Keys written to within the last lag seconds.
+    """
+
+    def __init__(self, lag: float = DEFAULT_REPLICA_LAG):
+        self.lag = lag
+        # Oldest write first, so expired keys are dropped from the front
+        self._written: OrderedDict[Hashable, float] = OrderedDict()
+
+    def add(self, *keys: Hashable) -> None:
+        now = time.monotonic()
+        for key in keys:
+            self._written[key] = now
+            self._written.move_to_end(key)
+        while self._written:
+            key, written_at = next(iter(self._written.items()))
+            if now - written_at < self.lag:
+                break
+            del self._written[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        written_at = self._written.get(key)
+        return written_at is not None and time.monotonic() - written_at < self.lag
+
+    def __len__(self) -> int:
+        return len(self._written)
+
+
+class ReplicaRouter:
+    """
+    Picks the engine to read from: the primary for keys in recent writes, or
+    when there are no replicas, and otherwise each replica in turn.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: list[AsyncEngine],
+        lag: float = DEFAULT_REPLICA_LAG,
+    ):
+        self.primary = primary
+        self.replicas = replicas
+        self.recent_writes = RecentWrites(lag)
+        self._next_replica = itertools.cycle(replicas)
+
+    def wrote(self, *keys: Hashable) -> None:
+        """
+        Records writes to the keys, if there are replicas to route around.
+        """
+        if self.replicas:
+            self.recent_writes.add(*keys)
+
+    def reader(self, *keys: Hashable) -> AsyncEngine:
+        if not self.replicas or any(key in self.recent_writes for key in keys):
+            return self.primary
+        return next(self._next_replica)
@@ -1,6 +1,6 @@
 from battleship.models.base import Base
 from sqlalchemy.orm import relationship, Mapped, mapped_column
-from sqlalchemy import ForeignKey, Integer, Enum
+from sqlalchemy import BigInteger, ForeignKey, Index, Integer, Enum
 import enum
 
 
@@ -11,6 +11,7 @@ class ShipOrientation(str, enum.Enum):
 
 class Ship(Base):
     __tablename__ = "ship"
+    __table_args__ = (Index("ix_ship_game_id_player_id", "game_id", "player_id"),)
 
     id: Mapped[int] = mapped_column(primary_key=True)
     game_id: Mapped[int] = mapped_column(ForeignKey("game.id"))
@@ -20,6 +21,8 @@ class Ship(Base):
     start_position_y: Mapped[int] = mapped_column(Integer)
     size: Mapped[int] = mapped_column(Integer)
     hits: Mapped[int] = mapped_column(Integer)
+    # Bit i is set once the i-th cell from the start of the ship was hit
+    hit_mask: Mapped[int] = mapped_column(BigInteger, default=0)
 
     game = relationship("Game")
     player = relationship("Player")
@@ -0,0 +1,20 @@
+from battleship.models.base import Base
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy import BigInteger, ForeignKey, Integer
+
+
+class ShotBlock(Base):
+    """
+    The cells of a block of the board a player has fired at in a game, as
+    described in battleship.board_state. Blocks without a shot have no row.
+    """
+
+    __tablename__ = "shot_block"
+
+    game_id: Mapped[int] = mapped_column(ForeignKey("game.id"), primary_key=True)
+    player_id: Mapped[int] = mapped_column(ForeignKey("player.id"), primary_key=True)
+    block: Mapped[int] = mapped_column(Integer, primary_key=True)
+    bits: Mapped[int] = mapped_column(BigInteger)
+
+    def __repr__(self) -> str:
+        return f"ShotBlock(game_id={self.game_id!r}, player_id={self.player_id!r}, block={self.block!r}, bits={self.bits!r})"
@@ -0,0 +1,87 @@
+"""
+Support for running BattleshipDatabase on SQLite through aiosqlite.
+
+Every connection is put in WAL mode, so readers never block the writer or
+each other, with the pragmas below. SQLite only allows one writer at a time
+and a transaction which reads before it writes fails with SQLITE_BUSY if
+another connection commits in between, so writes are not left to race for
+the lock: they are queued and run one at a time by a single writer task.
+"""
+
+import asyncio
+from typing import Awaitable, Callable
+
+# Applied to every new connection. NORMAL is durable in WAL mode except for
+# the last transactions before a power loss, and skips an fsync per commit.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": 5000,
+    "temp_store": "MEMORY",
+    # Negative sizes are in KiB
+    "cache_size": -64000,
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+
+def is_sqlite(engine) -> bool:
+    return engine.dialect.name == "sqlite"
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    """
+    Connect event listener applying SQLITE_PRAGMAS.
+    """
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {pragma}={value}")
+    cursor.close()
+
+
+class SingleWriter:
+    """
+    Queue of writes run one at a time, in the order they were submitted, by a
+    writer task started on first use. A write must not submit another one,
+    since it would wait behind itself.
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue = None
+        self._task: asyncio.Task = None
+
+    async def submit(self, write: Callable[..., Awaitable], *args, **kwargs):
+        """
+        Queues a write and returns its result, or raises its error, once the
+        writer has run it.
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((future, write, args, kwargs))
+        return await future
+
+    async def _run(self) -> None:
+        while True:
+            future, write, args, kwargs = await self._queue.get()
+            try:
+                result = await write(*args, **kwargs)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def close(self) -> None:
+        """
+        Waits for queued writes and stops the writer.
+        """
+        if self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            self._task = None
+            self._queue = None
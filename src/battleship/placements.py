@@ -0,0 +1,104 @@
+"""
+Table of ship placements, built once at import time.
+
+A placement is keyed by (size, orientation, x, y) and maps to the tuple of
+cells the ship covers. Every legal placement of every ship size on the
+default board is in the table, so validation, the bots and the random fleet
+generator look cells up instead of building them in their inner loops.
+Placements on larger boards are computed on first use and kept in a bounded
+cache, since a 1000x1000 board has millions of them.
+"""
+
+from functools import lru_cache
+from battleship.models.game import DEFAULT_BOARD_HEIGHT, DEFAULT_BOARD_WIDTH
+
+ORIENTATIONS = ("horizontal", "vertical")
+# Placements outside of the default board kept around at any one time
+MAX_CACHED_PLACEMENTS = 1 << 16
+
+Cells = tuple[tuple[int, int], ...]
+
+
+def _cells(size: int, orientation: str, x: int, y: int) -> Cells:
+    if orientation == "horizontal":
+        return tuple((x + i, y) for i in range(size))
+    return tuple((x, y + i) for i in range(size))
+
+
+def _starts_over(
+    size: int, x: int, y: int, board_width: int, board_height: int
+) -> list[tuple[str, int, int]]:
+    """
+    Returns the orientation and start of every placement of a ship of the
+    given size which lies on the board and covers the cell (x, y).
+    """
+    return [
+        ("horizontal", start_x, y)
+        for start_x in range(max(0, x - size + 1), min(x, board_width - size) + 1)
+    ] + [
+        ("vertical", x, start_y)
+        for start_y in range(max(0, y - size + 1), min(y, board_height - size) + 1)
+    ]
+
+
+def _build_table(board_width: int, board_height: int):
+    placements = {}
+    placements_over = {}
+    for size in range(1, max(board_width, board_height) + 1):
+        for y in range(board_height):
+            for x in range(board_width):
+                for orientation in ORIENTATIONS:
+                    if orientation == "horizontal":
+                        fits = x + size <= board_width
+                    else:
+                        fits = y + size <= board_height
+                    if fits:
+                        placements[(size, orientation, x, y)] = _cells(
+                            size, orientation, x, y
+                        )
+        for y in range(board_height):
+            for x in range(board_width):
+                placements_over[(size, x, y)] = tuple(
+                    placements[(size, *start)]
+                    for start in _starts_over(size, x, y, board_width, board_height)
+                )
+    return placements, placements_over
+
+
+# Cells of every legal placement on the default board, by (size, orientation,
+# x, y), and the cells of the placements covering each cell, by (size, x, y)
+PLACEMENTS, PLACEMENTS_OVER = _build_table(DEFAULT_BOARD_WIDTH, DEFAULT_BOARD_HEIGHT)
+
+
+@lru_cache(maxsize=MAX_CACHED_PLACEMENTS)
+def _off_table_cells(size: int, orientation: str, x: int, y: int) -> Cells:
+    return _cells(size, orientation, x, y)
+
+
+def placement_cells(size: int, orientation: str, x: int, y: int) -> Cells:
+    """
+    Returns the cells covered by a ship. The placement does not need to be
+    legal.
+    """
+    cells = PLACEMENTS.get((size, orientation, x, y))
+    if cells is None:
+        return _off_table_cells(size, orientation, x, y)
+    return cells
+
+
+def placements_over(
+    size: int, cell: tuple[int, int], board_width: int, board_height: int
+) -> tuple[Cells, ...]:
+    """
+    Returns the cells of every placement of a ship of the given size which
+    lies on the board and covers the cell.
+    """
+    x, y = cell
+    if board_width == DEFAULT_BOARD_WIDTH and board_height == DEFAULT_BOARD_HEIGHT:
+        return PLACEMENTS_OVER[(size, x, y)]
+    return tuple(
+        placement_cells(size, orientation, start_x, start_y)
+        for orientation, start_x, start_y in _starts_over(
+            size, x, y, board_width, board_height
+        )
+    )
@@ -0,0 +1,216 @@
+"""
+Rules of the game that do not depend on where the game state is stored, so
+they can be shared by the turn logic in battleship.utils and by the
+transactional turn in BattleshipDatabase.
+"""
+
+import logging
+from collections import Counter
+from typing import Container, Optional
+from battleship.board_state import MAX_SHIP_SIZE
+from battleship.errors import GameRuleError
+from battleship.fleet import Fleet, as_fleet, fits_on_board, ship_cells
+from battleship.models.game import Game, GameMode, GameStatus
+from battleship.models.guess import GuessResult
+from battleship.models.ship import Ship
+
+LOGGER = logging.getLogger(__name__)
+
+
+def check_turn(
+    game: Game, offense_player_id: int, mode: GameMode = GameMode.classic
+) -> None:
+    """
+    Raises a GameRuleError if the game is over, if it is not the player's
+    turn or if the game is not played in the given mode.
+    """
+    if game.status == GameStatus.completed:
+        LOGGER.info("Attempted to play but game is over")
+        raise GameRuleError("game is over")
+
+    if game.mode != mode:
+        game_mode = GameMode(game.mode).value
+        LOGGER.info(f"Attempted to play a {mode.value} turn in a {game_mode} game")
+        raise GameRuleError(f"game is played in {game_mode} mode")
+
+    if game.current_player_id != offense_player_id:
+        LOGGER.info(
+            f"Player {offense_player_id=} attempted to play, but it's {game.current_player_id=} turn"
+        )
+        raise GameRuleError("not player's turn")
+
+
+def check_shots(
+    game: Game, shots: list[tuple[int, int]], previous_shots: Container
+) -> None:
+    """
+    Raises a GameRuleError if a shot is outside of the board or at a cell
+    the player has already fired at.
+    """
+    for shot in shots:
+        x, y = shot
+        if not (0 <= x < game.board_width and 0 <= y < game.board_height):
+            LOGGER.info(f"Attempted to fire at {shot=} outside of the board")
+            raise GameRuleError(f"{shot=} is outside of the board")
+        if shot in previous_shots:
+            LOGGER.info(f"Attempted to fire at {shot=} again")
+            raise GameRuleError(f"{shot=} was already fired at")
+
+
+def check_placement(
+    game: Game,
+    size: int,
+    orientation: str,
+    start_position_x: int,
+    start_position_y: int,
+) -> None:
+    """
+    Raises a GameRuleError if the ship does not fit on the game's board.
+    """
+    if not fits_on_board(
+        size,
+        orientation,
+        start_position_x,
+        start_position_y,
+        game.board_width,
+        game.board_height,
+    ):
+        msg = (
+            f"Attempted to place ship with {size=} {orientation=} at "
+            f"({start_position_x}, {start_position_y}) but it is outside of the "
+            f"{game.board_width}x{game.board_height} board"
+        )
+        LOGGER.info(msg)
+        raise GameRuleError(msg)
+
+
+def check_fleet(game: Game, placed_ships: list[Ship], ships: list[dict]) -> None:
+    """
+    Raises a GameRuleError if placing the ships next to the player's placed
+    ships would exceed the game's number of ships of a size, or if any of
+    them is longer than a hit mask holds, does not fit on the board or
+    overlaps with another ship.
+    """
+    for ship in ships:
+        if not 1 <= ship["size"] <= MAX_SHIP_SIZE:
+            msg = f"Attempted to place ship of size {ship['size']} but sizes go from 1 to {MAX_SHIP_SIZE}"
+            LOGGER.info(msg)
+            raise GameRuleError(msg)
+
+    fleet_composition = Counter(game.fleet)
+    ship_counts = Counter(placed_ship.size for placed_ship in placed_ships)
+    ship_counts.update(ship["size"] for ship in ships)
+    for size, count in ship_counts.items():
+        if count > fleet_composition[size]:
+            msg = f"Attempted to place {count} ships of {size=} but the game allows {fleet_composition[size]}"
+            LOGGER.info(msg)
+            raise GameRuleError(msg)
+
+    fleet = as_fleet(placed_ships)
+    new_cells: set[tuple[int, int]] = set()
+    for ship in ships:
+        check_placement(
+            game,
+            ship["size"],
+            ship["orientation"],
+            ship["start_position_x"],
+            ship["start_position_y"],
+        )
+        cells = ship_cells(
+            ship["size"],
+            ship["orientation"],
+            ship["start_position_x"],
+            ship["start_position_y"],
+        )
+        placed_ship = fleet.overlapping_ship(cells)
+        if placed_ship is not None:
+            msg = f"Attempted to place ship but this overlaps with {placed_ship=}"
+            LOGGER.info(msg)
+            raise GameRuleError(msg)
+        if not new_cells.isdisjoint(cells):
+            msg = f"Attempted to place {ship=} but this overlaps with another new ship"
+            LOGGER.info(msg)
+            raise GameRuleError(msg)
+        new_cells.update(cells)
+
+
+def ship_covers(ship: Ship, cell: tuple[int, int]) -> bool:
+    """
+    Determine if the ship covers the cell, without listing the ship's cells.
+    """
+    x, y = cell
+    if ship.orientation == "horizontal":
+        return (
+            y == ship.start_position_y
+            and ship.start_position_x <= x < ship.start_position_x + ship.size
+        )
+    return (
+        x == ship.start_position_x
+        and ship.start_position_y <= y < ship.start_position_y + ship.size
+    )
+
+
+def find_hit_ship(ships: list[Ship], guess: tuple[int, int]) -> Optional[Ship]:
+    """
+    Returns the ship covering the guessed cell, if any.
+    """
+    if isinstance(ships, Fleet):
+        return ships.ship_at(guess)
+    for ship in ships:
+        if ship_covers(ship, guess):
+            return ship
+    return None
+
+
+def is_fleet_sunk(ships: list[Ship], new_hits: Counter = None) -> bool:
+    """
+    Determine if every ship of the fleet has been sunk, optionally counting
+    hits which have not been applied to the ships yet.
+    """
+    if new_hits is None:
+        new_hits = Counter()
+    return all(ship.hits + new_hits[ship.id] >= ship.size for ship in ships)
+
+
+def count_ships_afloat(ships: list[Ship]) -> int:
+    return sum(1 for ship in ships if ship.hits < ship.size)
+
+
+def check_salvo(shots: list[tuple[int, int]], ships_afloat: int) -> None:
+    """
+    Raises a GameRuleError if the salvo repeats a cell or has more shots
+    than the offense player has ships afloat.
+    """
+    if len(set(shots)) != len(shots):
+        LOGGER.info(f"Attempted to fire a salvo with repeated cells {shots=}")
+        raise GameRuleError("salvo fires at the same cell twice")
+
+    if len(shots) > ships_afloat:
+        msg = f"Attempted to fire {len(shots)} shots with {ships_afloat} ships afloat"
+        LOGGER.info(msg)
+        raise GameRuleError(msg)
+
+
+def resolve_salvo(
+    ships: list[Ship], shots: list[tuple[int, int]]
+) -> tuple[list[Optional[Ship]], Counter]:
+    """
+    Returns the ship hit by each shot, if any, and the number of hits per ship.
+    """
+    hit_ships = [find_hit_ship(ships, shot) for shot in shots]
+    hit_counts = Counter(ship.id for ship in hit_ships if ship is not None)
+    return hit_ships, hit_counts
+
+
+def salvo_results(hit_ships: list[Optional[Ship]], victory: bool) -> list[GuessResult]:
+    """
+    Returns the result of each shot of a salvo. On a victory the last hit of the
+    salvo is the winning one.
+    """
+    results = [
+        GuessResult.miss if ship is None else GuessResult.hit for ship in hit_ships
+    ]
+    if victory:
+        last_hit = max(ind for ind, ship in enumerate(hit_ships) if ship is not None)
+        results[last_hit] = GuessResult.victory
+    return results
@@ -5,8 +5,20 @@ from typing import Optional, Mapping
 from marshmallow import Schema, fields
 from marshmallow.fields import Integer, String, Nested, ValidationError, List, Bool
 from enum import Enum
+from battleship.board_state import MAX_SHIP_SIZE
+from battleship.models.game import (
+    DEFAULT_BOARD_HEIGHT,
+    DEFAULT_BOARD_WIDTH,
+    GameMode,
+    GameStatus,
+)
 
 LOGGER = logging.getLogger(__name__)
+MAX_BOARD_SIZE = 1000
+DEFAULT_GAMES_PAGE_SIZE = 50
+MAX_GAMES_PAGE_SIZE = 500
+# Players or games created by one bulk request
+MAX_BULK_CREATE_SIZE = 10000
 
 
 class ShipOrientation(Enum):
@@ -14,11 +26,6 @@ class ShipOrientation(Enum):
     vertical = "vertical"
 
 
-class GameStatus(Enum):
-    in_progress = "in_progress"
-    complete = "complete"
-
-
 class GuessResult(Enum):
     hit = "hit"
     sink = "sunk"  # TODO
@@ -67,8 +74,44 @@ class CreateNewPlayerRequest(Schema):
 
 class CreateNewGameRequest(Schema):
     player_1_id = Integer(required=True)
-    player_2_id = Integer(required=True)
+    # Not needed against a bot, which takes the second seat
+    player_2_id = Integer(load_default=None)
     initial_player = Integer(required=True)
+    against_bot = Bool(load_default=False)
+    mode = String(
+        load_default=GameMode.classic.value,
+        validate=fields.validate.OneOf([e.value for e in GameMode]),
+    )
+    board_width = Integer(
+        load_default=DEFAULT_BOARD_WIDTH,
+        validate=fields.validate.Range(min=1, max=MAX_BOARD_SIZE),
+    )
+    board_height = Integer(
+        load_default=DEFAULT_BOARD_HEIGHT,
+        validate=fields.validate.Range(min=1, max=MAX_BOARD_SIZE),
+    )
+    fleet = List(
+        Integer(validate=fields.validate.Range(min=1, max=MAX_SHIP_SIZE)),
+        load_default=None,
+        validate=fields.validate.Length(min=1),
+    )
+
+
+class CreatePlayersRequest(Schema):
+    players = List(
+        Nested(CreateNewPlayerRequest),
+        required=True,
+        validate=fields.validate.Length(min=1, max=MAX_BULK_CREATE_SIZE),
+    )
+
+
+class CreateGamesRequest(Schema):
+    # Games between players only, bots are not created in bulk
+    games = List(
+        Nested(CreateNewGameRequest),
+        required=True,
+        validate=fields.validate.Length(min=1, max=MAX_BULK_CREATE_SIZE),
+    )
 
 
 class AddNewShipRequest(Schema):
@@ -77,6 +120,12 @@ class AddNewShipRequest(Schema):
     ship = Nested(Ship)
 
 
+class PlaceFleetRequest(Schema):
+    player_id = Integer(required=True)
+    game_id = Integer(required=True)
+    ships = List(Nested(Ship), required=True)
+
+
 class TakeTurnRequest(Schema):
     offense_player_id = Integer(required=True)
     defense_player_id = Integer(required=True)
@@ -85,6 +134,18 @@ class TakeTurnRequest(Schema):
     guess_position_y = Integer(required=True)
 
 
+class Shot(Schema):
+    position_x = Integer(required=True)
+    position_y = Integer(required=True)
+
+
+class TakeSalvoRequest(Schema):
+    offense_player_id = Integer(required=True)
+    defense_player_id = Integer(required=True)
+    game_id = Integer(required=True)
+    shots = List(Nested(Shot), required=True, validate=fields.validate.Length(min=1))
+
+
 class TakeTurnResponse(Schema):
     current_player_id = Integer(required=True)
     status = String(
@@ -96,6 +157,19 @@ class PlayerId(Schema):
     player_id = Integer(required=True)
 
 
+class PlayerGamesRequest(PlayerId):
+    # Id of the last game of the previous page, returned as next_cursor
+    cursor = Integer(load_default=None)
+    limit = Integer(
+        load_default=DEFAULT_GAMES_PAGE_SIZE,
+        validate=fields.validate.Range(min=1, max=MAX_GAMES_PAGE_SIZE),
+    )
+    status = String(
+        load_default=None,
+        validate=fields.validate.OneOf([e.value for e in GameStatus]),
+    )
+
+
 class GetPlayerBoard(Schema):
     game_id = Integer(required=True)
     player_id = Integer(required=True)
@@ -0,0 +1,45 @@
+"""
+Compact record of the cells a player has fired at.
+
+One bit per cell of the board, stored in a bytearray so marking a shot is
+done in place in constant time even on the largest boards.
+"""
+
+from typing import Iterable
+
+
+class ShotBitset:
+    __slots__ = ("board_width", "board_height", "bits")
+
+    def __init__(
+        self,
+        board_width: int,
+        board_height: int,
+        shots: Iterable[tuple[int, int]] = (),
+    ):
+        self.board_width = board_width
+        self.board_height = board_height
+        self.bits = bytearray((board_width * board_height + 7) // 8)
+        for shot in shots:
+            self.add(shot)
+
+    def _index(self, cell: tuple[int, int]) -> int:
+        x, y = cell
+        if not (0 <= x < self.board_width and 0 <= y < self.board_height):
+            return -1
+        return y * self.board_width + x
+
+    def __contains__(self, cell: tuple[int, int]) -> bool:
+        index = self._index(cell)
+        return index >= 0 and self.bits[index >> 3] & (1 << (index & 7)) != 0
+
+    def add(self, cell: tuple[int, int]) -> None:
+        """
+        Marks the cell as fired at. Cells outside of the board are ignored.
+        """
+        index = self._index(cell)
+        if index >= 0:
+            self.bits[index >> 3] |= 1 << (index & 7)
+
+    def __len__(self) -> int:
+        return sum(bin(byte).count("1") for byte in self.bits)
@@ -0,0 +1,73 @@
+"""
+Simulate games offline and report throughput and outcome statistics.
+
+    python -m battleship.sim --games 100000 --strategies hunt random
+"""
+
+import argparse
+import time
+import numpy as np
+from battleship.models.game import (
+    DEFAULT_BOARD_HEIGHT,
+    DEFAULT_BOARD_WIDTH,
+    DEFAULT_FLEET,
+)
+from battleship.sim.engine import STRATEGIES, simulate_games
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument(
+        "--strategies",
+        nargs=2,
+        choices=sorted(STRATEGIES),
+        default=["hunt", "hunt"],
+        help="strategies of the starting player and of the other player",
+    )
+    parser.add_argument("--board-width", type=int, default=DEFAULT_BOARD_WIDTH)
+    parser.add_argument("--board-height", type=int, default=DEFAULT_BOARD_HEIGHT)
+    parser.add_argument("--fleet", type=int, nargs="+", default=DEFAULT_FLEET)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    winners = []
+    num_shots = []
+    start = time.perf_counter()
+    for batch_start in range(0, args.games, args.batch_size):
+        batch_size = min(args.batch_size, args.games - batch_start)
+        result = simulate_games(
+            batch_size,
+            args.fleet,
+            args.board_width,
+            args.board_height,
+            tuple(args.strategies),
+            rng,
+        )
+        winners.append(result["winners"])
+        num_shots.append(result["num_shots"])
+    elapsed = time.perf_counter() - start
+
+    winners = np.concatenate(winners)
+    num_shots = np.concatenate(num_shots)
+    print(f"games:            {args.games}")
+    print(f"elapsed:          {elapsed:.2f}s")
+    print(f"games per second: {args.games / elapsed:,.0f}")
+    for player, strategy in enumerate(args.strategies):
+        win_rate = (winners == player).mean()
+        print(f"player {player + 1} ({strategy}) win rate: {win_rate:.3f}")
+    print(
+        f"shots per game:   mean={num_shots.mean():.1f} "
+        f"median={np.median(num_shots):.0f} p95={np.percentile(num_shots, 95):.0f} "
+        f"min={num_shots.min()} max={num_shots.max()}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Random fleet placement for many boards at once.
+
+A batch of boards is an int16 array of shape (num_boards, board_height,
+board_width) holding, for every cell, the index of the ship covering it in
+the fleet, or EMPTY. Ships are placed with the same rules as
+battleship.utils.add_player_ship: every ship lies on the board and no two
+ships share a cell.
+"""
+
+import numpy as np
+
+EMPTY = -1
+# Times the boards still missing a ship are sampled again before giving up
+MAX_PLACEMENT_ROUNDS = 1000
+
+
+def place_fleets(
+    num_boards: int,
+    fleet: list[int],
+    board_width: int,
+    board_height: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """
+    Returns num_boards boards with the fleet placed uniformly at random.
+    Ships are placed one size at a time across every board; boards where the
+    sampled placement overlaps an earlier ship are sampled again. Raises a
+    ValueError if the fleet does not seem to fit on the board.
+    """
+    if max(fleet) > max(board_width, board_height):
+        raise ValueError(
+            f"{fleet=} does not fit on a {board_width}x{board_height} board"
+        )
+
+    boards = np.full((num_boards, board_height, board_width), EMPTY, dtype=np.int16)
+    for ship_index, size in enumerate(fleet):
+        offsets = np.arange(size)
+        pending = np.arange(num_boards)
+        for _ in range(MAX_PLACEMENT_ROUNDS):
+            if not pending.size:
+                break
+            vertical = rng.random(pending.size) < 0.5
+            # A ship too long for one orientation must use the other
+            if size > board_width:
+                vertical[:] = True
+            elif size > board_height:
+                vertical[:] = False
+            max_x = np.where(vertical, board_width, board_width - size + 1)
+            max_y = np.where(vertical, board_height - size + 1, board_height)
+            x = (rng.random(pending.size) * max_x).astype(np.intp)
+            y = (rng.random(pending.size) * max_y).astype(np.intp)
+
+            xs = x[:, None] + np.where(vertical[:, None], 0, offsets)
+            ys = y[:, None] + np.where(vertical[:, None], offsets, 0)
+            free = (boards[pending[:, None], ys, xs] == EMPTY).all(axis=1)
+
+            placed = pending[free]
+            boards[placed[:, None], ys[free], xs[free]] = ship_index
+            pending = pending[~free]
+        if pending.size:
+            raise ValueError(
+                f"Could not place {fleet=} on a {board_width}x{board_height} board"
+            )
+    return boards
@@ -0,0 +1,125 @@
+"""
+Batched self-play of classic battleship games.
+
+Every game of a batch is played in lockstep: on each step the current player
+of every game fires one shot, chosen by a strategy operating on
+the whole batch, and the shots are evaluated with array indexing. As in
+battleship.utils.run_game_turn the turn passes to the other player after
+every shot, hit or miss.
+
+Strategies receive, for every game of the batch, the cells already
+fired at and the hits on ships which are still afloat, as boolean arrays of
+shape (num_games, board_height, board_width), and return the flat index of
+the next cell to fire at in each game.
+"""
+
+import numpy as np
+from battleship.sim.boards import EMPTY, place_fleets
+
+
+def random_strategy(
+    shots: np.ndarray, open_hits: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Fires at a uniformly random cell which has not been fired at.
+    """
+    scores = rng.random(shots.shape, dtype=np.float32)
+    scores[shots] = -1
+    return scores.reshape(len(shots), -1).argmax(axis=1)
+
+
+def hunt_strategy(
+    shots: np.ndarray, open_hits: np.ndarray, rng: np.random.Generator
+) -> np.ndarray:
+    """
+    Fires next to a hit on a ship which is still afloat if there is one,
+    otherwise at a random cell of a checkerboard pattern, which every ship at
+    least two cells long crosses. Ships of a single cell are only found once
+    the pattern has been fired at.
+    """
+    _, board_height, board_width = shots.shape
+    scores = rng.random(shots.shape, dtype=np.float32)
+    scores[
+        :, (np.add.outer(np.arange(board_height), np.arange(board_width)) % 2) == 0
+    ] += 1
+    scores[:, 1:, :] += 2 * open_hits[:, :-1, :]
+    scores[:, :-1, :] += 2 * open_hits[:, 1:, :]
+    scores[:, :, 1:] += 2 * open_hits[:, :, :-1]
+    scores[:, :, :-1] += 2 * open_hits[:, :, 1:]
+    scores[shots] = -1
+    return scores.reshape(len(shots), -1).argmax(axis=1)
+
+
+STRATEGIES = {
+    "random": random_strategy,
+    "hunt": hunt_strategy,
+}
+
+
+def simulate_games(
+    num_games: int,
+    fleet: list[int],
+    board_width: int,
+    board_height: int,
+    strategies: tuple[str, str],
+    rng: np.random.Generator,
+) -> dict:
+    """
+    Plays num_games games between two strategies, the first one starting.
+    Returns the index of the winning player and the number of shots fired in
+    each game.
+    """
+    num_cells = board_width * board_height
+    # ships[p] are player p's boards, flattened to one row of cells per game
+    ships = [
+        place_fleets(num_games, fleet, board_width, board_height, rng).reshape(
+            num_games, num_cells
+        )
+        for _ in range(2)
+    ]
+    # shots[p] and open_hits[p] are on the other player's board
+    shots = np.zeros((2, num_games, num_cells), dtype=bool)
+    open_hits = np.zeros((2, num_games, num_cells), dtype=bool)
+    # Cells left to hit on each of player p's ships and on their whole fleet
+    ship_cells_left = np.tile(np.array(fleet, dtype=np.int32), (2, num_games, 1))
+    fleet_cells_left = np.full((2, num_games), sum(fleet), dtype=np.int32)
+    winners = np.full(num_games, -1, dtype=np.int8)
+    num_shots = np.zeros(num_games, dtype=np.int32)
+
+    # Finished games keep being played, which is cheaper than compacting the
+    # arrays every step, but their results are no longer recorded.
+    games = np.arange(num_games)
+    board_shape = (num_games, board_height, board_width)
+    playing = np.ones(num_games, dtype=bool)
+    player = 0
+    while playing.any():
+        opponent = 1 - player
+        strategy = STRATEGIES[strategies[player]]
+        cells = strategy(
+            shots[player].reshape(board_shape),
+            open_hits[player].reshape(board_shape),
+            rng,
+        )
+        shots[player, games, cells] = True
+        num_shots += playing
+
+        hit_ships = ships[opponent][games, cells]
+        hit_games = np.flatnonzero(hit_ships != EMPTY)
+        hit_ships = hit_ships[hit_games]
+        open_hits[player, hit_games, cells[hit_games]] = True
+        ship_cells_left[opponent, hit_games, hit_ships] -= 1
+        fleet_cells_left[opponent, hit_games] -= 1
+
+        # Hits on a ship which just sank no longer need to be followed up
+        sunk = ship_cells_left[opponent, hit_games, hit_ships] == 0
+        sunk_games = hit_games[sunk]
+        open_hits[player, sunk_games] &= (
+            ships[opponent][sunk_games] != hit_ships[sunk][:, None]
+        )
+
+        lost = playing & (fleet_cells_left[opponent] == 0)
+        winners[lost] = player
+        playing &= ~lost
+        player = opponent
+
+    return {"winners": winners, "num_shots": num_shots}
@@ -0,0 +1,276 @@
+"""
+Bot-vs-bot tournament played with the same turn logic as the server.
+
+Every match is a game played through battleship.utils against an in-memory
+database, so no server or database is needed. Matches are spread across a
+process pool and each result is appended to a JSON lines file as soon as it
+is known, along with the match it was played for. Running the same
+tournament again with the same output file resumes it: matches already in
+the file are not played again, and a file holding any match planned
+differently is refused.
+
+    python -m battleship.tournament --strategies heatmap random --games 1000
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from battleship.bot import STRATEGIES, BotPlayer, random_fleet
+from battleship.models.game import (
+    DEFAULT_BOARD_HEIGHT,
+    DEFAULT_BOARD_WIDTH,
+    DEFAULT_FLEET,
+    Game,
+    GameMode,
+    GameStatus,
+)
+from battleship.models.memory_database import InMemoryDatabase
+from battleship.models.player import Player
+from battleship.utils import add_player_fleet
+
+LOGGER = logging.getLogger(__name__)
+
+
+def plan_matches(
+    strategies: list[str],
+    games_per_pairing: int,
+    mode: str,
+    board_width: int,
+    board_height: int,
+    fleet: list[int],
+    seed: int,
+) -> list[dict]:
+    """
+    Returns every match of the tournament. Each pair of strategies plays
+    games_per_pairing games with each strategy starting, and every match has
+    its own seed, so the plan and the outcome of every match only depend on
+    the arguments.
+    """
+    if len(strategies) == 1:
+        pairings = [(strategies[0], strategies[0])]
+    else:
+        pairings = list(itertools.permutations(strategies, 2))
+    return [
+        {
+            "match_id": match_id,
+            "strategies": list(pairing),
+            "seed": f"{seed}-{match_id}",
+            "mode": mode,
+            "board_width": board_width,
+            "board_height": board_height,
+            "fleet": list(fleet),
+        }
+        for match_id, (_, pairing) in enumerate(
+            itertools.product(range(games_per_pairing), pairings)
+        )
+    ]
+
+
+async def play_match(match: dict) -> dict:
+    """
+    Plays one game between two bots and returns the match with its outcome.
+    """
+    rng = random.Random(match["seed"])
+    db = InMemoryDatabase()
+    player_ids = []
+    for strategy in match["strategies"]:
+        player = Player(first_name=strategy, last_name="", email="", is_bot=True)
+        player_ids.append((await db.add_player(player)).id)
+
+    game = Game(
+        player_1_id=player_ids[0],
+        player_2_id=player_ids[1],
+        current_player_id=player_ids[0],
+        status=GameStatus.in_progress,
+        mode=GameMode(match["mode"]),
+        board_width=match["board_width"],
+        board_height=match["board_height"],
+        fleet=match["fleet"],
+    )
+    game = await db.add_game(game)
+    bots = {}
+    for player_id, strategy in zip(player_ids, match["strategies"]):
+        ships = random_fleet(game.board_width, game.board_height, game.fleet, rng)
+        await add_player_fleet(game.id, player_id, ships, db)
+        bots[player_id] = BotPlayer(game, player_id, strategy=strategy, rng=rng)
+
+    # Every turn fires at least one shot, so both boards are cleared by then
+    max_turns = 2 * game.board_width * game.board_height
+    turns = 0
+    while game.status != GameStatus.completed and turns < max_turns:
+        await bots[game.current_player_id].play_turn(db)
+        turns += 1
+
+    winner = None
+    if game.status == GameStatus.completed:
+        # The winner keeps the turn when the game ends
+        winner = player_ids.index(game.current_player_id)
+    return {
+        **match,
+        "winner": winner,
+        "turns": turns,
+        "shots": [
+            len(await db.get_player_shots(game.id, player_id))
+            for player_id in player_ids
+        ],
+    }
+
+
+def play_matches(matches: list[dict]) -> list[dict]:
+    """
+    Plays a chunk of matches in a worker process.
+    """
+
+    async def play_all():
+        return [await play_match(match) for match in matches]
+
+    return asyncio.run(play_all())
+
+
+def load_results(path: str) -> dict[int, dict]:
+    """
+    Reads the results of a previous run, by match id. A last line cut short
+    by an interrupted run is removed so new results can be appended.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb+") as results_file:
+        content = results_file.read()
+        complete = content.rfind(b"\n") + 1
+        if complete < len(content):
+            LOGGER.warning(f"Dropping incomplete last line of {path}")
+            results_file.truncate(complete)
+    results = {}
+    for line in content[:complete].splitlines():
+        result = json.loads(line)
+        results[result["match_id"]] = result
+    return results
+
+
+def run_tournament(
+    matches: list[dict], path: str, workers: int = None, chunk_size: int = 20
+) -> dict[int, dict]:
+    """
+    Plays every match missing from the results file at path, appending each
+    result as its chunk finishes, and returns the results of all matches.
+    Raises a ValueError if the file holds a match which is not planned
+    exactly the same, seed, board and fleet included.
+    """
+    results = load_results(path)
+    planned = {match["match_id"]: match for match in matches}
+    for match_id, result in results.items():
+        match = planned.get(match_id)
+        if match is None or any(
+            result.get(key) != value for key, value in match.items()
+        ):
+            raise ValueError(f"{path} holds the results of another tournament")
+    pending = [match for match in matches if match["match_id"] not in results]
+    LOGGER.info(f"{len(results)} matches already played, {len(pending)} to play")
+
+    chunks = [
+        pending[start : start + chunk_size]
+        for start in range(0, len(pending), chunk_size)
+    ]
+    with open(path, "a") as results_file, ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(play_matches, chunk) for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                for result in future.result():
+                    results_file.write(json.dumps(result) + "\n")
+                    results[result["match_id"]] = result
+                results_file.flush()
+        except BaseException:
+            # Keep what was written and stop handing out matches
+            executor.shutdown(cancel_futures=True)
+            raise
+    return results
+
+
+def summarize(results: list[dict]) -> dict[str, dict]:
+    """
+    Returns the number of games played and won and the mean number of shots
+    fired by each strategy.
+    """
+    games = Counter()
+    wins = Counter()
+    shots = defaultdict(int)
+    for result in results:
+        for player, strategy in enumerate(result["strategies"]):
+            games[strategy] += 1
+            shots[strategy] += result["shots"][player]
+            if result["winner"] == player:
+                wins[strategy] += 1
+    return {
+        strategy: {
+            "games": games[strategy],
+            "wins": wins[strategy],
+            "win_rate": wins[strategy] / games[strategy],
+            "mean_shots": shots[strategy] / games[strategy],
+        }
+        for strategy in sorted(games)
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--strategies",
+        nargs="+",
+        choices=sorted(STRATEGIES),
+        default=["heatmap", "random"],
+    )
+    parser.add_argument(
+        "--games", type=int, default=100, help="games per ordered pairing"
+    )
+    parser.add_argument(
+        "--mode", choices=[e.value for e in GameMode], default=GameMode.classic.value
+    )
+    parser.add_argument("--board-width", type=int, default=DEFAULT_BOARD_WIDTH)
+    parser.add_argument("--board-height", type=int, default=DEFAULT_BOARD_HEIGHT)
+    parser.add_argument("--fleet", type=int, nargs="+", default=DEFAULT_FLEET)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="tournament.jsonl")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="defaults to one per core"
+    )
+    parser.add_argument("--chunk-size", type=int, default=20)
+    return parser.parse_args()
+
+
+def main():
+    # The turn logic logs every shot, which would swamp the progress messages
+    logging.basicConfig(level=logging.WARNING)
+    LOGGER.setLevel(logging.INFO)
+    args = parse_args()
+    matches = plan_matches(
+        args.strategies,
+        args.games,
+        args.mode,
+        args.board_width,
+        args.board_height,
+        args.fleet,
+        args.seed,
+    )
+
+    start = time.perf_counter()
+    results = run_tournament(matches, args.output, args.workers, args.chunk_size)
+    elapsed = time.perf_counter() - start
+
+    print(f"matches:          {len(results)}")
+    print(f"elapsed:          {elapsed:.2f}s")
+    for strategy, stats in summarize(list(results.values())).items():
+        print(
+            f"{strategy}: games={stats['games']} wins={stats['wins']} "
+            f"win_rate={stats['win_rate']:.3f} mean_shots={stats['mean_shots']:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,46 +1,47 @@
+import json
 import logging
 from aiohttp import web
-from typing import Optional
-from battleship.schema import GameStatus
+from typing import Iterable, Optional
+from battleship.errors import GameRuleError, NotFoundError
+from battleship.fleet import Fleet, as_fleet, ship_cells
+from battleship.rules import (
+    check_fleet,
+    check_placement,
+    check_salvo,
+    check_shots,
+    check_turn,
+    count_ships_afloat,
+    find_hit_ship,
+    is_fleet_sunk,
+    resolve_salvo,
+    salvo_results,
+)
+from battleship.models.database import can_play_whole_turns
+from battleship.models.game import (
+    DEFAULT_BOARD_HEIGHT,
+    DEFAULT_BOARD_WIDTH,
+    GameMode,
+    GameStatus,
+)
 from battleship.models.ship import Ship
 from battleship.models.guess import Guess, GuessResult
 
 LOGGER = logging.getLogger(__name__)
 
+# Rows inserted, and ids streamed back, per INSERT of a bulk request
+BULK_INSERT_BATCH_SIZE = 1000
+
 
 async def add_player_ship(game_id: int, player_id: int, ship: dict, db) -> bool:
     """
-    Add a ship to the player's board.
+    Add a ship to the player's board, checked against the rest of the
+    player's fleet like the ships of add_player_fleet.
     """
-    # Check if desired ship position is within board
-    ship_coordinates = calculate_ship_coordinates(
-        ship["size"],
-        ship["orientation"],
-        ship["start_position_x"],
-        ship["start_position_y"],
+    game = await db.get_game(game_id, dto=True)
+    placed_ships = await db.get_player_ships(
+        game_id=game_id, player_id=player_id, dto=True
     )
-    for coordinate in ship_coordinates:
-        if not is_within_board(coordinate):
-            msg = f"Attempted to place {ship=} with invalid {ship_coordinates=} as {coordinate=} is outside of board"
-            LOGGER.info(msg)
-            raise web.HTTPBadRequest(text=msg)
-
-    # Check if the placement overlaps with other ships
-    ships = await db.get_player_ships(game_id=game_id, player_id=player_id)
-    for placed_ship in ships:
-        other_ship_coordinates = calculate_ship_coordinates(
-            placed_ship.size,
-            placed_ship.orientation,
-            placed_ship.start_position_x,
-            placed_ship.start_position_y,
-        )
-        for coord in other_ship_coordinates:
-            if coord in ship_coordinates:
-                msg = (
-                    f"Attempted to place {ship=} but this overlaps with {placed_ship=}"
-                )
-                LOGGER.info(msg)
-                raise web.HTTPBadRequest(text=msg)
+    check_fleet(game, placed_ships, [ship])
 
     ship = Ship(
         game_id=game_id,
@@ -51,8 +52,39 @@ async def add_player_ship(game_id: int, player_id: int, ship: dict, db) -> bool:
         start_position_y=ship["start_position_y"],
         hits=0,
     )
-    await db.add_ship(ship)
-    return ship
+    return await db.add_ship(ship)
+
+
+async def add_player_fleet(
+    game_id: int, player_id: int, ships: list[dict], db
+) -> list[Ship]:
+    """
+    Add several ships to the player's board at once. The whole fleet is
+    validated before anything is written, so either every ship is placed or
+    none is. BattleshipDatabase and the event store check the fleet again as
+    they write it, against any ships placed meanwhile.
+    """
+    game = await db.get_game(game_id, dto=True)
+    placed_ships = await db.get_player_ships(
+        game_id=game_id, player_id=player_id, dto=True
+    )
+    check_fleet(game, placed_ships, ships)
+
+    new_ships = await db.add_ships(
+        [
+            {
+                "game_id": game_id,
+                "player_id": player_id,
+                "size": ship["size"],
+                "orientation": ship["orientation"],
+                "start_position_x": ship["start_position_x"],
+                "start_position_y": ship["start_position_y"],
+                "hits": 0,
+            }
+            for ship in ships
+        ]
+    )
+    return new_ships
 
 
 async def move_ship(
@@ -69,35 +101,23 @@ async def move_ship(
     # Check if ship exists. TODO Make sure it belongs to the player
     ship = await db.get_ship(ship_id=ship_id)
     # Check if ship can be moved to new location
-    # TODO put this in util func, reduce duplicate code
-    ship_coordinates = calculate_ship_coordinates(
+    game = await db.get_game(game_id, dto=True)
+    check_placement(
+        game,
         ship.size,
         ship.orientation,
         start_position_x,
         start_position_y,
     )
-    for coordinate in ship_coordinates:
-        if not is_within_board(coordinate):
-            msg = f"Attempted to place {ship=} with invalid {ship_coordinates=} as {coordinate=} is outside of board"
-            LOGGER.info(msg)
-            raise web.HTTPBadRequest(text=msg)
 
-    # Check if the placement overlaps with other ships
-    ships = await db.get_player_ships(game_id=game_id, player_id=player_id)
-    for placed_ship in ships:
-        other_ship_coordinates = calculate_ship_coordinates(
-            placed_ship.size,
-            placed_ship.orientation,
-            placed_ship.start_position_x,
-            placed_ship.start_position_y,
-        )
-        for coord in other_ship_coordinates:
-            if coord in ship_coordinates:
-                msg = (
-                    f"Attempted to place {ship=} but this overlaps with {placed_ship=}"
-                )
-                LOGGER.info(msg)
-                raise web.HTTPBadRequest(text=msg)
+    # Check if the placement overlaps with other ships. The ship being moved
+    # may overlap its own current position.
+    ships = await db.get_player_ships(game_id=game_id, player_id=player_id, dto=True)
+    check_ship_overlap(
+        ship_cells(ship.size, ship.orientation, start_position_x, start_position_y),
+        as_fleet(ships),
+        ignore_ship_id=ship_id,
+    )
 
     # Proceed with update
     updated_ship = await db.update_ship(
@@ -117,22 +137,30 @@ async def evaluate_player_guess(
     Evaluate if the player's guess hit the ship.
     """
     ships = await db.get_player_ships(game_id=game_id, player_id=defense_player_id)
-    for ship in ships:
-        for coord in calculate_ship_coordinates(
-            ship.size,
-            ship.orientation,
-            ship.start_position_x,
-            ship.start_position_y,
-        ):
-            if coord == guess:
-                LOGGER.info(
-                    f"In {game_id=} {defense_player_id=} {ship.id=} was hit by {coord=}"
-                )
-                return ship.id
-    LOGGER.info(f"In {game_id=} {defense_player_id=} ship was not hit by {coord=}")
+    ship = find_hit_ship(ships, guess)
+    if ship is not None:
+        LOGGER.info(
+            f"In {game_id=} {defense_player_id=} {ship.id=} was hit by {guess=}"
+        )
+        return ship.id
+    LOGGER.info(f"In {game_id=} {defense_player_id=} ship was not hit by {guess=}")
     return None
 
 
+def check_ship_overlap(
+    cells: Iterable[tuple[int, int]], fleet: Fleet, ignore_ship_id: int = None
+) -> None:
+    """
+    Raises a GameRuleError if any of the cells is covered by a ship of the
+    fleet.
+    """
+    placed_ship = fleet.overlapping_ship(cells, ignore_ship_id=ignore_ship_id)
+    if placed_ship is not None:
+        msg = f"Attempted to place ship but this overlaps with {placed_ship=}"
+        LOGGER.info(msg)
+        raise GameRuleError(msg)
+
+
 async def run_game_turn(
     game_id: int,
     guess_position_x: int,
@@ -144,20 +172,26 @@ async def run_game_turn(
     """
     Run a single turn of the game.
     """
+    if can_play_whole_turns(db):
+        # Play the whole turn in a single transaction
+        return await db.play_turn(
+            game_id,
+            guess_position_x,
+            guess_position_y,
+            offense_player_id,
+            defense_player_id,
+        )
+
     # Check if game is completed or if it's the player's turn
     game = await db.get_game(game_id)
-    if game.status == GameStatus.complete.value:
-        LOGGER.info("Attempted to play but game is over")
-        raise web.HTTPBadRequest(text="game is over")
+    check_turn(game, offense_player_id)
 
-    if game.current_player_id != offense_player_id:
-        LOGGER.info(
-            f"Player {offense_player_id=} attempted to play, but it's {game.current_player_id=} turn"
-        )
-        raise web.HTTPBadRequest(text="not player's turn")
+    # Check the guess is on the board and was not fired before
+    guess_coords = (guess_position_x, guess_position_y)
+    previous_shots = await db.get_player_shots(game_id, offense_player_id)
+    check_shots(game, [guess_coords], previous_shots)
 
     # Evaluate guess
-    guess_coords = (guess_position_x, guess_position_y)
     ship_id: Optional[int] = await evaluate_player_guess(
         game_id, defense_player_id, guess_coords, db
     )
@@ -187,6 +221,8 @@ async def run_game_turn(
         await db.update_game(
             game_id=game_id, updates={"current_player_id": defense_player_id}
         )
+    else:
+        await db.update_game(game_id=game_id, updates={"status": GameStatus.completed})
 
     guess = Guess(
         game_id=game_id,
@@ -200,56 +236,88 @@ async def run_game_turn(
     return result
 
 
-async def build_player_game_details(game_id: int, player_id: int, db) -> dict:
+async def run_salvo_turn(
+    game_id: int,
+    shots: list[tuple[int, int]],
+    offense_player_id: int,
+    defense_player_id: int,
+    db,
+) -> list[GuessResult]:
     """
-    Returns a dictionary detailing a player's ships (coordinates, hits) and their
-    guesses so far.
+    Run a single turn of a salvo game, firing several shots at once.
     """
-    game_details: dict = await db.get_game_details(game_id, player_id)
-    game = {
-        "player_1_id": game_details["game"].player_1_id,
-        "player_2_id": game_details["game"].player_2_id,
-        "current_player_id": game_details["game"].current_player_id,
-        "status": game_details["game"].status,
-    }
-    player_ships = []
-    for ship in game_details["player_ships"]:
-        player_ships.append(
-            {
-                "id": ship.id,
-                "size": ship.size,
-                "orientation": ship.orientation,
-                "start_position_x": ship.start_position_x,
-                "start_position_y": ship.start_position_y,
-            }
-        )
+    if can_play_whole_turns(db):
+        # Play the whole salvo in a single transaction
+        return await db.play_salvo(game_id, shots, offense_player_id, defense_player_id)
 
-    player_guesses = []
-    for guess in game_details["player_guesses"]:
-        player_guesses.append(
-            {
-                "position_x": guess.position_x,
-                "position_y": guess.position_y,
-                "result": guess.result,
-            }
+    # Check if game is completed or if it's the player's turn
+    game = await db.get_game(game_id)
+    check_turn(game, offense_player_id, GameMode.salvo)
+    offense_ships = await db.get_player_ships(
+        game_id=game_id, player_id=offense_player_id
+    )
+    check_salvo(shots, count_ships_afloat(offense_ships))
+    previous_shots = await db.get_player_shots(game_id, offense_player_id)
+    check_shots(game, shots, previous_shots)
+
+    # Evaluate every shot against the defense's board
+    defense_ships = await db.get_player_ships(
+        game_id=game_id, player_id=defense_player_id
+    )
+    hit_ships, hit_counts = resolve_salvo(defense_ships, shots)
+    victory = bool(hit_counts) and is_fleet_sunk(defense_ships, hit_counts)
+    results = salvo_results(hit_ships, victory)
+    LOGGER.info(
+        f"{offense_player_id=} fired {shots=} at {defense_player_id=} with {results=}"
+    )
+
+    if hit_counts:
+        await db.increment_ships_hits(dict(hit_counts))
+    if victory:
+        await db.update_game(game_id=game_id, updates={"status": GameStatus.completed})
+    else:
+        await db.update_game(
+            game_id=game_id, updates={"current_player_id": defense_player_id}
         )
 
-    enemy_guesses = []
-    for guess in game_details["enemy_guesses"]:
-        enemy_guesses.append(
+    await db.add_guesses(
+        [
             {
-                "position_x": guess.position_x,
-                "position_y": guess.position_y,
-                "result": guess.result,
+                "game_id": game_id,
+                "offense_player_id": offense_player_id,
+                "ship_id": None if ship is None else ship.id,
+                "position_x": shot[0],
+                "position_y": shot[1],
+                "result": result,
             }
-        )
+            for shot, ship, result in zip(shots, hit_ships, results)
+        ]
+    )
+    return results
 
-    return {
-        "game": game,
-        "player_ships": player_ships,
-        "player_guesses": player_guesses,
-        "enemy_guesses": enemy_guesses,
-    }
+
+def salvo_result(results: list[GuessResult]) -> GuessResult:
+    """
+    Aggregates the results of a salvo's shots into a single result.
+    """
+    if GuessResult.victory in results:
+        return GuessResult.victory
+    if GuessResult.hit in results:
+        return GuessResult.hit
+    return GuessResult.miss
+
+
+async def build_player_game_details(game_id: int, player_id: int, db) -> dict:
+    """
+    Returns a dictionary detailing a player's ships (coordinates, hits) and their
+    guesses so far. Raises a NotFoundError if the game does not exist.
+    """
+    game_details: dict = await db.get_player_game_details(game_id, player_id)
+    if game_details is None:
+        msg = f"Attempted to fetch details of {game_id=} but it does not exist"
+        LOGGER.info(msg)
+        raise NotFoundError(msg)
+    return game_details
 
 
 async def check_if_player_lost(game_id: int, player_id: int, db) -> bool:
@@ -257,10 +325,7 @@ async def check_if_player_lost(game_id: int, player_id: int, db) -> bool:
     Check if the player has lost.
     """
     ships = await db.get_player_ships(game_id=game_id, player_id=player_id)
-    for ship in ships:
-        if ship.size != ship.hits:
-            return False
-    return True
+    return is_fleet_sunk(ships)
 
 
 def calculate_ship_coordinates(
@@ -269,22 +334,35 @@ def calculate_ship_coordinates(
     """
     Calculate the coordinates of the ship.
     """
-    if orientation == "horizontal":
-        return [(start_position_x + i, start_position_y) for i in range(size)]
-    return [(start_position_x, start_position_y + i) for i in range(size)]
+    return list(ship_cells(size, orientation, start_position_x, start_position_y))
 
 
-def is_within_board(point: tuple[int, int]) -> bool:
+def is_within_board(
+    point: tuple[int, int],
+    board_width: int = DEFAULT_BOARD_WIDTH,
+    board_height: int = DEFAULT_BOARD_HEIGHT,
+) -> bool:
     """
     Determine if the coordinates are within the board.
     """
     x = point[0]
     y = point[1]
-    return 0 <= x <= 9 and 0 <= y <= 9
+    return 0 <= x < board_width and 0 <= y < board_height
 
 
-async def get_player_games(player_id, db):
-    games = await db.get_player_games(player_id=player_id)
+async def get_player_games(
+    player_id, db, status: str = None, cursor: int = None, limit: int = None
+):
+    """
+    Lists a page of the player's games, newest first.
+    """
+    games = await db.get_player_games(
+        player_id=player_id,
+        dto=True,
+        status=None if status is None else GameStatus(status),
+        cursor=cursor,
+        limit=limit,
+    )
     games_list: list[dict] = []
     for game in games:
         games_list.append(
@@ -296,3 +374,31 @@ async def get_player_games(player_id, db):
             }
         )
     return games_list
+
+
+async def stream_inserted_ids(
+    request: web.Request, rows: list[dict], insert_many, key: str
+) -> web.StreamResponse:
+    """
+    Inserts the rows with insert_many, BULK_INSERT_BATCH_SIZE at a time, and
+    streams back the id of each row as a line of JSON, {key: id}, as soon as
+    its batch is written. If a batch fails after the first, the rows before it
+    stay written and the stream ends with an error line.
+    """
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    for start in range(0, len(rows), BULK_INSERT_BATCH_SIZE):
+        try:
+            ids = await insert_many(rows[start : start + BULK_INSERT_BATCH_SIZE])
+        except Exception:
+            if not response.prepared:
+                raise
+            LOGGER.exception(f"Failed to insert rows from {start=}")
+            error = {"error": f"failed to insert rows from {start=}"}
+            await response.write(f"{json.dumps(error)}\n".encode())
+            break
+        if not response.prepared:
+            await response.prepare(request)
+        lines = "".join(f"{json.dumps({key: row_id})}\n" for row_id in ids)
+        await response.write(lines.encode())
+    await response.write_eof()
+    return response
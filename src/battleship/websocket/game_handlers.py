@@ -1,10 +1,14 @@
 import json
 import logging
 from aiohttp import web
+from battleship.api.errors import http_errors
 from battleship.models.guess import GuessResult
 from battleship.utils import (
     run_game_turn,
+    run_salvo_turn,
+    salvo_result,
     add_player_ship,
+    add_player_fleet,
     build_player_game_details,
     move_ship,
 )
@@ -68,6 +72,107 @@ async def handle_take_turn(request, payload, ws) -> None:
         except ConnectionResetError:
             request.app["websockets"][player_id].remove(active_ws)
 
+    if result == GuessResult.victory:
+        request.app["bots"].finish(game_id)
+    else:
+        await play_bot_turn(request, game_id, player_id, salvo=False)
+
+
+async def handle_take_salvo(request, payload, ws) -> None:
+    game_id = payload["game_id"]
+    player_id = payload["player_id"]
+    offense_player_id = payload["player_id"]
+    defense_player_id = payload["defense_player_id"]
+    shots = [(shot["position_x"], shot["position_y"]) for shot in payload["shots"]]
+
+    db_session = request.app["battleship_db"]
+    results: list[GuessResult] = await run_salvo_turn(
+        game_id,
+        shots,
+        offense_player_id,
+        defense_player_id,
+        db_session,
+    )
+    shot_results = [
+        {"result": result, "position_x": shot[0], "position_y": shot[1]}
+        for shot, result in zip(shots, results)
+    ]
+    resp = {
+        "type": "salvo_result",
+        "result": salvo_result(results),
+        "shots": shot_results,
+    }
+    # Notify offense the result of their salvo
+    websockets = list(request.app["websockets"][player_id])
+    for active_ws in websockets:
+        LOGGER.info(f"Notifying {offense_player_id=}")
+        try:
+            await active_ws.send_json(resp)
+        except ConnectionResetError:
+            request.app["websockets"][player_id].remove(active_ws)
+
+    # Notify defense the result of the player's salvo
+    resp = {
+        "type": "enemy_salvo",
+        "result": salvo_result(results),
+        "shots": shot_results,
+    }
+    websockets = list(request.app["websockets"][defense_player_id])
+    for active_ws in websockets:
+        LOGGER.info(f"Notifying {defense_player_id=}")
+        try:
+            await active_ws.send_json(resp)
+        except ConnectionResetError:
+            request.app["websockets"][defense_player_id].remove(active_ws)
+
+    if GuessResult.victory in results:
+        request.app["bots"].finish(game_id)
+    else:
+        await play_bot_turn(request, game_id, player_id, salvo=True)
+
+
+async def play_bot_turn(request, game_id: int, player_id: int, salvo: bool) -> None:
+    """
+    Lets a bot reply to the player's turn, if the player is up against a bot,
+    and notifies the player of the bot's shots.
+    """
+    db_session = request.app["battleship_db"]
+    bot_moves = await request.app["bots"].play(game_id, db_session)
+    if not bot_moves:
+        return
+
+    if salvo:
+        results = [result for _, result in bot_moves]
+        responses = [
+            {
+                "type": "enemy_salvo",
+                "result": salvo_result(results),
+                "shots": [
+                    {"result": result, "position_x": shot[0], "position_y": shot[1]}
+                    for shot, result in bot_moves
+                ],
+            }
+        ]
+    else:
+        responses = [
+            {
+                "type": "enemy_guess",
+                "result": result,
+                "position_x": shot[0],
+                "position_y": shot[1],
+            }
+            for shot, result in bot_moves
+        ]
+
+    websockets = list(request.app["websockets"][player_id])
+    for active_ws in websockets:
+        LOGGER.info(f"Notifying {player_id=} of the bot's turn")
+        try:
+            for resp in responses:
+                await active_ws.send_json(resp)
+        except ConnectionResetError:
+            request.app["websockets"][player_id].remove(active_ws)
+
 
 async def handle_create_new_ship(request, payload, ws) -> None:
     player_id = payload["player_id"]
@@ -75,7 +180,8 @@ async def handle_create_new_ship(request, payload, ws) -> None:
     ship = payload["ship"]
     db_session = request.app["battleship_db"]
     try:
-        new_ship = await add_player_ship(game_id, player_id, ship, db_session)
+        with http_errors():
+            new_ship = await add_player_ship(game_id, player_id, ship, db_session)
     except web.HTTPException as e:
         resp = {
             "type": "new_ship",
@@ -104,6 +210,45 @@ async def handle_create_new_ship(request, payload, ws) -> None:
             request.app["websockets"][player_id].remove(active_ws)
 
 
+async def handle_place_fleet(request, payload, ws) -> None:
+    player_id = payload["player_id"]
+    game_id = payload["game_id"]
+    ships = payload["ships"]
+    db_session = request.app["battleship_db"]
+    try:
+        with http_errors():
+            new_ships = await add_player_fleet(game_id, player_id, ships, db_session)
+    except web.HTTPException as e:
+        resp = {
+            "type": "new_fleet",
+            "result": "failure",
+            "msg": e.text,
+        }
+        await ws.send_json(resp)
+        return
+
+    resp = {
+        "type": "new_fleet",
+        "result": "success",
+        "ships": [
+            {
+                "ship_id": new_ship.id,
+                "ship_size": new_ship.size,
+                "orientation": new_ship.orientation,
+                "start_position_x": new_ship.start_position_x,
+                "start_position_y": new_ship.start_position_y,
+            }
+            for new_ship in new_ships
+        ],
+    }
+    websockets = list(request.app["websockets"][player_id])
+    for active_ws in websockets:
+        try:
+            await active_ws.send_json(resp)
+        except ConnectionResetError:
+            request.app["websockets"][player_id].remove(active_ws)
+
+
 async def handle_move_ship(request, payload, ws) -> None:
     player_id = payload["player_id"]
     game_id = payload["game_id"]
@@ -113,9 +258,15 @@ async def handle_move_ship(request, payload, ws) -> None:
 
     db_session = request.app["battleship_db"]
     try:
-        ship = await move_ship(
-            game_id, player_id, ship_id, start_position_x, start_position_y, db_session
-        )
+        with http_errors():
+            ship = await move_ship(
+                game_id,
+                player_id,
+                ship_id,
+                start_position_x,
+                start_position_y,
+                db_session,
+            )
     except web.HTTPException as e:
         resp = {
             "type": "move_ship",
@@ -1,7 +1,9 @@
 from battleship.websocket.game_handlers import (
     handle_take_turn,
+    handle_take_salvo,
     connect,
     handle_create_new_ship,
+    handle_place_fleet,
     handle_move_ship,
     handle_fetch_game_details,
 )
@@ -9,7 +11,9 @@ from battleship.websocket.game_handlers import (
 
 handlers = {
     "take_turn": handle_take_turn,
+    "take_salvo": handle_take_salvo,
     "create_new_ship": handle_create_new_ship,
+    "place_fleet": handle_place_fleet,
     "move_ship": handle_move_ship,
     "fetch_game_details": handle_fetch_game_details,
     "connect": connect,
@@ -1,6 +1,7 @@
 import logging
 import asyncio
 from aiohttp import web, WSMsgType
+from battleship.api.errors import http_errors
 from battleship.websocket.handler_map import handlers
 
 LOGGER = logging.getLogger(__name__)
@@ -24,7 +25,8 @@ async def websocket_handler(request):
             action = payload["action"]
             handler = handlers[action]
             try:
-                await handler(request, payload, ws)
+                with http_errors():
+                    await handler(request, payload, ws)
             except web.HTTPException as e:
                 resp = {
                     "type": "server_error",
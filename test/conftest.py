@@ -2,16 +2,17 @@ import pytest
 import copy
 from aiohttp import web
 from battleship.api.urls import urls
+from battleship.bot import BotRegistry
 from battleship.schema import server_response_for_validation_error
 from battleship.models.player import Player
-from battleship.models.game import Game, GameStatus
+from battleship.models.game import Game, GameMode, GameStatus
 from battleship.models.ship import Ship, ShipOrientation
 from aiohttp_apispec import validation_middleware, setup_aiohttp_apispec
 from unittest.mock import AsyncMock
 
 
 @pytest.fixture
-def mock_db(mock_game, mock_player_ships):
+def mock_db(mock_game, mock_player_ships, mock_player_2):
     db = AsyncMock(
         add_game=AsyncMock(return_value=1),
         get_game=AsyncMock(return_value=mock_game),
@@ -19,6 +20,8 @@ def mock_db(mock_game, mock_player_ships):
         add_ship=AsyncMock(),
         update_game=AsyncMock(),
         get_player_ships=AsyncMock(return_value=mock_player_ships),
+        get_player_shots=AsyncMock(return_value=set()),
+        get_player_by_id=AsyncMock(return_value=mock_player_2),
     )
     return db
 
@@ -50,6 +53,10 @@ def mock_game(mock_player_1, mock_player_2):
         "player_2_id": mock_player_2.id,
         "current_player_id": mock_player_1.id,
         "status": GameStatus.in_progress.value,
+        "mode": GameMode.classic.value,
+        "board_width": 10,
+        "board_height": 10,
+        "fleet": [5, 4, 4, 3, 3, 3, 2, 2, 2, 2],
     }
     return Game(**game)
 
@@ -99,6 +106,18 @@ def turn_request():
     }
 
 
+@pytest.fixture
+def salvo_request():
+    return {
+        "game_id": 1,
+        "offense_player_id": 1,
+        "defense_player_id": 2,
+        "shots": [
+            {"position_x": 5, "position_y": 5},
+        ],
+    }
+
+
 @pytest.fixture
 def add_ship_request():
     return {
@@ -107,12 +126,34 @@ def add_ship_request():
         "ship": {
             "start_position_x": 1,
             "start_position_y": 2,
-            "size": 5,
+            "size": 4,
             "orientation": "horizontal",
         },
     }
 
 
+@pytest.fixture
+def place_fleet_request():
+    return {
+        "game_id": 1,
+        "player_id": 1,
+        "ships": [
+            {
+                "start_position_x": 0,
+                "start_position_y": 0,
+                "size": 4,
+                "orientation": "vertical",
+            },
+            {
+                "start_position_x": 2,
+                "start_position_y": 0,
+                "size": 3,
+                "orientation": "horizontal",
+            },
+        ],
+    }
+
+
 @pytest.fixture
 def new_game_request():
     return {
@@ -126,6 +167,7 @@ def new_game_request():
 def battleship_client(event_loop, aiohttp_client, mock_db):
     app = web.Application(middlewares=[validation_middleware])
     app["battleship_db"] = mock_db
+    app["bots"] = BotRegistry()
     app.add_routes(urls)
     setup_aiohttp_apispec(app, error_callback=server_response_for_validation_error)
     return event_loop.run_until_complete(aiohttp_client(app))
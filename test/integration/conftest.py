@@ -1,8 +1,10 @@
+import os
 import pytest
 import asyncio
 from aiohttp_apispec import validation_middleware, setup_aiohttp_apispec
 from aiohttp import web
 from battleship.api.urls import urls
+from battleship.bot import BotRegistry
 
 from battleship.schema import server_response_for_validation_error
 from battleship.models.database import BattleshipDatabase
@@ -14,8 +16,10 @@ DB_PASSWD = "testpassword"
 DB_HOST = "localhost"
 DB_PORT = "5432"
 DB_NAME = "foo"
-DATABASE_URL = (
-    f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# TEST_DATABASE_URL=sqlite+aiosqlite:///test.db runs the tests on SQLite
+DATABASE_URL = os.getenv(
+    "TEST_DATABASE_URL",
+    f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWD}@{DB_HOST}:{DB_PORT}/{DB_NAME}",
 )
 
 
@@ -43,6 +47,7 @@ def battleship_database(event_loop):
 def battleship_client(event_loop, battleship_database, aiohttp_client):
     app = web.Application(middlewares=[validation_middleware])
     app["battleship_db"] = battleship_database
+    app["bots"] = BotRegistry()
     app.add_routes(urls)
     setup_aiohttp_apispec(app, error_callback=server_response_for_validation_error)
     return event_loop.run_until_complete(aiohttp_client(app))
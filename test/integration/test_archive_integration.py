@@ -0,0 +1,118 @@
+import pytest
+from sqlalchemy import func, select
+from battleship.game_details import game_details_response, ship_response
+from battleship.models.archive import ArchivedGuess, ArchivedShip
+from battleship.models.game import Game, GameStatus
+from battleship.models.guess import Guess, GuessResult
+from battleship.models.player import Player
+from battleship.models.ship import Ship
+from battleship.utils import add_player_fleet, run_game_turn
+
+FLEET = [
+    {
+        "size": 2,
+        "orientation": "horizontal",
+        "start_position_x": 0,
+        "start_position_y": 0,
+    }
+]
+
+
+async def new_game(db, player_ids) -> int:
+    game = Game(
+        player_1_id=player_ids[0],
+        player_2_id=player_ids[1],
+        current_player_id=player_ids[0],
+        status=GameStatus.in_progress,
+        fleet=[2],
+    )
+    game = await db.add_game(game)
+    for player_id in player_ids:
+        await add_player_fleet(game.id, player_id, FLEET, db)
+    return game.id
+
+
+async def count(db, model, game_id) -> int:
+    async with db.async_session() as session:
+        return await session.scalar(
+            select(func.count()).select_from(model).where(model.game_id == game_id)
+        )
+
+
+async def game_views(db, game_id, player_id) -> dict:
+    """
+    Everything read about a player's side of a game.
+    """
+    details = await db.get_game_details(game_id, player_id)
+    state = await db.get_game_state(game_id)
+    ships = await db.get_player_ships(game_id, player_id)
+    shots = await db.get_player_shots(game_id, player_id)
+    return {
+        "details": game_details_response(**details),
+        "player_game_details": await db.get_player_game_details(game_id, player_id),
+        "ships": [ship_response(ship) for ship in state["ships"]],
+        "guesses": [(guess.id, guess.result) for guess in state["guesses"]],
+        "ship_rows": await db.get_player_ships(game_id, player_id, dto=True),
+        "ship": ship_response(await db.get_ship(ships[0].id)),
+        "shots": (len(shots), (5, 5) in shots),
+        "hits": len(await db.get_ship_hits([ship.id for ship in ships])),
+    }
+
+
+@pytest.mark.asyncio
+async def test_completed_games_are_archived(battleship_database):
+    db = battleship_database
+    player_ids = []
+    for name in ("first", "second"):
+        player = Player(first_name=name, last_name="", email="")
+        player_ids.append((await db.add_player(player)).id)
+    completed_game_id = await new_game(db, player_ids)
+    playing_game_id = await new_game(db, player_ids)
+    # Completed without a victory, e.g. abandoned
+    ended_game_id = await new_game(db, player_ids)
+    await db.update_game(ended_game_id, {"status": GameStatus.completed})
+
+    turns = [
+        (completed_game_id, 0, 0, player_ids),
+        (playing_game_id, 0, 0, player_ids),
+        (completed_game_id, 5, 5, player_ids[::-1]),
+        (completed_game_id, 1, 0, player_ids),
+    ]
+    for game_id, x, y, (offense_player_id, defense_player_id) in turns:
+        await run_game_turn(game_id, x, y, offense_player_id, defense_player_id, db)
+    before = await game_views(db, completed_game_id, player_ids[1])
+    assert before["guesses"][-1][1] == GuessResult.victory
+
+    assert await db.archive_completed_games(10, skip_game_ids=[ended_game_id]) == [
+        completed_game_id
+    ]
+    assert await db.archive_completed_games(10) == [ended_game_id]
+    assert await db.archive_completed_games(10) == []
+
+    assert await count(db, Ship, completed_game_id) == 0
+    assert await count(db, Guess, completed_game_id) == 0
+    assert await count(db, ArchivedShip, completed_game_id) == 2
+    assert await count(db, ArchivedGuess, completed_game_id) == 3
+    assert await count(db, Ship, playing_game_id) == 2
+    assert await count(db, ArchivedShip, playing_game_id) == 0
+
+    # Reads fall through to the archive
+    assert await game_views(db, completed_game_id, player_ids[1]) == before
+    games = await db.get_player_games(player_ids[0], status=GameStatus.completed)
+    assert [game.id for game in games] == [ended_game_id, completed_game_id]
+
+    # The archive is only read for completed games
+    async with db.async_session() as session, session.begin():
+        session.add(
+            ArchivedGuess(
+                id=-1,
+                game_id=playing_game_id,
+                offense_player_id=player_ids[1],
+                position_x=9,
+                position_y=9,
+                result=GuessResult.miss,
+            )
+        )
+    assert await db.get_player_guesses(playing_game_id, player_ids[1]) == []
+    details = await db.get_game_details(playing_game_id, player_ids[0])
+    assert details["enemy_guesses"] == []
@@ -0,0 +1,99 @@
+import pytest
+from battleship.models.asyncpg_database import STATEMENTS, AsyncpgDatabase
+from battleship.models.game import Game, GameMode, GameStatus
+from battleship.models.game_cache import GameStateCache
+from battleship.models.guess import GuessResult
+from battleship.models.player import Player
+from battleship.utils import add_player_fleet, run_game_turn, run_salvo_turn
+
+
+@pytest.fixture
+def asyncpg_database(event_loop, battleship_database):
+    if battleship_database.engine.dialect.name != "postgresql":
+        pytest.skip("AsyncpgDatabase needs PostgreSQL")
+    db = AsyncpgDatabase(battleship_database.engine, pool_size=2)
+    yield db
+    event_loop.run_until_complete(db.close())
+
+
+async def new_game(db, mode: GameMode, fleet: list[int]) -> tuple[int, list[int]]:
+    player_ids = []
+    for name in ("first", "second"):
+        player = Player(first_name=name, last_name="", email="")
+        player_ids.append((await db.add_player(player)).id)
+    game = Game(
+        player_1_id=player_ids[0],
+        player_2_id=player_ids[1],
+        current_player_id=player_ids[0],
+        status=GameStatus.in_progress,
+        mode=mode,
+        fleet=fleet,
+    )
+    game = await db.add_game(game)
+    for player_id in player_ids:
+        ships = [
+            {
+                "size": size,
+                "orientation": "horizontal",
+                "start_position_x": 0,
+                "start_position_y": y,
+            }
+            for y, size in enumerate(fleet)
+        ]
+        await add_player_fleet(game.id, player_id, ships, db)
+    return game.id, player_ids
+
+
+@pytest.mark.asyncio
+async def test_turns_run_the_statements(asyncpg_database):
+    game_id, (player_1_id, player_2_id) = await new_game(
+        asyncpg_database, GameMode.classic, [2]
+    )
+    cache = GameStateCache(asyncpg_database)
+    # More turns than connections, so connections are reused
+    turns = [
+        (0, 0, player_1_id, player_2_id, GuessResult.hit),
+        (5, 5, player_2_id, player_1_id, GuessResult.miss),
+        (5, 5, player_1_id, player_2_id, GuessResult.miss),
+        (6, 6, player_2_id, player_1_id, GuessResult.miss),
+        (1, 0, player_1_id, player_2_id, GuessResult.victory),
+    ]
+    for x, y, offense_player_id, defense_player_id, expected in turns:
+        result = await run_game_turn(
+            game_id, x, y, offense_player_id, defense_player_id, cache
+        )
+        assert result == expected
+
+    # The cast to gamestatus and the unnest of the hits and guesses were written
+    game = await asyncpg_database.get_game(game_id)
+    assert game.status == GameStatus.completed
+    (ship,) = await asyncpg_database.get_player_ships(game_id, player_2_id)
+    assert (ship.hits, ship.hit_mask) == (2, 0b11)
+    guesses = await asyncpg_database.get_player_guesses(game_id, player_1_id)
+    assert [guess.result for guess in guesses] == [
+        GuessResult.hit,
+        GuessResult.miss,
+        GuessResult.victory,
+    ]
+    assert await asyncpg_database.increment_ship_hits(ship.id) == 3
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_salvo_runs_the_statements(asyncpg_database):
+    game_id, (player_1_id, player_2_id) = await new_game(
+        asyncpg_database, GameMode.salvo, [2, 2]
+    )
+    results = await run_salvo_turn(
+        game_id, [(0, 0), (0, 1)], player_1_id, player_2_id, asyncpg_database
+    )
+    assert results == [GuessResult.hit, GuessResult.hit]
+    ships = await asyncpg_database.get_player_ships(game_id, player_2_id)
+    assert [ship.hits for ship in ships] == [1, 1]
+
+    # The fleet is decoded from JSON by the connection's codec
+    pool = await asyncpg_database.pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(STATEMENTS["battleship_read_game"], game_id)
+    assert row["fleet"] == [2, 2]
+    assert row["current_player_id"] == player_2_id
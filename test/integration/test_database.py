@@ -0,0 +1,496 @@
+import asyncio
+import os
+import pytest
+from sqlalchemy import event, select, text, update
+from sqlalchemy.orm import Session
+from battleship.board_state import get_ships_afloat
+from battleship.errors import GameRuleError, WriteConflictError
+from battleship.models.base import Base
+from battleship.models.asyncpg_database import AsyncpgDatabase
+from battleship.models.database import BattleshipDatabase
+from battleship.models.game import Game, GameMode, GameStatus
+from battleship.models.game_cache import GameStateCache
+from battleship.models.guess import GuessResult
+from battleship.models.metadata_cache import MetadataCache
+from battleship.models.player import Player
+from battleship.models.ship import Ship
+from battleship.models.sqlite import is_sqlite
+from battleship.utils import (
+    add_player_fleet,
+    add_player_ship,
+    run_game_turn,
+    run_salvo_turn,
+)
+
+
+async def add_game(battleship_database):
+    player_ids = []
+    for name in ("first", "second"):
+        player = Player(first_name=name, last_name="", email="")
+        player_ids.append((await battleship_database.add_player(player)).id)
+    game = Game(
+        player_1_id=player_ids[0],
+        player_2_id=player_ids[1],
+        current_player_id=player_ids[0],
+        status=GameStatus.in_progress,
+    )
+    return await battleship_database.add_game(game), player_ids
+
+
+async def add_ships(battleship_database, game_id, player_id):
+    return await battleship_database.add_ships(
+        [
+            {
+                "game_id": game_id,
+                "player_id": player_id,
+                "size": size,
+                "orientation": "horizontal",
+                "start_position_x": 0,
+                "start_position_y": y,
+                "hits": 0,
+            }
+            for y, size in enumerate([5, 4])
+        ]
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("returning", [True, False])
+async def test_writes_with_and_without_returning(
+    battleship_database, monkeypatch, returning
+):
+    if returning and not battleship_database.update_returning:
+        pytest.skip("the database does not support RETURNING")
+    monkeypatch.setattr(battleship_database, "update_returning", returning)
+    monkeypatch.setattr(battleship_database, "insert_many_returning", returning)
+    game, player_ids = await add_game(battleship_database)
+
+    ships = await add_ships(battleship_database, game.id, player_ids[0])
+    assert [ship.size for ship in ships] == [5, 4]
+    assert all(ship.id is not None for ship in ships)
+
+    ship = await battleship_database.update_ship(ships[1].id, {"start_position_x": 3})
+    assert (ship.id, ship.start_position_x, ship.size) == (ships[1].id, 3, 4)
+
+    assert await battleship_database.increment_ship_hits(ships[0].id) == 1
+    assert await battleship_database.increment_ship_hits(ships[0].id) == 2
+    assert (await battleship_database.get_ship(ships[0].id)).hits == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes(battleship_database):
+    game, player_ids = await add_game(battleship_database)
+    ships = await add_ships(battleship_database, game.id, player_ids[0])
+
+    hits = await asyncio.gather(
+        *[battleship_database.increment_ship_hits(ships[0].id) for _ in range(20)]
+    )
+    assert sorted(hits) == list(range(1, 21))
+    assert (await battleship_database.get_ship(ships[0].id)).hits == 20
+
+
+@pytest.mark.asyncio
+async def test_sqlite_pragmas(battleship_database):
+    if not is_sqlite(battleship_database.engine):
+        pytest.skip("not running on SQLite")
+    assert battleship_database.writer is not None
+    async with battleship_database.engine.connect() as conn:
+        assert await conn.scalar(text("PRAGMA journal_mode")) == "wal"
+        assert await conn.scalar(text("PRAGMA foreign_keys")) == 1
+        assert await conn.scalar(text("PRAGMA synchronous")) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns(battleship_database):
+    game, player_ids = await add_game(battleship_database)
+    await add_ships(battleship_database, game.id, player_ids[1])
+
+    # Both turns are the first player's, whichever runs first is played
+    results = await asyncio.gather(
+        battleship_database.play_turn(game.id, 0, 0, *player_ids),
+        battleship_database.play_turn(game.id, 1, 0, *player_ids),
+        return_exceptions=True,
+    )
+    assert results.count(GuessResult.hit) == 1
+    assert sum(isinstance(result, GameRuleError) for result in results) == 1
+    guesses = await battleship_database.get_player_guesses(game.id, player_ids[0])
+    assert len(guesses) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_fleet_placements(battleship_database):
+    game, player_ids = await add_game(battleship_database)
+    ships = [
+        {
+            "size": 5,
+            "orientation": "horizontal",
+            "start_position_x": 0,
+            "start_position_y": y,
+        }
+        for y in (0, 1)
+    ]
+
+    # Each fleet is valid alone, but the game allows a single ship of size 5
+    results = await asyncio.gather(
+        *[
+            add_player_fleet(game.id, player_ids[0], [ship], battleship_database)
+            for ship in ships
+        ],
+        return_exceptions=True,
+    )
+    assert sum(isinstance(result, GameRuleError) for result in results) == 1
+    placed = await battleship_database.get_player_ships(game.id, player_ids[0])
+    assert len(placed) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_ship_placements(battleship_database):
+    game, player_ids = await add_game(battleship_database)
+    ships = [
+        {
+            "size": 5,
+            "orientation": "horizontal",
+            "start_position_x": 0,
+            "start_position_y": y,
+        }
+        for y in (0, 1)
+    ]
+
+    # Ships placed one at a time are held to the fleet too
+    results = await asyncio.gather(
+        *[
+            add_player_ship(game.id, player_ids[0], ship, battleship_database)
+            for ship in ships
+        ],
+        return_exceptions=True,
+    )
+    assert sum(isinstance(result, GameRuleError) for result in results) == 1
+    placed = await battleship_database.get_player_ships(game.id, player_ids[0])
+    assert [ship.id for ship in placed] == [
+        result.id for result in results if not isinstance(result, Exception)
+    ]
+    with pytest.raises(GameRuleError):
+        await add_player_ship(
+            game.id, player_ids[0], {**ships[0], "size": 80}, battleship_database
+        )
+
+    # The database checks the fleet again as it writes the ship
+    with pytest.raises(GameRuleError):
+        await battleship_database.add_ship(
+            Ship(game_id=game.id, player_id=player_ids[0], hits=0, **ships[1])
+        )
+    assert len(await battleship_database.get_player_ships(game.id, player_ids[0])) == 1
+
+
+@pytest.mark.asyncio
+async def test_ships_longer_than_a_hit_mask(battleship_database):
+    db = battleship_database
+    game, player_ids = await add_game(db)
+    await db.update_game(game.id, {"board_width": 100, "fleet": [80, 2]})
+    ship = {
+        "size": 80,
+        "orientation": "horizontal",
+        "start_position_x": 0,
+        "start_position_y": 0,
+    }
+    with pytest.raises(GameRuleError):
+        await add_player_fleet(game.id, player_ids[1], [ship], db)
+    with pytest.raises(GameRuleError):
+        await add_player_ship(game.id, player_ids[1], ship, db)
+
+    # One placed before sizes were capped is sunk by its hits
+    async with db.async_session() as session, session.begin():
+        session.add_all(
+            [
+                Ship(game_id=game.id, player_id=player_ids[1], hits=0, **ship),
+                Ship(
+                    game_id=game.id,
+                    player_id=player_ids[1],
+                    hits=0,
+                    **{**ship, "size": 2, "start_position_y": 1},
+                ),
+            ]
+        )
+        await session.execute(
+            update(Game).where(Game.id == game.id).values(player_2_ships_afloat=2)
+        )
+    await add_player_fleet(game.id, player_ids[0], [{**ship, "size": 2}], db)
+    for x in range(80):
+        result = await db.play_turn(game.id, x, 0, *player_ids)
+        assert result == GuessResult.hit
+        await db.play_turn(game.id, x, 9, *player_ids[::-1])
+    assert get_ships_afloat(await db.get_game(game.id), player_ids[1]) == 1
+
+
+@pytest.mark.asyncio
+async def test_read_replica(battleship_database, tmp_path):
+    # The replica is never written to, so reads which reach it find nothing
+    replica_URL = os.getenv(
+        "TEST_REPLICA_DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path}/replica.db"
+    )
+    db = BattleshipDatabase(battleship_database.engine, [replica_URL])
+    async with db.replicas[0].begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    game, player_ids = await add_game(db)
+    assert (await db.get_player_by_id(player_ids[0])).id == player_ids[0]
+    assert (await db.get_game(game.id)).id == game.id
+    assert len(await db.get_player_games(player_ids[1], dto=True)) == 1
+
+    # Once the replica has had time to catch up, reads go to it
+    db.router.recent_writes.lag = 0
+    assert await db.get_player_by_id(player_ids[0]) is None
+    assert await db.get_game(game.id) is None
+    assert await db.get_player_games(player_ids[1], dto=True) == []
+    assert await db.get_player_game_details(game.id, player_ids[0]) is None
+    # Reads used to play a turn stay on the primary
+    assert (await db.get_game_state(game.id))["game"].id == game.id
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_turns_are_written_whole(battleship_database):
+    game, player_ids = await add_game(battleship_database)
+    await add_ships(battleship_database, game.id, player_ids[1])
+    cache = GameStateCache(battleship_database)
+    await cache.get_game(game.id)
+
+    assert await run_game_turn(game.id, 0, 0, *player_ids, cache) == GuessResult.hit
+    # The turn is in the database before it returns, not written behind
+    guesses = await battleship_database.get_player_guesses(game.id, player_ids[0])
+    assert [(guess.position_x, guess.result) for guess in guesses] == [
+        (0, GuessResult.hit)
+    ]
+    game = await battleship_database.get_game(game.id)
+    assert game.current_player_id == player_ids[1]
+    assert (await cache.get_game(game.id)).current_player_id == player_ids[1]
+    await cache.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cached", [False, True])
+async def test_metadata_cache_follows_turns(battleship_database, cached):
+    game, player_ids = await add_game(battleship_database)
+    for player_id in player_ids:
+        await add_ships(battleship_database, game.id, player_id)
+    inner = GameStateCache(battleship_database) if cached else battleship_database
+    db = MetadataCache(inner)
+
+    games = await db.get_player_games(player_ids[0], dto=True)
+    assert [row.id for row in games] == [game.id]
+    assert (await db.get_game(game.id, dto=True)).current_player_id == player_ids[0]
+    assert await run_game_turn(game.id, 0, 0, *player_ids, db) == GuessResult.hit
+    assert (await db.get_game(game.id, dto=True)).current_player_id == player_ids[1]
+    assert await run_game_turn(game.id, 9, 9, *player_ids[::-1], db) == (
+        GuessResult.miss
+    )
+    assert (await db.get_game(game.id, dto=True)).current_player_id == player_ids[0]
+
+    new_game = Game(
+        player_1_id=player_ids[0],
+        player_2_id=player_ids[1],
+        current_player_id=player_ids[0],
+        status=GameStatus.in_progress,
+    )
+    new_game = await db.add_game(new_game)
+    games = await db.get_player_games(player_ids[1], dto=True)
+    assert [row.id for row in games] == [new_game.id, game.id]
+    assert db.misses["game"] == 3 and db.hits["player_games"] == 0
+    if cached:
+        await db.close()
+
+
+async def read_board_state(battleship_database, game_id):
+    async with battleship_database.async_session() as session:
+        game = await session.get(Game, game_id)
+        stmt = select(Ship).where(Ship.game_id == game_id).order_by(Ship.id)
+        ships = (await session.scalars(stmt)).all()
+    return game, ships
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cached", [False, True])
+async def test_turns_keep_board_state(battleship_database, cached):
+    game, player_ids = await add_game(battleship_database)
+    for player_id in player_ids:
+        await add_ships(battleship_database, game.id, player_id)
+    game, ships = await read_board_state(battleship_database, game.id)
+    assert get_ships_afloat(game, player_ids[0]) == 2
+    assert get_ships_afloat(game, player_ids[1]) == 2
+
+    db = GameStateCache(battleship_database) if cached else battleship_database
+    # The first player sinks the second player's ship of 4 on row 1
+    for x in range(4):
+        await run_game_turn(game.id, x, 1, *player_ids, db)
+        await run_game_turn(game.id, x, 9, *player_ids[::-1], db)
+    await run_game_turn(game.id, 0, 0, *player_ids, db)
+    if cached:
+        await db.close()
+
+    game, ships = await read_board_state(battleship_database, game.id)
+    masks = {(ship.player_id, ship.size): ship.hit_mask for ship in ships}
+    assert masks == {
+        (player_ids[0], 5): 0,
+        (player_ids[0], 4): 0,
+        (player_ids[1], 5): 0b1,
+        (player_ids[1], 4): 0b1111,
+    }
+    assert get_ships_afloat(game, player_ids[0]) == 2
+    assert get_ships_afloat(game, player_ids[1]) == 1
+    shots = await battleship_database.get_player_shots(game.id, player_ids[0])
+    assert all((x, 1) in shots for x in range(4)) and (0, 0) in shots
+    assert (0, 9) not in shots
+    shots = await battleship_database.get_player_shots(game.id, player_ids[1])
+    assert all((x, 9) in shots for x in range(4)) and (4, 9) not in shots
+
+
+@pytest.mark.asyncio
+async def test_salvo_keeps_board_state(battleship_database):
+    game, player_ids = await add_game(battleship_database)
+    await battleship_database.update_game(game.id, {"mode": GameMode.salvo})
+    for player_id in player_ids:
+        await add_ships(battleship_database, game.id, player_id)
+
+    shots = [(2, 0), (3, 1)]
+    results = await run_salvo_turn(game.id, shots, *player_ids, battleship_database)
+    assert results == [GuessResult.hit, GuessResult.hit]
+
+    game, ships = await read_board_state(battleship_database, game.id)
+    masks = [ship.hit_mask for ship in ships if ship.player_id == player_ids[1]]
+    assert masks == [0b100, 0b1000]
+    assert (3, 1) in await battleship_database.get_player_shots(game.id, player_ids[0])
+    assert game.current_player_id == player_ids[1]
+
+
+@pytest.mark.asyncio
+async def test_turn_is_played_again_after_concurrent_write(battleship_database):
+    db = battleship_database
+    game, player_ids = await add_game(db)
+    await add_ships(db, game.id, player_ids[1])
+    version = (await db.get_game(game.id)).version
+    writes = []
+
+    def write_concurrently(session, flush_context, instances):
+        # Another writer commits between the turn's read and its write
+        if len(writes) < 1:
+            with db.engine.sync_engine.begin() as conn:
+                stmt = update(Game).where(Game.id == game.id)
+                conn.execute(stmt.values(version=Game.version + 1))
+            writes.append(True)
+
+    event.listen(Session, "before_flush", write_concurrently)
+    try:
+        assert await db.play_turn(game.id, 0, 0, *player_ids) == GuessResult.hit
+    finally:
+        event.remove(Session, "before_flush", write_concurrently)
+
+    game = await db.get_game(game.id)
+    assert game.version == version + 2
+    assert game.current_player_id == player_ids[1]
+    guesses = await db.get_player_guesses(game.id, player_ids[0])
+    assert len(guesses) == 1
+
+
+@pytest.mark.asyncio
+async def test_turn_gives_up_after_concurrent_writes(battleship_database):
+    db = battleship_database
+    game, player_ids = await add_game(db)
+    await add_ships(db, game.id, player_ids[1])
+
+    def write_concurrently(session, flush_context, instances):
+        with db.engine.sync_engine.begin() as conn:
+            stmt = update(Game).where(Game.id == game.id)
+            conn.execute(stmt.values(version=Game.version + 1))
+
+    event.listen(Session, "before_flush", write_concurrently)
+    try:
+        with pytest.raises(WriteConflictError):
+            await db.play_turn(game.id, 0, 0, *player_ids)
+    finally:
+        event.remove(Session, "before_flush", write_concurrently)
+    assert await db.get_player_guesses(game.id, player_ids[0]) == []
+    assert (await db.get_game(game.id)).current_player_id == player_ids[0]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["database", "cache", "asyncpg"])
+async def test_concurrent_turns_stress(battleship_database, backend):
+    db = battleship_database
+    game, player_ids = await add_game(db)
+    for player_id in player_ids:
+        await add_ships(db, game.id, player_id)
+    version = (await db.get_game(game.id)).version
+
+    # Turns are played straight on the database, or through a warm cache in
+    # front of it or of an AsyncpgDatabase
+    players = db
+    if backend == "asyncpg":
+        if db.engine.dialect.name != "postgresql":
+            pytest.skip("AsyncpgDatabase needs PostgreSQL")
+        players = GameStateCache(AsyncpgDatabase(db.engine, pool_size=4))
+    elif backend == "cache":
+        players = GameStateCache(db)
+    await players.get_game(game.id)
+
+    # Both players fire at cells below the ships, several requests at a time,
+    # so many turns are attempted when it is not the player's turn
+    cells = [(x, y) for y in range(2, 10) for x in range(10)]
+    attempts = []
+    for round_cells in zip(*[iter(cells)] * 4):
+        attempts += [(cell, *player_ids) for cell in round_cells]
+        attempts += [(cell, *player_ids[::-1]) for cell in round_cells]
+    results = []
+    for start in range(0, len(attempts), 8):
+        batch = attempts[start : start + 8]
+        results += await asyncio.gather(
+            *[
+                players.play_turn(game.id, *cell, offense_player_id, defense_player_id)
+                for cell, offense_player_id, defense_player_id in batch
+            ],
+            return_exceptions=True,
+        )
+
+    played = []
+    for (cell, offense_player_id, _), result in zip(attempts, results):
+        if isinstance(result, Exception):
+            assert isinstance(result, (GameRuleError, WriteConflictError))
+        else:
+            assert result == GuessResult.miss
+            played.append((offense_player_id, cell))
+    assert 0 < len(played) < len(attempts)
+
+    guesses = []
+    for player_id in player_ids:
+        guesses += await db.get_player_guesses(game.id, player_id)
+    guesses.sort(key=lambda guess: guess.id)
+    # Turns alternate between the players, and only the turns played
+    # were written
+    assert [guess.offense_player_id for guess in guesses] == [
+        player_ids[ind % 2] for ind in range(len(guesses))
+    ]
+    assert sorted(
+        (guess.offense_player_id, (guess.position_x, guess.position_y))
+        for guess in guesses
+    ) == sorted(played)
+
+    game = await db.get_game(game.id)
+    assert game.version == version + len(played)
+    for player_id in player_ids:
+        shots = await db.get_player_shots(game.id, player_id)
+        assert {cell for cell in cells if cell in shots} == {
+            cell for offense_player_id, cell in played if offense_player_id == player_id
+        }
+        # The cache kept up with the turns played
+        cached_shots = await players.get_player_shots(game.id, player_id)
+        assert [cell in cached_shots for cell in cells] == [
+            cell in shots for cell in cells
+        ]
+    if isinstance(players, GameStateCache):
+        assert (await players.get_game(game.id)).current_player_id == (
+            game.current_player_id
+        )
+        await players.flush()
+        if backend == "asyncpg":
+            await players.db.close()
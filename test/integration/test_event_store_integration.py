@@ -0,0 +1,189 @@
+import pytest
+from sqlalchemy import func, select, update
+from battleship.errors import GameRuleError, NotFoundError
+from battleship.models.event_store import EventSourcedDatabase
+from battleship.models.game import Game, GameStatus
+from battleship.models.game_event import GameEvent, GameSnapshot
+from battleship.models.guess import Guess, GuessResult
+from battleship.models.migrations import complete_event_sourced_games
+from battleship.models.player import Player
+from battleship.models.ship import Ship
+from battleship.utils import add_player_fleet, move_ship, run_game_turn
+
+FLEET = [
+    {
+        "size": 2,
+        "orientation": "horizontal",
+        "start_position_x": 0,
+        "start_position_y": 0,
+    },
+    {
+        "size": 3,
+        "orientation": "vertical",
+        "start_position_x": 5,
+        "start_position_y": 5,
+    },
+]
+
+
+@pytest.fixture
+def event_db(event_loop, battleship_database):
+    event_db = EventSourcedDatabase(battleship_database.engine, snapshot_interval=4)
+    yield event_db
+    event_loop.run_until_complete(event_db.close())
+
+
+async def new_game(db) -> tuple[int, list[int]]:
+    player_ids = []
+    for name in ("first", "second"):
+        player = Player(first_name=name, last_name="", email="")
+        player_ids.append((await db.add_player(player)).id)
+    game = Game(
+        player_1_id=player_ids[0],
+        player_2_id=player_ids[1],
+        current_player_id=player_ids[0],
+        status=GameStatus.in_progress,
+        fleet=[2, 3],
+    )
+    game = await db.add_game(game)
+    for player_id in player_ids:
+        await add_player_fleet(game.id, player_id, FLEET, db)
+    return game.id, player_ids
+
+
+async def count(db, model, game_id) -> int:
+    async with db.async_session() as session:
+        return await session.scalar(
+            select(func.count()).select_from(model).where(model.game_id == game_id)
+        )
+
+
+@pytest.mark.asyncio
+async def test_game_is_played_from_events(event_db):
+    game_id, (player_1_id, player_2_id) = await new_game(event_db)
+    ships = await event_db.get_player_ships(game_id, player_2_id)
+    ship_ids = [ship.id for ship in ships]
+    await move_ship(game_id, player_2_id, ship_ids[0], 1, 1, event_db)
+    assert (await event_db.get_ship(ship_ids[0])).start_position_x == 1
+
+    turns = [
+        (1, 1, player_1_id, GuessResult.hit),
+        (9, 9, player_2_id, GuessResult.miss),
+        (0, 0, player_1_id, GuessResult.miss),
+        (8, 8, player_2_id, GuessResult.miss),
+        (2, 1, player_1_id, GuessResult.hit),
+    ]
+    for x, y, player_id, expected in turns:
+        defense_player_id = player_2_id if player_id == player_1_id else player_1_id
+        result = await run_game_turn(
+            game_id, x, y, player_id, defense_player_id, event_db
+        )
+        assert result == expected
+    with pytest.raises(GameRuleError):
+        await run_game_turn(game_id, 3, 3, player_1_id, player_2_id, event_db)
+
+    game = await event_db.get_game(game_id)
+    assert game.current_player_id == player_2_id
+    ships = await event_db.get_player_ships(game_id, player_2_id)
+    assert {ship.id: ship.hits for ship in ships} == {ship_ids[0]: 2, ship_ids[1]: 0}
+    details = await event_db.get_player_game_details(game_id, player_1_id)
+    assert len(details["player_guesses"]) == 3
+    assert len(details["enemy_guesses"]) == 2
+
+    # Four ships, a move and five turns, and nothing is written to the tables
+    assert await count(event_db, GameEvent, game_id) == 10
+    assert await count(event_db, GameSnapshot, game_id) == 2
+    assert await count(event_db, Ship, game_id) == 0
+    assert await count(event_db, Guess, game_id) == 0
+
+    # Games are listed by the status written to their rows
+    games = await event_db.get_player_games(
+        player_1_id, status=GameStatus.in_progress, limit=1
+    )
+    assert [game.id for game in games] == [game_id]
+    assert (
+        await event_db.get_player_games(player_1_id, status=GameStatus.completed) == []
+    )
+
+    # A new process rebuilds the same state from a snapshot and the tail
+    fresh_db = EventSourcedDatabase(event_db.engine)
+    assert await fresh_db.get_player_game_details(game_id, player_1_id) == details
+
+    # Past states are rebuilt up to any event
+    state = await fresh_db.get_game_state(game_id, seq=5)
+    assert state["seq"] == 5
+    assert state["game"].current_player_id == player_1_id
+    assert [ship.start_position_x for ship in state["ships"]] == [0, 5, 1, 5]
+    assert [ship.hits for ship in state["ships"]] == [0, 0, 0, 0]
+    assert state["guesses"] == []
+    state = await fresh_db.get_game_state(game_id, seq=7)
+    assert [guess.result for guess in state["guesses"]] == [
+        GuessResult.hit,
+        GuessResult.miss,
+    ]
+    await fresh_db.close()
+
+
+@pytest.mark.asyncio
+async def test_writers_catch_up_with_each_other(event_db):
+    game_id, (player_1_id, player_2_id) = await new_game(event_db)
+    other_db = EventSourcedDatabase(event_db.engine)
+
+    assert await event_db.play_turn(game_id, 5, 5, player_1_id, player_2_id) == "hit"
+    # The other writer's state is brought up to date before the turn is checked
+    with pytest.raises(GameRuleError):
+        await other_db.play_turn(game_id, 5, 6, player_1_id, player_2_id)
+    assert await other_db.play_turn(game_id, 0, 0, player_2_id, player_1_id) == "hit"
+    assert (await event_db.get_game(game_id)).current_player_id == player_1_id
+    assert len(await event_db.get_player_shots(game_id, player_2_id)) == 1
+    await other_db.close()
+
+
+@pytest.mark.asyncio
+async def test_reads_write_nothing(event_db):
+    game_id, (player_1_id, player_2_id) = await new_game(event_db)
+    await event_db.play_turn(game_id, 0, 0, player_1_id, player_2_id)
+    snapshots = await count(event_db, GameSnapshot, game_id)
+
+    # Snapshots are only taken by writers
+    reader = EventSourcedDatabase(event_db.engine, snapshot_interval=1)
+    await reader.get_player_game_details(game_id, player_1_id)
+    assert await count(event_db, GameSnapshot, game_id) == snapshots
+
+    # Unknown games and ships are not found
+    with pytest.raises(NotFoundError):
+        await reader.get_player_shots(game_id + 1, player_1_id)
+    assert await reader.get_player_guesses(game_id + 1, player_1_id) == []
+    assert await reader.get_ship_hits([-1]) == []
+    await reader.close()
+
+
+@pytest.mark.asyncio
+async def test_completed_games_are_listed_by_status(event_db):
+    game_id, (player_1_id, player_2_id) = await new_game(event_db)
+    misses = iter([(9, 9), (8, 8), (7, 7), (6, 6)])
+    for x, y in [(0, 0), (1, 0), (5, 5), (5, 6)]:
+        await run_game_turn(game_id, x, y, player_1_id, player_2_id, event_db)
+        x, y = next(misses)
+        await run_game_turn(game_id, x, y, player_2_id, player_1_id, event_db)
+    result = await run_game_turn(game_id, 5, 7, player_1_id, player_2_id, event_db)
+    assert result == GuessResult.victory
+
+    # The winning turn writes the status to the game's row
+    for player_id in (player_1_id, player_2_id):
+        games = await event_db.get_player_games(player_id, status=GameStatus.completed)
+        assert [game.id for game in games] == [game_id]
+        assert games[0].status == GameStatus.completed
+        assert (
+            await event_db.get_player_games(player_id, status=GameStatus.in_progress)
+            == []
+        )
+
+    # Games won before it did are completed by their migration
+    async with event_db.engine.begin() as conn:
+        await conn.execute(
+            update(Game).where(Game.id == game_id).values(status=GameStatus.in_progress)
+        )
+        await conn.run_sync(complete_event_sourced_games)
+        status = await conn.scalar(select(Game.status).where(Game.id == game_id))
+    assert status == GameStatus.completed
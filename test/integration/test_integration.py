@@ -1,4 +1,10 @@
+import json
 import pytest
+from battleship.fleet import ship_cells
+from battleship.models.dto import GameRow, ShipRow
+from battleship.models.game import Game, GameMode, GameStatus
+from battleship.models.game_cache import GameStateCache
+from battleship.models.player import Player
 
 
 @pytest.fixture(scope="session")
@@ -136,6 +142,37 @@ async def test_create_player_ships(test_session, battleship_client):
         assert ret.status == 200
 
 
+@pytest.mark.asyncio
+async def test_place_fleet(test_session, battleship_client):
+    # Create a second game and place both fleets in one request each
+    player_1_id = test_session["player_1_id"]
+    player_2_id = test_session["player_2_id"]
+    new_game_request = {
+        "player_1_id": player_1_id,
+        "player_2_id": player_2_id,
+        "initial_player": player_1_id,
+    }
+    ret = await battleship_client.post("v1/battleship/game", json=new_game_request)
+    game_id = (await ret.json())["game_id"]
+    for player_id in [player_1_id, player_2_id]:
+        place_fleet_request = {
+            "player_id": player_id,
+            "game_id": game_id,
+            "ships": PLAYER_SHIPS,
+        }
+        ret = await battleship_client.post(
+            "/v1/battleship/game/player/place_fleet", json=place_fleet_request
+        )
+        assert ret.status == 200
+        assert len((await ret.json())["ship_ids"]) == len(PLAYER_SHIPS)
+
+    # The fleet is complete so no more ships can be placed
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/place_fleet", json=place_fleet_request
+    )
+    assert ret.status == 400
+
+
 @pytest.mark.asyncio
 async def test_place_ship_outside_board(test_session, battleship_client):
     # Set up player_1 ships
@@ -220,6 +257,248 @@ async def test_take_turn_misses(test_session, battleship_client):
     assert data["result"] == "miss"
 
 
+@pytest.mark.asyncio
+async def test_take_turn_repeat_shot(test_session, battleship_client):
+    offense_player_id = test_session["player_1_id"]
+    defense_player_id = test_session["player_2_id"]
+    game_id = test_session["game_id"]
+    take_turn_request = {
+        "offense_player_id": offense_player_id,
+        "defense_player_id": defense_player_id,
+        "game_id": game_id,
+        "guess_position_x": 0,
+        "guess_position_y": 7,
+    }
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/take_turn", json=take_turn_request
+    )
+    assert ret.status == 400
+
+
+@pytest.mark.asyncio
+async def test_take_turn_out_of_turn(test_session, battleship_client):
+    offense_player_id = test_session["player_2_id"]
+    defense_player_id = test_session["player_1_id"]
+    game_id = test_session["game_id"]
+    take_turn_request = {
+        "offense_player_id": offense_player_id,
+        "defense_player_id": defense_player_id,
+        "game_id": game_id,
+        "guess_position_x": 1,
+        "guess_position_y": 8,
+    }
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/take_turn", json=take_turn_request
+    )
+    assert ret.status == 400
+
+
+@pytest.mark.asyncio
+async def test_take_salvo(test_session, battleship_client):
+    player_1_id = test_session["player_1_id"]
+    player_2_id = test_session["player_2_id"]
+    new_game_request = {
+        "player_1_id": player_1_id,
+        "player_2_id": player_2_id,
+        "initial_player": player_1_id,
+        "mode": "salvo",
+    }
+    ret = await battleship_client.post("v1/battleship/game", json=new_game_request)
+    game_id = (await ret.json())["game_id"]
+    for player_id in [player_1_id, player_2_id]:
+        place_fleet_request = {
+            "player_id": player_id,
+            "game_id": game_id,
+            "ships": PLAYER_SHIPS,
+        }
+        ret = await battleship_client.post(
+            "/v1/battleship/game/player/place_fleet", json=place_fleet_request
+        )
+        assert ret.status == 200
+
+    take_salvo_request = {
+        "offense_player_id": player_1_id,
+        "defense_player_id": player_2_id,
+        "game_id": game_id,
+        "shots": [
+            {"position_x": 4, "position_y": 0},
+            {"position_x": 5, "position_y": 0},
+            {"position_x": 1, "position_y": 1},
+        ],
+    }
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/take_salvo", json=take_salvo_request
+    )
+    assert ret.status == 200
+    data = await ret.json()
+    assert data["result"] == "hit"
+    assert [shot["result"] for shot in data["shots"]] == ["hit", "hit", "miss"]
+
+    params = {"game_id": game_id, "player_id": player_2_id}
+    ret = await battleship_client.get(
+        "/v1/battleship/game/player/details", params=params
+    )
+    data = await ret.json()
+    assert len(data["enemy_guesses"]) == 3
+    assert data["game"]["current_player_id"] == player_2_id
+
+
+@pytest.mark.asyncio
+async def test_take_turn_against_bot(test_session, battleship_client):
+    player_id = test_session["player_1_id"]
+    new_game_request = {
+        "player_1_id": player_id,
+        "initial_player": player_id,
+        "against_bot": True,
+    }
+    ret = await battleship_client.post("v1/battleship/game", json=new_game_request)
+    assert ret.status == 200
+    data = await ret.json()
+    game_id = data["game_id"]
+    bot_id = data["player_2_id"]
+
+    place_fleet_request = {
+        "player_id": player_id,
+        "game_id": game_id,
+        "ships": PLAYER_SHIPS,
+    }
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/place_fleet", json=place_fleet_request
+    )
+    assert ret.status == 200
+
+    take_turn_request = {
+        "offense_player_id": player_id,
+        "defense_player_id": bot_id,
+        "game_id": game_id,
+        "guess_position_x": 0,
+        "guess_position_y": 0,
+    }
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/take_turn", json=take_turn_request
+    )
+    assert ret.status == 200
+    data = await ret.json()
+    # The bot replied with a shot of its own and it is the player's turn again
+    assert data["current_player_id"] == player_id
+    assert len(data["enemy_guesses"]) == 1
+
+    params = {"game_id": game_id, "player_id": player_id}
+    ret = await battleship_client.get(
+        "/v1/battleship/game/player/details", params=params
+    )
+    data = await ret.json()
+    assert len(data["enemy_guesses"]) == 1
+    assert data["game"]["current_player_id"] == player_id
+
+
+@pytest.mark.asyncio
+async def test_player_beats_bot(test_session, battleship_client, battleship_database):
+    player_id = test_session["player_1_id"]
+    new_game_request = {
+        "player_1_id": player_id,
+        "initial_player": player_id,
+        "against_bot": True,
+        "fleet": [2],
+    }
+    ret = await battleship_client.post("v1/battleship/game", json=new_game_request)
+    assert ret.status == 200
+    data = await ret.json()
+    game_id = data["game_id"]
+    bot_id = data["player_2_id"]
+
+    place_fleet_request = {
+        "player_id": player_id,
+        "game_id": game_id,
+        "ships": [PLAYER_SHIPS[-1]],
+    }
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/place_fleet", json=place_fleet_request
+    )
+    assert ret.status == 200
+
+    (bot_ship,) = await battleship_database.get_player_ships(game_id, bot_id)
+    bot_cells = ship_cells(
+        bot_ship.size,
+        bot_ship.orientation,
+        bot_ship.start_position_x,
+        bot_ship.start_position_y,
+    )
+    bots = battleship_client.server.app["bots"]
+    results = []
+    for x, y in bot_cells:
+        take_turn_request = {
+            "offense_player_id": player_id,
+            "defense_player_id": bot_id,
+            "game_id": game_id,
+            "guess_position_x": x,
+            "guess_position_y": y,
+        }
+        ret = await battleship_client.post(
+            "/v1/battleship/game/player/take_turn", json=take_turn_request
+        )
+        assert ret.status == 200
+        results.append((await ret.json())["result"])
+        if results[-1] != "victory":
+            # The bot replied and is kept for its next turn
+            assert game_id in bots.bots
+    assert results == ["hit", "victory"]
+    # The bot of a game the player won is dropped too
+    assert game_id not in bots.bots
+
+
+@pytest.mark.asyncio
+async def test_game_details_single_query(
+    test_session, battleship_client, battleship_database
+):
+    player_1_id = test_session["player_1_id"]
+    player_2_id = test_session["player_2_id"]
+    new_game_request = {
+        "player_1_id": player_1_id,
+        "player_2_id": player_2_id,
+        "initial_player": player_1_id,
+    }
+    ret = await battleship_client.post("v1/battleship/game", json=new_game_request)
+    game_id = (await ret.json())["game_id"]
+    for player_id in [player_1_id, player_2_id]:
+        place_fleet_request = {
+            "player_id": player_id,
+            "game_id": game_id,
+            "ships": PLAYER_SHIPS,
+        }
+        await battleship_client.post(
+            "/v1/battleship/game/player/place_fleet", json=place_fleet_request
+        )
+    for offense_player_id, defense_player_id, x in [
+        (player_1_id, player_2_id, 4),
+        (player_2_id, player_1_id, 9),
+        (player_1_id, player_2_id, 5),
+    ]:
+        take_turn_request = {
+            "offense_player_id": offense_player_id,
+            "defense_player_id": defense_player_id,
+            "game_id": game_id,
+            "guess_position_x": x,
+            "guess_position_y": 9,
+        }
+        await battleship_client.post(
+            "/v1/battleship/game/player/take_turn", json=take_turn_request
+        )
+
+    # The single query returns the same details as the objects it replaced
+    details = await battleship_database.get_player_game_details(game_id, player_1_id)
+    cached_details = await GameStateCache(battleship_database).get_player_game_details(
+        game_id, player_1_id
+    )
+    assert json.loads(json.dumps(cached_details)) == details
+    assert len(details["player_ships"]) == len(PLAYER_SHIPS)
+    assert len(details["player_guesses"]) == 2
+    assert len(details["enemy_guesses"]) == 1
+    assert details["game"]["fleet"] == [5, 4, 4, 3, 3, 3, 2, 2, 2, 2]
+
+    assert await battleship_database.get_player_game_details(-1, player_1_id) is None
+
+
 @pytest.mark.asyncio
 async def test_get_player_games(test_session, battleship_client):
     player_id = test_session["player_1_id"]
@@ -228,3 +507,125 @@ async def test_get_player_games(test_session, battleship_client):
     assert ret.status == 200
     data = await ret.json()
     assert len(data) > 0
+
+
+@pytest.mark.asyncio
+async def test_player_games_pages(battleship_client, battleship_database):
+    player_ids = []
+    for name in ("first", "second", "third"):
+        player = Player(first_name=name, last_name="", email="")
+        player_ids.append((await battleship_database.add_player(player)).id)
+    game_ids = []
+    for i in range(5):
+        # The player sits on either seat, and the other player plays too
+        opponent_id = player_ids[1 + i % 2]
+        seats = (player_ids[0], opponent_id) if i % 2 else (opponent_id, player_ids[0])
+        game = Game(
+            player_1_id=seats[0],
+            player_2_id=seats[1],
+            current_player_id=seats[0],
+            status=GameStatus.completed if i < 3 else GameStatus.in_progress,
+        )
+        game_ids.append((await battleship_database.add_game(game)).id)
+
+    async def get_page(**params):
+        ret = await battleship_client.get(
+            "/v1/battleship/player/games", params={"player_id": player_ids[0], **params}
+        )
+        assert ret.status == 200
+        return await ret.json()
+
+    page = await get_page(limit=2)
+    assert [game["game_id"] for game in page["games"]] == game_ids[:2:-1]
+    assert page["next_cursor"] == game_ids[3]
+    page = await get_page(limit=2, cursor=page["next_cursor"])
+    assert [game["game_id"] for game in page["games"]] == game_ids[2:0:-1]
+    page = await get_page(limit=2, cursor=page["next_cursor"])
+    assert [game["game_id"] for game in page["games"]] == [game_ids[0]]
+    assert page["next_cursor"] is None
+
+    page = await get_page(status="completed")
+    assert [game["game_id"] for game in page["games"]] == game_ids[2::-1]
+    assert all(game["status"] == "completed" for game in page["games"])
+    assert page["next_cursor"] is None
+
+    ret = await battleship_client.get(
+        "/v1/battleship/player/games",
+        params={"player_id": player_ids[0], "status": "over"},
+    )
+    assert ret.status == 400
+
+
+@pytest.mark.asyncio
+async def test_dto_reads_match_orm(test_session, battleship_database):
+    player_id = test_session["player_1_id"]
+    games = await battleship_database.get_player_games(player_id=player_id)
+    game_rows = await battleship_database.get_player_games(
+        player_id=player_id, dto=True
+    )
+    assert len(game_rows) == len(games) > 0
+    for game, game_row in zip(games, game_rows):
+        for field in GameRow._fields:
+            assert getattr(game, field) == getattr(game_row, field)
+
+    game_id = games[0].id
+    assert await battleship_database.get_game(game_id, dto=True) == GameRow(
+        *[getattr(games[0], field) for field in GameRow._fields]
+    )
+    assert await battleship_database.get_game(-1, dto=True) is None
+
+    ships = await battleship_database.get_player_ships(game_id, player_id)
+    ship_rows = await battleship_database.get_player_ships(game_id, player_id, dto=True)
+    assert len(ship_rows) == len(ships) > 0
+    assert ship_rows == [
+        ShipRow(*[getattr(ship, field) for field in ShipRow._fields]) for ship in ships
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("returning", [True, False])
+async def test_bulk_create_players_and_games(
+    battleship_client, battleship_database, monkeypatch, returning
+):
+    if returning and not battleship_database.insert_many_returning:
+        pytest.skip("the database does not support multi-row RETURNING")
+    monkeypatch.setattr(battleship_database, "insert_many_returning", returning)
+    monkeypatch.setattr("battleship.utils.BULK_INSERT_BATCH_SIZE", 3)
+
+    players = [
+        {"first_name": f"player {ind}", "last_name": "", "email": f"{ind}@bulk"}
+        for ind in range(7)
+    ]
+    ret = await battleship_client.post(
+        "v1/battleship/players", json={"players": players}
+    )
+    assert ret.status == 200
+    player_ids = [
+        json.loads(line)["player_id"] for line in (await ret.text()).splitlines()
+    ]
+    assert len(set(player_ids)) == 7
+    for player_id, player in zip(player_ids, players):
+        found = await battleship_database.get_player_by_id(player_id)
+        assert found.email == player["email"]
+
+    games = [
+        {
+            "player_1_id": player_ids[ind],
+            "player_2_id": player_ids[ind + 1],
+            "initial_player": player_ids[ind + 1],
+            "mode": "salvo",
+            "fleet": [3, 2],
+        }
+        for ind in range(6)
+    ]
+    ret = await battleship_client.post("v1/battleship/games", json={"games": games})
+    assert ret.status == 200
+    game_ids = [json.loads(line)["game_id"] for line in (await ret.text()).splitlines()]
+    assert len(set(game_ids)) == 6
+    for game_id, game in zip(game_ids, games):
+        found = await battleship_database.get_game(game_id)
+        assert (found.player_1_id, found.current_player_id) == (
+            game["player_1_id"],
+            game["initial_player"],
+        )
+        assert (found.mode, found.fleet, found.version) == (GameMode.salvo, [3, 2], 1)
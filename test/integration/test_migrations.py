@@ -0,0 +1,188 @@
+import pytest
+from sqlalchemy import delete, insert, inspect, select, text, update
+from battleship.models.game import Game, GameStatus
+from battleship.models.guess import Guess, GuessResult
+from battleship.models.migrations import (
+    LATEST_VERSION,
+    add_board_state,
+    drop_guess_victory_index,
+    get_version,
+    migrate,
+    store_shots_in_blocks,
+)
+from battleship.models.player import Player
+from battleship.models.ship import Ship
+from battleship.models.shot_block import ShotBlock
+from battleship.utils import add_player_fleet, run_game_turn
+
+FLEET = [
+    {
+        "size": 2,
+        "orientation": "horizontal",
+        "start_position_x": 0,
+        "start_position_y": 0,
+    },
+    {
+        "size": 3,
+        "orientation": "vertical",
+        "start_position_x": 5,
+        "start_position_y": 5,
+    },
+]
+
+
+@pytest.mark.asyncio
+async def test_migrate(battleship_database):
+    engine = battleship_database.engine
+    # The tables created from the models already have every change
+    assert await migrate(engine) == LATEST_VERSION
+    assert await get_version(engine) == LATEST_VERSION
+    assert await migrate(engine) == LATEST_VERSION
+
+    async with engine.connect() as conn:
+        indexes = await conn.run_sync(
+            lambda sync_conn: {
+                index["name"]: index["column_names"]
+                for table in ("ship", "guess", "game")
+                for index in inspect(sync_conn).get_indexes(table)
+            }
+        )
+    assert indexes["ix_ship_game_id_player_id"] == ["game_id", "player_id"]
+    assert indexes["ix_guess_game_id_offense_player_id"] == [
+        "game_id",
+        "offense_player_id",
+    ]
+    assert indexes["ix_game_player_1_id_id"] == ["player_1_id", "id"]
+    assert indexes["ix_game_player_2_id_id"] == ["player_2_id", "id"]
+    assert indexes["ix_game_player_1_id_status_id"] == ["player_1_id", "status", "id"]
+    assert indexes["ix_game_player_2_id_status_id"] == ["player_2_id", "status", "id"]
+    assert "ix_game_player_1_id" not in indexes
+    assert "ix_guess_victory_game_id" not in indexes
+    async with engine.connect() as conn:
+        columns = await conn.run_sync(
+            lambda sync_conn: {
+                column["name"] for column in inspect(sync_conn).get_columns("game")
+            }
+        )
+    assert {"version", "player_1_ships_afloat"} <= columns
+    assert "player_1_shots" not in columns
+
+
+@pytest.mark.asyncio
+async def test_drop_guess_victory_index(battleship_database):
+    def guess_indexes(sync_conn) -> set:
+        return {index["name"] for index in inspect(sync_conn).get_indexes("guess")}
+
+    async with battleship_database.engine.begin() as conn:
+        # As created by the archive migration
+        await conn.execute(
+            text(
+                "CREATE INDEX ix_guess_victory_game_id ON guess (game_id) "
+                "WHERE result = 'victory'"
+            )
+        )
+        assert "ix_guess_victory_game_id" in await conn.run_sync(guess_indexes)
+        await conn.run_sync(drop_guess_victory_index)
+        assert "ix_guess_victory_game_id" not in await conn.run_sync(guess_indexes)
+        # Nothing left to drop
+        await conn.run_sync(drop_guess_victory_index)
+
+
+async def board_state(conn, game_id) -> tuple:
+    game = (await conn.execute(select(Game.__table__).where(Game.id == game_id))).one()
+    stmt = select(Ship.id, Ship.hit_mask).where(Ship.game_id == game_id)
+    ships = sorted((await conn.execute(stmt)).all())
+    stmt = select(ShotBlock.player_id, ShotBlock.block, ShotBlock.bits).where(
+        ShotBlock.game_id == game_id
+    )
+    return game, ships, sorted((await conn.execute(stmt)).all())
+
+
+@pytest.mark.asyncio
+async def test_add_board_state(battleship_database):
+    db = battleship_database
+    player_ids = []
+    for name in ("first", "second"):
+        player = Player(first_name=name, last_name="", email="")
+        player_ids.append((await db.add_player(player)).id)
+    game = Game(
+        player_1_id=player_ids[0],
+        player_2_id=player_ids[1],
+        current_player_id=player_ids[0],
+        status=GameStatus.in_progress,
+        fleet=[2, 3],
+    )
+    game = await db.add_game(game)
+    for player_id in player_ids:
+        await add_player_fleet(game.id, player_id, FLEET, db)
+    for x, y in [(0, 0), (9, 9), (1, 0), (5, 6)]:
+        offense_player_id, defense_player_id = player_ids
+        await run_game_turn(game.id, x, y, offense_player_id, defense_player_id, db)
+        player_ids.reverse()
+
+    async with db.engine.begin() as conn:
+        played = await board_state(conn, game.id)
+        assert [mask for _, mask in played[1]] == [0, 0b10, 0b11, 0]
+        # Cells (0, 0) and (1, 0), then (5, 6) and (9, 9), 56 cells a block
+        assert played[2] == [
+            (player_ids[0], 0, 0b11),
+            (player_ids[1], 1, 1 << 43 | 1 << 9),
+        ]
+        await conn.execute(
+            update(Game)
+            .where(Game.id == game.id)
+            .values(player_1_ships_afloat=0, player_2_ships_afloat=0)
+        )
+        await conn.execute(
+            update(Ship).where(Ship.game_id == game.id).values(hit_mask=0)
+        )
+        await conn.execute(delete(ShotBlock).where(ShotBlock.game_id == game.id))
+        await conn.run_sync(add_board_state)
+        await conn.run_sync(store_shots_in_blocks)
+        # The board state computed from the ships and guesses is the one kept
+        # up to date by the turns
+        assert await board_state(conn, game.id) == played
+
+
+@pytest.mark.asyncio
+async def test_add_board_state_counts_repeat_hits_once(battleship_database):
+    db = battleship_database
+    player_ids = []
+    for name in ("first", "second"):
+        player = Player(first_name=name, last_name="", email="")
+        player_ids.append((await db.add_player(player)).id)
+    game = Game(
+        player_1_id=player_ids[0],
+        player_2_id=player_ids[1],
+        current_player_id=player_ids[0],
+        status=GameStatus.in_progress,
+        fleet=[2, 3],
+    )
+    game = await db.add_game(game)
+    for player_id in player_ids:
+        await add_player_fleet(game.id, player_id, FLEET, db)
+    ships = await db.get_player_ships(game.id, player_ids[1])
+
+    # Repeat shots were allowed before the board state, so a cell of a ship
+    # may have been hit twice
+    async with db.engine.begin() as conn:
+        await conn.execute(
+            insert(Guess),
+            [
+                {
+                    "game_id": game.id,
+                    "offense_player_id": player_ids[0],
+                    "ship_id": ships[0].id,
+                    "position_x": 0,
+                    "position_y": 0,
+                    "result": GuessResult.hit,
+                }
+            ]
+            * 2,
+        )
+        await conn.execute(update(Ship).where(Ship.id == ships[0].id).values(hits=2))
+        await conn.run_sync(add_board_state)
+        hit_mask = await conn.scalar(
+            select(Ship.hit_mask).where(Ship.id == ships[0].id)
+        )
+    assert hit_mask == 0b01
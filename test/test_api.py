@@ -1,3 +1,4 @@
+import json
 import pytest
 
 
@@ -25,6 +26,18 @@ async def test_add_new_ship_outside_range(battleship_client, add_ship_request):
     assert ret.status == 400
 
 
+@pytest.mark.asyncio
+async def test_add_new_ship_large_board(battleship_client, mock_game, add_ship_request):
+    mock_game.board_width = 100
+    mock_game.board_height = 100
+    add_ship_request["ship"]["start_position_x"] = 95
+    add_ship_request["ship"]["start_position_y"] = 99
+    ret = await battleship_client.post(
+        "v1/battleship/game/player/create_new_ship", json=add_ship_request
+    )
+    assert ret.status == 200
+
+
 @pytest.mark.asyncio
 async def test_add_new_ship_overlaps(battleship_client, add_ship_request):
     add_ship_request["ship"]["start_position_x"] = 5
@@ -35,6 +48,45 @@ async def test_add_new_ship_overlaps(battleship_client, add_ship_request):
     assert ret.status == 400
 
 
+@pytest.mark.asyncio
+async def test_add_new_ship_beyond_fleet(battleship_client, add_ship_request):
+    # The game's only ship of size 5 is already placed
+    add_ship_request["ship"]["size"] = 5
+    ret = await battleship_client.post(
+        "v1/battleship/game/player/create_new_ship", json=add_ship_request
+    )
+    assert ret.status == 400
+
+
+@pytest.mark.asyncio
+async def test_place_fleet(battleship_client, mock_db, place_fleet_request):
+    ret = await battleship_client.post(
+        "v1/battleship/game/player/place_fleet", json=place_fleet_request
+    )
+    assert ret.status == 200
+    mock_db.add_ships.assert_awaited_once()
+    assert len(mock_db.add_ships.await_args.args[0]) == 2
+
+
+@pytest.mark.asyncio
+async def test_place_fleet_overlaps(battleship_client, mock_db, place_fleet_request):
+    place_fleet_request["ships"][1]["start_position_x"] = 0
+    ret = await battleship_client.post(
+        "v1/battleship/game/player/place_fleet", json=place_fleet_request
+    )
+    assert ret.status == 400
+    mock_db.add_ships.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_place_fleet_too_many_ships(battleship_client, place_fleet_request):
+    place_fleet_request["ships"][0]["size"] = 5
+    ret = await battleship_client.post(
+        "v1/battleship/game/player/place_fleet", json=place_fleet_request
+    )
+    assert ret.status == 400
+
+
 @pytest.mark.asyncio
 async def test_turn(battleship_client, turn_request):
     ret = await battleship_client.post(
@@ -77,3 +129,119 @@ async def test_turn_miss(battleship_client, mocker, turn_request):
     assert ret.status == 200
     data = await ret.json()
     assert data["result"] == "miss"
+
+
+@pytest.mark.asyncio
+async def test_salvo(battleship_client, mock_db, mock_game, salvo_request):
+    mock_game.mode = "salvo"
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/take_salvo", json=salvo_request
+    )
+    assert ret.status == 200
+    data = await ret.json()
+    assert data["result"] == "hit"
+    assert data["shots"] == [{"position_x": 5, "position_y": 5, "result": "hit"}]
+    mock_db.increment_ships_hits.assert_awaited_once_with({1: 1})
+    assert len(mock_db.add_guesses.await_args.args[0]) == 1
+
+
+@pytest.mark.asyncio
+async def test_salvo_too_many_shots(battleship_client, mock_game, salvo_request):
+    mock_game.mode = "salvo"
+    salvo_request["shots"].append({"position_x": 0, "position_y": 0})
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/take_salvo", json=salvo_request
+    )
+    assert ret.status == 400
+
+
+@pytest.mark.asyncio
+async def test_salvo_in_classic_game(battleship_client, salvo_request):
+    ret = await battleship_client.post(
+        "/v1/battleship/game/player/take_salvo", json=salvo_request
+    )
+    assert ret.status == 400
+
+
+@pytest.mark.asyncio
+async def test_create_new_game_without_second_player(
+    battleship_client, new_game_request
+):
+    del new_game_request["player_2_id"]
+    ret = await battleship_client.post("v1/battleship/game", json=new_game_request)
+    assert ret.status == 400
+
+
+@pytest.mark.asyncio
+async def test_create_new_game_bot_plays_first(battleship_client, new_game_request):
+    new_game_request["against_bot"] = True
+    new_game_request["initial_player"] = 2
+    ret = await battleship_client.post("v1/battleship/game", json=new_game_request)
+    assert ret.status == 400
+
+
+@pytest.mark.asyncio
+async def test_create_new_game_bot_board_too_large(
+    battleship_client, mock_db, new_game_request
+):
+    new_game_request["against_bot"] = True
+    new_game_request["board_width"] = 100
+    new_game_request["board_height"] = 100
+    ret = await battleship_client.post("v1/battleship/game", json=new_game_request)
+    assert ret.status == 400
+    mock_db.add_game.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_create_players(
+    battleship_client, mock_db, monkeypatch, create_new_player_request
+):
+    monkeypatch.setattr("battleship.utils.BULK_INSERT_BATCH_SIZE", 2)
+    mock_db.add_players.side_effect = [[1, 2], [3]]
+    ret = await battleship_client.post(
+        "v1/battleship/players", json={"players": [create_new_player_request] * 3}
+    )
+    assert ret.status == 200
+    lines = (await ret.text()).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"player_id": 1},
+        {"player_id": 2},
+        {"player_id": 3},
+    ]
+    assert mock_db.add_players.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_create_games_failed_batch(
+    battleship_client, mock_db, monkeypatch, new_game_request
+):
+    monkeypatch.setattr("battleship.utils.BULK_INSERT_BATCH_SIZE", 1)
+    mock_db.add_games.side_effect = [[1], RuntimeError("db is down")]
+    ret = await battleship_client.post(
+        "v1/battleship/games", json={"games": [new_game_request] * 2}
+    )
+    # The ids of the games created are streamed before the error
+    assert ret.status == 200
+    lines = [json.loads(line) for line in (await ret.text()).splitlines()]
+    assert lines[0] == {"game_id": 1}
+    assert "error" in lines[1]
+
+
+@pytest.mark.asyncio
+async def test_create_games_against_bot(battleship_client, mock_db, new_game_request):
+    new_game_request["against_bot"] = True
+    ret = await battleship_client.post(
+        "v1/battleship/games", json={"games": [new_game_request]}
+    )
+    assert ret.status == 400
+    mock_db.add_games.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_game_details_of_missing_game(battleship_client, mock_db):
+    mock_db.get_player_game_details.return_value = None
+    params = {"game_id": 1, "player_id": 1}
+    ret = await battleship_client.get(
+        "/v1/battleship/game/player/details", params=params
+    )
+    assert ret.status == 404
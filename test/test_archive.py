@@ -0,0 +1,56 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+from unittest.mock import AsyncMock
+from battleship.models.archive import Archiver
+
+
+@pytest.mark.asyncio
+async def test_archiver_runs_batches_until_none_is_full():
+    db = AsyncMock()
+    db.archive_completed_games.side_effect = [[1, 2], [3, 4], [5], [], []]
+    archiver = Archiver(db, batch_size=2, interval=60)
+    archiver.start()
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+    # Full batches follow each other, then it waits for the interval
+    assert db.archive_completed_games.await_count == 3
+    db.archive_completed_games.assert_awaited_with(2)
+    await archiver.close()
+    assert archiver._task is None
+
+
+@pytest.mark.asyncio
+async def test_archiver_survives_failed_batch():
+    batches = iter([RuntimeError("db is down"), [1], [2]])
+
+    def archive(limit):
+        batch = next(batches, [])
+        if isinstance(batch, Exception):
+            raise batch
+        return batch
+
+    db = AsyncMock()
+    db.archive_completed_games.side_effect = archive
+    archiver = Archiver(db, batch_size=1, interval=0.01)
+    archiver.start()
+    await asyncio.sleep(0.05)
+    # The failed batch is retried after the interval
+    assert db.archive_completed_games.await_count >= 4
+    await archiver.close()
+
+
+def test_archive_tables_are_created_from_database_alone():
+    # Imported on its own, the archive's foreign key columns are defined
+    # before the player and game columns they point to
+    script = """
+from sqlalchemy import create_engine
+from battleship.models.base import Base
+import battleship.models.database
+Base.metadata.create_all(create_engine("sqlite://"))
+"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    subprocess.run([sys.executable, "-c", script], env=env, check=True)
@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+from battleship import board_state
+from battleship.shots import ShotBitset
+
+
+def new_game():
+    return SimpleNamespace(
+        player_1_id=1,
+        player_2_id=2,
+        board_width=10,
+        board_height=10,
+        player_1_ships_afloat=2,
+        player_2_ships_afloat=2,
+    )
+
+
+def new_ship(ship_id, orientation, x, y, size, hit_mask=0, hits=0):
+    return SimpleNamespace(
+        id=ship_id,
+        orientation=orientation,
+        start_position_x=x,
+        start_position_y=y,
+        size=size,
+        hit_mask=hit_mask,
+        hits=hits,
+    )
+
+
+def test_ship_cell_bit():
+    horizontal = new_ship(1, "horizontal", 2, 3, 3)
+    assert board_state.ship_cell_bit(horizontal, (2, 3)) == 0b001
+    assert board_state.ship_cell_bit(horizontal, (4, 3)) == 0b100
+    vertical = new_ship(2, "vertical", 5, 5, 2)
+    assert board_state.ship_cell_bit(vertical, (5, 6)) == 0b10
+
+
+def test_is_sunk():
+    assert not board_state.is_sunk(3, 0b101)
+    assert board_state.is_sunk(3, 0b111)
+
+
+def test_shot_blocks():
+    game = new_game()
+    game.board_width = 100
+    assert board_state.shot_block(game, (55, 0)) == (0, 1 << 55)
+    assert board_state.shot_block(game, (56, 0)) == (1, 1)
+    assert board_state.shot_block(game, (0, 1)) == (1, 1 << 44)
+    # Cells off the board have no block
+    cells = [(1, 0), (2, 0), (99, 9), (100, 0)]
+    assert board_state.shot_blocks(game, cells) == {0, 17}
+
+    shots = board_state.ShotBlocks(game, {1: 0b1})
+    assert (56, 0) in shots and (57, 0) not in shots and (0, 5) not in shots
+    shots.add((57, 0))
+    shots.add((0, 5))
+    assert (57, 0) in shots and (0, 5) in shots
+    # Only the blocks changed are written, the ones without a row inserted
+    assert shots.changed == {1, 8}
+    assert shots.stored == {1}
+
+
+def test_shots_bitset():
+    game = new_game()
+    blocks = {0: 1 << 55, 1: 1 | 1 << 43}
+    shots = board_state.shots_bitset(game, blocks)
+    assert shots.bits == ShotBitset(10, 10, [(5, 5), (6, 5), (9, 9)]).bits
+
+
+def test_apply_shots():
+    game = new_game()
+    ship = new_ship(1, "horizontal", 0, 0, 2, hit_mask=0b01)
+    other = new_ship(2, "vertical", 5, 5, 3)
+    fired = board_state.ShotBlocks(game, {})
+    new_bits = board_state.apply_shots(
+        game, fired, 2, [(1, 0), (5, 6), (9, 9)], [ship, other, None]
+    )
+
+    assert new_bits == {1: 0b10, 2: 0b010}
+    # Only the first ship was sunk, and the ships are left as they are
+    assert board_state.get_ships_afloat(game, 2) == 1
+    assert board_state.get_ships_afloat(game, 1) == 2
+    assert ship.hit_mask == 0b01
+    assert (1, 0) in fired and (9, 9) in fired and (0, 0) not in fired
+    assert fired.changed == {0, 1}
+
+
+def test_apply_shots_sinks_ship_once():
+    game = new_game()
+    ship = new_ship(1, "horizontal", 0, 0, 2)
+    fired = board_state.ShotBlocks(game, {})
+    board_state.apply_shots(game, fired, 1, [(0, 0), (1, 0)], [ship, ship])
+    assert board_state.get_ships_afloat(game, 1) == 1
+    assert board_state.get_ships_afloat(game, 2) == 2
+
+
+def test_apply_shots_to_ship_too_long_for_mask():
+    game = new_game()
+    game.board_width = 100
+    # Placed before ship sizes were capped, so it is tracked by its hits
+    ship = new_ship(1, "horizontal", 0, 0, 80, hits=78)
+    fired = board_state.ShotBlocks(game, {})
+    assert board_state.apply_shots(game, fired, 1, [(78, 0)], [ship]) == {1: 0}
+    assert board_state.get_ships_afloat(game, 1) == 2
+    ship.hits += 1
+    board_state.apply_shots(game, fired, 1, [(79, 0)], [ship])
+    assert board_state.get_ships_afloat(game, 1) == 1
@@ -0,0 +1,97 @@
+import random
+import pytest
+from battleship.bot import HIT_WEIGHT, BotRegistry, Heatmap, random_fleet
+from battleship.fleet import fits_on_board, ship_cells
+from battleship.models.player import Player
+
+
+def heatmap_scores(board_width, board_height, fleet, hits, misses):
+    """
+    Enumerates every placement of the fleet to score the board from scratch.
+    """
+    scores = [0] * (board_width * board_height)
+    for size in fleet:
+        for orientation in ("horizontal", "vertical"):
+            for y in range(board_height):
+                for x in range(board_width):
+                    if not fits_on_board(
+                        size, orientation, x, y, board_width, board_height
+                    ):
+                        continue
+                    cells = ship_cells(size, orientation, x, y)
+                    if misses.intersection(cells):
+                        continue
+                    weight = 1 + HIT_WEIGHT * len(hits.intersection(cells))
+                    for cell_x, cell_y in cells:
+                        scores[cell_y * board_width + cell_x] += weight
+    return scores
+
+
+def test_heatmap_incremental_updates():
+    fleet = [5, 4, 3, 3, 2]
+    rng = random.Random(0)
+    heatmap = Heatmap(12, 9, fleet, rng)
+    hits, misses = set(), set()
+    for _ in range(40):
+        cell = (rng.randrange(12), rng.randrange(9))
+        hit = rng.random() < 0.3
+        heatmap.record(cell, hit)
+        if cell not in hits and cell not in misses:
+            (hits if hit else misses).add(cell)
+    assert heatmap.scores == heatmap_scores(12, 9, fleet, hits, misses)
+
+
+def test_heatmap_follows_up_on_hits():
+    heatmap = Heatmap(10, 10, [5, 4, 4, 3, 3, 3, 2, 2, 2, 2], random.Random(0))
+    heatmap.record((4, 4), True)
+    assert heatmap.choose_shots()[0] in {(3, 4), (5, 4), (4, 3), (4, 5)}
+
+
+def test_bot_sinks_fleet():
+    fleet = [5, 4, 4, 3, 3, 3, 2, 2, 2, 2]
+    rng = random.Random(1)
+    for _ in range(20):
+        ship_cells_left = set()
+        for ship in random_fleet(10, 10, fleet, rng):
+            ship_cells_left.update(
+                ship_cells(
+                    ship["size"],
+                    ship["orientation"],
+                    ship["start_position_x"],
+                    ship["start_position_y"],
+                )
+            )
+        assert len(ship_cells_left) == sum(fleet)
+
+        heatmap = Heatmap(10, 10, fleet, rng)
+        fired = set()
+        while ship_cells_left:
+            (shot,) = heatmap.choose_shots()
+            assert shot not in fired
+            fired.add(shot)
+            heatmap.record(shot, shot in ship_cells_left)
+            ship_cells_left.discard(shot)
+        # A random shooter needs close to the whole board
+        assert len(fired) < 90
+
+
+@pytest.mark.asyncio
+async def test_registry_forgets_least_recently_seen_players():
+    class Database:
+        lookups = 0
+
+        async def get_player_by_id(self, player_id):
+            self.lookups += 1
+            return Player(id=player_id, is_bot=player_id % 2 == 0)
+
+    db = Database()
+    bots = BotRegistry(max_known_players=2)
+    assert await bots.is_bot(1, db) is False
+    assert await bots.is_bot(2, db) is True
+    assert await bots.is_bot(1, db) is False
+    assert db.lookups == 2
+    # 2 was looked up least recently and makes room for 3
+    assert await bots.is_bot(3, db) is False
+    assert list(bots.bot_player_ids) == [1, 3]
+    assert await bots.is_bot(2, db) is True
+    assert db.lookups == 4
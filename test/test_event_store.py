@@ -0,0 +1,106 @@
+import pytest
+from battleship.game_details import game_details_response
+from battleship.models.event_store import GameHistory, restore_state, snapshot_state
+from battleship.models.game import Game, GameStatus
+from battleship.models.game_cache import GameState
+from battleship.models.game_event import GameEvent, GameEventKind
+
+
+def new_history() -> GameHistory:
+    game = Game(
+        id=1,
+        player_1_id=1,
+        player_2_id=2,
+        current_player_id=1,
+        status=GameStatus.in_progress,
+        board_width=10,
+        board_height=10,
+    )
+    return GameHistory(GameState(game, [], []))
+
+
+def turn(seq: int, offense_player_id: int, defense_player_id: int, shots: list):
+    return GameEvent(
+        id=seq,
+        seq=seq,
+        kind=GameEventKind.turn,
+        data={
+            "offense_player_id": offense_player_id,
+            "defense_player_id": defense_player_id,
+            "shots": [
+                {"ship_id": ship_id, "position_x": x, "position_y": y, "result": result}
+                for x, y, ship_id, result in shots
+            ],
+        },
+    )
+
+
+def test_events_are_applied_once_and_in_order():
+    history = new_history()
+    placed = GameEvent(
+        id=7,
+        seq=1,
+        kind=GameEventKind.ship_placed,
+        data={
+            "player_id": 2,
+            "size": 2,
+            "orientation": "horizontal",
+            "start_position_x": 0,
+            "start_position_y": 0,
+        },
+    )
+    history.apply(placed)
+    history.apply(placed)
+    assert list(history.state.ships_by_id) == [7]
+
+    history.apply(
+        GameEvent(
+            id=8,
+            seq=2,
+            kind=GameEventKind.ship_moved,
+            data={"ship_id": 7, "start_position_x": 3},
+        )
+    )
+    assert history.state.ships[2].ship_at((3, 0)).id == 7
+    assert history.state.ships[2].ship_at((0, 0)) is None
+
+    with pytest.raises(ValueError):
+        history.apply(turn(4, 1, 2, [(3, 0, 7, "hit")]))
+
+    history.apply(turn(3, 1, 2, [(3, 0, 7, "hit")]))
+    assert history.state.game.current_player_id == 2
+    history.apply(turn(4, 2, 1, [(5, 5, None, "miss")]))
+    history.apply(turn(5, 1, 2, [(4, 0, 7, "victory")]))
+    assert history.seq == 5
+    assert history.state.game.status == GameStatus.completed
+    assert history.state.game.current_player_id == 1
+    assert history.state.ships_by_id[7].hits == 2
+    assert (4, 0) in history.state.shots[1]
+
+
+def test_snapshot_round_trip():
+    history = new_history()
+    history.apply(
+        GameEvent(
+            id=1,
+            seq=1,
+            kind=GameEventKind.ship_placed,
+            data={
+                "player_id": 2,
+                "size": 3,
+                "orientation": "vertical",
+                "start_position_x": 1,
+                "start_position_y": 1,
+            },
+        )
+    )
+    history.apply(turn(2, 1, 2, [(1, 2, 1, "hit")]))
+
+    game = new_history().state.game
+    state = restore_state(game, snapshot_state(history.state))
+    assert state.game.current_player_id == 2
+    assert game_details_response(**state.game_details(1)) == game_details_response(
+        **history.state.game_details(1)
+    )
+    assert state.ships_by_id[1].hits == 1
+    assert (1, 2) in state.shots[1]
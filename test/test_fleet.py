@@ -0,0 +1,43 @@
+from battleship.fleet import Fleet, fits_on_board
+from battleship.models.ship import Ship
+
+
+def make_ship(ship_id, size, orientation, x, y):
+    return Ship(
+        id=ship_id,
+        size=size,
+        orientation=orientation,
+        start_position_x=x,
+        start_position_y=y,
+        hits=0,
+    )
+
+
+def test_fits_on_board():
+    assert fits_on_board(5, "horizontal", 995, 999, 1000, 1000)
+    assert not fits_on_board(5, "horizontal", 996, 999, 1000, 1000)
+    assert fits_on_board(5, "vertical", 19, 0, 20, 5)
+    assert not fits_on_board(5, "vertical", 19, 1, 20, 5)
+    assert not fits_on_board(2, "vertical", -1, 0, 10, 10)
+
+
+def test_ship_at():
+    fleet = Fleet([make_ship(1, 3, "horizontal", 500, 700)])
+    assert fleet.ship_at((502, 700)).id == 1
+    assert fleet.ship_at((503, 700)) is None
+
+
+def test_overlapping_ship():
+    fleet = Fleet(
+        [make_ship(1, 3, "vertical", 0, 0), make_ship(2, 2, "vertical", 1, 0)]
+    )
+    assert fleet.overlapping_ship([(0, 2), (1, 2)]).id == 1
+    assert fleet.overlapping_ship([(0, 2)], ignore_ship_id=1) is None
+
+
+def test_replace():
+    fleet = Fleet([make_ship(1, 3, "vertical", 0, 0)])
+    fleet.replace(make_ship(1, 3, "vertical", 5, 5))
+    assert len(fleet) == 1
+    assert fleet.ship_at((0, 0)) is None
+    assert fleet.ship_at((5, 7)).id == 1
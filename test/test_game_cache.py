@@ -0,0 +1,142 @@
+import pytest
+from unittest.mock import AsyncMock
+from battleship.errors import GameRuleError
+from battleship.models.game_cache import GameStateCache
+from battleship.models.guess import GuessResult
+from battleship.utils import run_game_turn
+
+
+@pytest.fixture
+def mock_cache_db(mock_game, mock_player_ships):
+    mock_game.id = 1
+    for ship in mock_player_ships:
+        ship.game_id = 1
+        ship.player_id = 2
+    db = AsyncMock(
+        get_game_state=AsyncMock(
+            return_value={
+                "game": mock_game,
+                "ships": mock_player_ships,
+                "guesses": [],
+            }
+        ),
+    )
+    return db
+
+
+@pytest.mark.asyncio
+async def test_turns_read_from_cache(mock_cache_db):
+    cache = GameStateCache(mock_cache_db)
+    result = await run_game_turn(1, 5, 5, 1, 2, cache)
+    assert result == GuessResult.hit
+    result = await run_game_turn(1, 0, 0, 2, 1, cache)
+    assert result == GuessResult.miss
+    await cache.close()
+
+    mock_cache_db.get_game_state.assert_awaited_once_with(1)
+    mock_cache_db.get_player_ships.assert_not_awaited()
+    mock_cache_db.increment_ship_hits.assert_awaited_once_with(1)
+    assert mock_cache_db.add_guess.await_count == 2
+    assert mock_cache_db.update_game.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_state_is_updated(mock_cache_db):
+    cache = GameStateCache(mock_cache_db)
+    await run_game_turn(1, 5, 5, 1, 2, cache)
+
+    game = await cache.get_game(1)
+    assert game.current_player_id == 2
+    ships = await cache.get_player_ships(game_id=1, player_id=2)
+    assert ships[0].hits == 1
+    details = await cache.get_game_details(1, 1)
+    assert len(details["player_guesses"]) == 1
+    assert len(details["enemy_guesses"]) == 0
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_repeat_shot_rejected(mock_cache_db):
+    cache = GameStateCache(mock_cache_db)
+    await run_game_turn(1, 0, 0, 1, 2, cache)
+    await run_game_turn(1, 0, 0, 2, 1, cache)
+    with pytest.raises(GameRuleError):
+        await run_game_turn(1, 0, 0, 1, 2, cache)
+    await cache.close()
+
+    assert mock_cache_db.add_guess.await_count == 2
+    shots = await cache.get_player_shots(1, 1)
+    assert (0, 0) in shots
+    assert (0, 1) not in shots
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction(mock_cache_db):
+    cache = GameStateCache(mock_cache_db, max_games=1)
+    await cache.get_game(1)
+    await cache.get_game(2)
+    await cache.get_game(1)
+    assert mock_cache_db.get_game_state.await_count == 3
+
+
+@pytest.fixture
+def whole_turn_db(mock_cache_db):
+    mock_cache_db.plays_whole_turns = True
+    mock_cache_db.play_turn = AsyncMock(return_value=GuessResult.hit)
+    return mock_cache_db
+
+
+@pytest.mark.asyncio
+async def test_archive_waits_for_pending_writes(mock_cache_db):
+    cache = GameStateCache(mock_cache_db)
+
+    async def archive_completed_games(limit, skip_game_ids):
+        # The turn's writes landed first
+        mock_cache_db.update_game.assert_awaited_once()
+        mock_cache_db.add_guess.assert_awaited_once()
+        return [3]
+
+    mock_cache_db.archive_completed_games.side_effect = archive_completed_games
+    await run_game_turn(1, 5, 5, 1, 2, cache)
+    assert await cache.archive_completed_games(10) == [3]
+    mock_cache_db.archive_completed_games.assert_awaited_once_with(
+        10, skip_game_ids=set()
+    )
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_whole_turns_are_played_by_database(whole_turn_db):
+    cache = GameStateCache(whole_turn_db)
+    await cache.get_game(1)
+    assert await run_game_turn(1, 5, 5, 1, 2, cache) == GuessResult.hit
+    await cache.close()
+
+    whole_turn_db.play_turn.assert_awaited_once_with(1, 5, 5, 1, 2)
+    whole_turn_db.increment_ship_hits.assert_not_awaited()
+    whole_turn_db.update_game.assert_not_awaited()
+    whole_turn_db.add_guesses.assert_not_awaited()
+    # The turn is applied to the cached state
+    assert (await cache.get_game(1)).current_player_id == 2
+    ships = await cache.get_player_ships(game_id=1, player_id=2)
+    assert ships[0].hits == 1
+    assert (5, 5) in await cache.get_player_shots(1, 1)
+    whole_turn_db.get_game_state.assert_awaited_once_with(1)
+
+
+@pytest.mark.asyncio
+async def test_cached_state_behind_database_is_dropped(whole_turn_db):
+    cache = GameStateCache(whole_turn_db)
+    await cache.get_game(1)
+    # Another process moved the ship, so the database reports a miss
+    whole_turn_db.play_turn.return_value = GuessResult.miss
+    await run_game_turn(1, 5, 5, 1, 2, cache)
+    await cache.get_game(1)
+    assert whole_turn_db.get_game_state.await_count == 2
+
+    whole_turn_db.play_turn.side_effect = GameRuleError("not your turn")
+    with pytest.raises(GameRuleError):
+        await run_game_turn(1, 0, 0, 1, 2, cache)
+    await cache.get_game(1)
+    assert whole_turn_db.get_game_state.await_count == 3
+    await cache.close()
@@ -0,0 +1,214 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+from battleship.models.guess import GuessResult
+from battleship.models.metadata_cache import MetadataCache, TTLCache
+from battleship.utils import run_game_turn
+
+
+@pytest.fixture
+def mock_metadata_db():
+    game = SimpleNamespace(id=1, player_1_id=1, player_2_id=2)
+    return AsyncMock(
+        get_player_by_id=AsyncMock(side_effect=lambda ind: SimpleNamespace(id=ind)),
+        get_game=AsyncMock(return_value=game),
+        get_player_games=AsyncMock(return_value=[game]),
+    )
+
+
+@pytest.fixture
+def clock(mocker):
+    clock = mocker.patch("battleship.models.metadata_cache.time.monotonic")
+    clock.return_value = 0.0
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_ttl_cache_expires(clock):
+    store = TTLCache()
+    await store.set("a", 1, ttl=10)
+    clock.return_value = 9.9
+    assert await store.get("a") == 1
+    clock.return_value = 10
+    assert await store.get("a") is None
+    assert len(store) == 0
+
+
+@pytest.mark.asyncio
+async def test_ttl_cache_evicts_least_recently_used():
+    store = TTLCache(max_entries=2)
+    await store.set("a", 1, ttl=10)
+    await store.set("b", 2, ttl=10)
+    assert await store.get("a") == 1
+    await store.set("c", 3, ttl=10)
+    assert await store.get("b") is None
+    assert await store.get("a") == 1
+    assert await store.get("c") == 3
+
+
+@pytest.mark.asyncio
+async def test_reads_are_cached_per_kind(mock_metadata_db, clock):
+    cache = MetadataCache(mock_metadata_db, ttls={"player": 100, "game": 10})
+    for _ in range(3):
+        assert (await cache.get_player_by_id(1)).id == 1
+        await cache.get_game(1, dto=True)
+    clock.return_value = 50
+    await cache.get_player_by_id(1)
+    await cache.get_game(1, dto=True)
+
+    assert mock_metadata_db.get_player_by_id.await_count == 1
+    assert mock_metadata_db.get_game.await_count == 2
+    assert cache.stats()["player"] == {"hits": 3, "misses": 1}
+    assert cache.stats()["game"] == {"hits": 2, "misses": 2}
+
+
+@pytest.mark.asyncio
+async def test_orm_game_reads_are_not_cached(mock_metadata_db):
+    cache = MetadataCache(mock_metadata_db)
+    await cache.get_game(1)
+    await cache.get_game(1)
+    assert mock_metadata_db.get_game.await_count == 2
+    assert cache.stats()["game"] == {"hits": 0, "misses": 0}
+
+
+@pytest.mark.asyncio
+async def test_missing_rows_are_not_cached(mock_metadata_db):
+    mock_metadata_db.get_player_by_id = AsyncMock(return_value=None)
+    cache = MetadataCache(mock_metadata_db)
+    assert await cache.get_player_by_id(1) is None
+    assert await cache.get_player_by_id(1) is None
+    assert mock_metadata_db.get_player_by_id.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_a_read(mock_metadata_db):
+    loaded = asyncio.Event()
+
+    async def get_player_by_id(player_id):
+        await loaded.wait()
+        return SimpleNamespace(id=player_id)
+
+    mock_metadata_db.get_player_by_id = AsyncMock(side_effect=get_player_by_id)
+    cache = MetadataCache(mock_metadata_db)
+    reads = asyncio.gather(*[cache.get_player_by_id(1) for _ in range(5)])
+    await asyncio.sleep(0)
+    loaded.set()
+    players = await reads
+
+    assert {player.id for player in players} == {1}
+    mock_metadata_db.get_player_by_id.assert_awaited_once_with(1)
+    assert cache.stats()["player"] == {"hits": 0, "misses": 5}
+
+
+@pytest.mark.asyncio
+async def test_writes_drop_stale_entries(mock_metadata_db):
+    cache = MetadataCache(mock_metadata_db)
+    await cache.get_game(1, dto=True)
+    await cache.get_player_games(1, dto=True)
+    await cache.get_player_games(2, dto=True)
+    await cache.get_player_by_id(1)
+
+    await cache.update_game(1, {"status": "completed"})
+    await cache.get_game(1, dto=True)
+    await cache.get_player_games(1, dto=True)
+    await cache.get_player_games(2, dto=True)
+    await cache.get_player_by_id(1)
+
+    mock_metadata_db.update_game.assert_awaited_once_with(1, {"status": "completed"})
+    assert mock_metadata_db.get_game.await_count == 2
+    assert mock_metadata_db.get_player_games.await_count == 4
+    assert mock_metadata_db.get_player_by_id.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_new_games_drop_player_games(mock_metadata_db):
+    mock_metadata_db.add_games = AsyncMock(return_value=[2])
+    cache = MetadataCache(mock_metadata_db)
+    await cache.get_player_games(1)
+    await cache.get_player_games(3)
+    await cache.add_games([{"player_1_id": 1, "player_2_id": 2}])
+    await cache.get_player_games(1)
+    await cache.get_player_games(3)
+    assert mock_metadata_db.get_player_games.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_write_while_loading_is_not_cached_over(mock_metadata_db):
+    loaded = asyncio.Event()
+    game = mock_metadata_db.get_game.return_value
+
+    async def get_game(game_id, dto=False):
+        await loaded.wait()
+        return game
+
+    mock_metadata_db.get_game = AsyncMock(side_effect=get_game)
+    cache = MetadataCache(mock_metadata_db)
+    read = asyncio.ensure_future(cache.get_game(1, dto=True))
+    await asyncio.sleep(0)
+    await cache.play_turn(1, 0, 0, 1, 2)
+    loaded.set()
+    await read
+    await cache.get_game(1, dto=True)
+    assert mock_metadata_db.get_game.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_stale_load_leaves_the_next_load_shared(mock_metadata_db):
+    game = mock_metadata_db.get_game.return_value
+    loads = []
+
+    async def get_game(game_id, dto=False):
+        loads.append(asyncio.Event())
+        await loads[-1].wait()
+        return game
+
+    async def started(count):
+        while len(loads) < count:
+            await asyncio.sleep(0)
+
+    mock_metadata_db.get_game = AsyncMock(side_effect=get_game)
+    cache = MetadataCache(mock_metadata_db)
+    stale = asyncio.ensure_future(cache.get_game(1, dto=True))
+    await started(1)
+    await cache.play_turn(1, 0, 0, 1, 2)
+    fresh = asyncio.ensure_future(cache.get_game(1, dto=True))
+    await started(2)
+    loads[0].set()
+    await stale
+
+    # The load started after the write is still the one misses share
+    shared = asyncio.ensure_future(cache.get_game(1, dto=True))
+    await asyncio.sleep(0)
+    loads[1].set()
+    assert await fresh is game
+    assert await asyncio.wait_for(shared, timeout=1) is game
+    assert mock_metadata_db.get_game.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_player_games_generations_are_kept_in_the_store(mock_metadata_db):
+    mock_metadata_db.add_games = AsyncMock(return_value=[2])
+    store = TTLCache(max_entries=4)
+    cache = MetadataCache(mock_metadata_db, store)
+    await cache.add_games(
+        [
+            {"player_1_id": player_id, "player_2_id": player_id + 1}
+            for player_id in range(1, 100, 2)
+        ]
+    )
+    assert len(store) == 4
+    await cache.get_player_games(99)
+    await cache.add_games([{"player_1_id": 99, "player_2_id": 100}])
+    await cache.get_player_games(99)
+    assert mock_metadata_db.get_player_games.await_count == 2
+
+
+@pytest.mark.asyncio
+async def test_whole_turns_are_played_behind_cache():
+    db = AsyncMock(
+        plays_whole_turns=True, play_turn=AsyncMock(return_value=GuessResult.hit)
+    )
+    cache = MetadataCache(db)
+    assert await run_game_turn(1, 5, 5, 1, 2, cache) == GuessResult.hit
+    db.play_turn.assert_awaited_once_with(1, 5, 5, 1, 2)
@@ -0,0 +1,33 @@
+from battleship.fleet import fits_on_board
+from battleship.placements import (
+    PLACEMENTS,
+    PLACEMENTS_OVER,
+    placement_cells,
+    placements_over,
+)
+
+
+def test_placements_are_legal():
+    for (size, orientation, x, y), cells in PLACEMENTS.items():
+        assert fits_on_board(size, orientation, x, y, 10, 10)
+        assert len(cells) == size
+        assert cells[0] == (x, y)
+    # Every legal placement of every size is in the table
+    assert len(PLACEMENTS) == sum(2 * (10 - size + 1) * 10 for size in range(1, 11))
+
+
+def test_placement_cells_shared():
+    assert placement_cells(3, "vertical", 2, 7) is PLACEMENTS[(3, "vertical", 2, 7)]
+    assert placement_cells(3, "horizontal", 998, 5) == ((998, 5), (999, 5), (1000, 5))
+
+
+def test_placements_over():
+    # A ship of size 2 can cover a corner in 2 ways and a center cell in 4
+    assert len(PLACEMENTS_OVER[(2, 0, 0)]) == 2
+    assert len(PLACEMENTS_OVER[(2, 5, 5)]) == 4
+    # Larger boards compute the same placements as the table
+    for cells in placements_over(4, (5, 5), 10, 10):
+        assert (5, 5) in cells
+    assert sorted(placements_over(4, (5, 5), 30, 20)) == sorted(
+        placements_over(4, (5, 5), 10, 10)
+    )
@@ -0,0 +1,44 @@
+from battleship.models.replicas import (
+    RecentWrites,
+    ReplicaRouter,
+    game_key,
+    player_key,
+)
+
+
+def test_recent_writes_expire(mocker):
+    now = mocker.patch("time.monotonic", return_value=100.0)
+    recent_writes = RecentWrites(lag=5)
+    recent_writes.add(game_key(1), player_key(1))
+    assert game_key(1) in recent_writes
+    assert game_key(2) not in recent_writes
+
+    now.return_value = 103.0
+    recent_writes.add(game_key(2))
+    now.return_value = 105.0
+    assert game_key(1) not in recent_writes
+    assert game_key(2) in recent_writes
+
+    # Expired writes are dropped as new ones come in
+    recent_writes.add(player_key(2))
+    assert len(recent_writes) == 2
+
+
+def test_router_reads_own_writes_from_primary():
+    router = ReplicaRouter("primary", ["replica_1", "replica_2"])
+    assert [router.reader(game_key(1)) for _ in range(3)] == [
+        "replica_1",
+        "replica_2",
+        "replica_1",
+    ]
+    router.wrote(game_key(1), player_key(1))
+    assert router.reader(game_key(1)) == "primary"
+    assert router.reader(player_key(2), player_key(1)) == "primary"
+    assert router.reader(game_key(2)) == "replica_2"
+
+
+def test_router_without_replicas():
+    router = ReplicaRouter("primary", [])
+    router.wrote(game_key(1))
+    assert len(router.recent_writes) == 0
+    assert router.reader(game_key(2)) == "primary"
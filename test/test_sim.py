@@ -0,0 +1,54 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from battleship.sim.boards import EMPTY, place_fleets  # noqa: E402
+from battleship.sim.engine import simulate_games  # noqa: E402
+
+
+def test_place_fleets():
+    fleet = [5, 4, 3, 3, 2]
+    boards = place_fleets(500, fleet, 10, 8, np.random.default_rng(0))
+    assert boards.shape == (500, 8, 10)
+    for board in boards:
+        for ship_index, size in enumerate(fleet):
+            ys, xs = np.nonzero(board == ship_index)
+            assert len(xs) == size
+            # Every ship is one straight, contiguous line of cells
+            if len(set(xs)) == 1:
+                assert sorted(ys) == list(range(ys.min(), ys.min() + size))
+            else:
+                assert set(ys) == {ys[0]}
+                assert sorted(xs) == list(range(xs.min(), xs.min() + size))
+        assert (board == EMPTY).sum() == board.size - sum(fleet)
+
+
+def test_place_fleets_too_long_ship():
+    with pytest.raises(ValueError):
+        place_fleets(1, [6], 5, 5, np.random.default_rng(0))
+
+
+def test_place_fleets_too_many_ships():
+    with pytest.raises(ValueError):
+        place_fleets(2, [3, 3, 3, 3], 3, 3, np.random.default_rng(0))
+
+
+@pytest.mark.parametrize("strategies", [("random", "random"), ("hunt", "random")])
+def test_simulate_games(strategies):
+    fleet = [5, 4, 3, 2]
+    result = simulate_games(200, fleet, 10, 10, strategies, np.random.default_rng(0))
+    assert set(result["winners"]) <= {0, 1}
+    assert (result["num_shots"] >= sum(fleet)).all()
+    # Both players fire, and the loser never gets to fire at every cell
+    assert (result["num_shots"] < 200).all()
+    if strategies[0] == "hunt":
+        assert (result["winners"] == 0).mean() > 0.9
+
+
+def test_simulate_games_single_cell_ships():
+    # The hunt strategy still sinks ships off its checkerboard pattern
+    result = simulate_games(
+        100, [1, 1, 1], 4, 4, ("hunt", "hunt"), np.random.default_rng(0)
+    )
+    assert set(result["winners"]) <= {0, 1}
+    assert (result["num_shots"] <= 2 * 4 * 4).all()
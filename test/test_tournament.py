@@ -0,0 +1,72 @@
+import asyncio
+import json
+import pytest
+from battleship.tournament import plan_matches, play_match, run_tournament, summarize
+
+
+def small_matches(games_per_pairing, mode="classic"):
+    return plan_matches(
+        ["heatmap", "random"], games_per_pairing, mode, 8, 8, [4, 3, 2], 0
+    )
+
+
+@pytest.mark.parametrize("mode", ["classic", "salvo"])
+def test_play_match(mode):
+    match = small_matches(1, mode)[0]
+    result = asyncio.run(play_match(match))
+    assert result["winner"] in (0, 1)
+    assert result["shots"][result["winner"]] >= 4 + 3 + 2
+    # Matches are reproducible from their seed
+    assert asyncio.run(play_match(match)) == result
+
+
+def test_run_tournament_resumes(tmp_path):
+    path = tmp_path / "results.jsonl"
+    matches = small_matches(5)
+    results = run_tournament(matches, str(path), workers=2, chunk_size=3)
+    assert sorted(results) == list(range(len(matches)))
+
+    # Interrupt the run half way through writing a result
+    lines = path.read_text().splitlines(keepends=True)
+    path.write_text("".join(lines[:4]) + lines[4][:10])
+    resumed = run_tournament(matches, str(path), workers=2, chunk_size=3)
+    assert resumed == results
+    lines = path.read_text().splitlines()
+    assert sorted(json.loads(line)["match_id"] for line in lines) == sorted(results)
+
+
+def test_run_tournament_other_results(tmp_path):
+    path = tmp_path / "results.jsonl"
+    run_tournament(small_matches(1), str(path), workers=1)
+    other_matches = plan_matches(["random"], 2, "classic", 8, 8, [4, 3, 2], 0)
+    with pytest.raises(ValueError):
+        run_tournament(other_matches, str(path), workers=1)
+
+
+def test_summarize():
+    results = [
+        {"strategies": ["heatmap", "random"], "winner": 0, "shots": [40, 39]},
+        {"strategies": ["random", "heatmap"], "winner": 1, "shots": [50, 50]},
+    ]
+    summary = summarize(results)
+    assert summary["heatmap"]["win_rate"] == 1.0
+    assert summary["random"]["wins"] == 0
+    assert summary["random"]["mean_shots"] == 44.5
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"seed": "1-0"},
+        {"board_width": 9},
+        {"fleet": [4, 3, 3]},
+        {"mode": "salvo"},
+    ],
+)
+def test_run_tournament_other_match_settings(tmp_path, change):
+    path = tmp_path / "results.jsonl"
+    run_tournament(small_matches(1), str(path), workers=1)
+    # Same match ids and strategies, but the matches are not played the same
+    other_matches = [{**match, **change} for match in small_matches(1)]
+    with pytest.raises(ValueError):
+        run_tournament(other_matches, str(path), workers=1)
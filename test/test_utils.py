@@ -1,6 +1,10 @@
 import pytest
+from battleship.errors import GameRuleError, NotFoundError
+from battleship.fleet import as_fleet
 from battleship.utils import (
+    build_player_game_details,
     calculate_ship_coordinates,
+    check_ship_overlap,
     evaluate_player_guess,
     check_if_player_lost,
 )
@@ -66,3 +70,19 @@ async def test_evaluate_player_guess_miss(mock_db, mock_ship):
     mock_db.get_player_ships.return_value = [mock_ship]
     hit = await evaluate_player_guess(game_id, defense_player_id, guess, mock_db)
     assert hit is None
+
+
+def test_check_ship_overlap(mock_player_ships):
+    fleet = as_fleet(mock_player_ships)
+    check_ship_overlap([(0, 0), (1, 0)], fleet)
+    with pytest.raises(GameRuleError):
+        check_ship_overlap([(4, 5), (5, 5)], fleet)
+    # A ship being moved may overlap its own cells
+    check_ship_overlap([(5, 5), (6, 5)], fleet, ignore_ship_id=1)
+
+
+@pytest.mark.asyncio
+async def test_build_player_game_details_missing_game(mock_db):
+    mock_db.get_player_game_details.return_value = None
+    with pytest.raises(NotFoundError):
+        await build_player_game_details(1, 1, mock_db)